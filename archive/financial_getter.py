@@ -1,7 +1,11 @@
 import pandas as pd
-import yfinance as yf
-import time
 import os
+import sys
+
+#指標の取得はstock_appと同じ処理を使う(キャッシュ・流量制限・リトライ込み)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "stock_app"))
+import stock_core
+from fundamentals_cache import FundamentalsCache
 
 def load_tickers_from_text(file_path: str) -> list[str]:
     if not os.path.exists(file_path):
@@ -14,39 +18,15 @@ def load_tickers_from_text(file_path: str) -> list[str]:
                 processed_tickers.append(f"{code}.T")
     return processed_tickers
 
-def fetch_financial_metrics(tickers: list[str]) -> pd.DataFrame:
-    results = []
-    print(f"全{len(tickers)}銘柄の指標データを取得します...")
-
-    for code in tickers:
-        print(f"取得中: {code} ... ", end="")
-        try:
-            ticker_info = yf.Ticker(code)
-            info = ticker_info.info
-            data = {
-                "コード": code,
-                "会社名": info.get("longName","不明"),
-                "現在値": info.get("currentPrice", 0),
-                "PER(予)": info.get("forwardPE", None),
-                "PBR": info.get("priceToBook", None),
-                "ROE": info.get("returnOnEquity", None),
-                "配当利回り": info.get("dividendYield", 0),
-                "時価総額": info.get("marketCap", 0)
-            }
-            results.append(data)
-            print("OK")
-            time.sleep(1)
-        except Exception as e:
-            print(f"エラーが発生しました: {e}")
-        time.sleep(1)
-    return pd.DataFrame(results)
 
 if __name__ == "__main__":
     input_file = "tickers.txt"
     my_tickers = load_tickers_from_text(input_file)
 
     if my_tickers:
-        df_metrics = fetch_financial_metrics(my_tickers)
+        print(f"全{len(my_tickers)}銘柄の指標データを取得します...")
+        df_metrics = stock_core.fetch_financial_metrics(my_tickers, FundamentalsCache(), stock_core.make_scheduler(),
+                                                        reporter=stock_core.PrintReporter())
 
         if "配当利回り" in df_metrics.columns:
             df_metrics["配当利回り"] = df_metrics["配当利回り"] * 100
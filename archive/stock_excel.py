@@ -1,12 +1,20 @@
-import yfinance as yf
 import pandas as pd
+import os
+import sys
 from datetime import datetime
 
+#stock_appの株価保存庫を共有する
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "stock_app"))
+from price_store import PriceStore, period_to_start
+
 def fetch_and_export_stock_data(tickers: list[str], file_name: str) -> None:
     print(f"データ取得を開始します:{tickers}")
 
     try:
-        df = yf.download(tickers, period="1mo", group_by='ticker')
+        #足りない日付だけダウンロードして、保存庫から読み出す
+        store = PriceStore()
+        store.update(tickers, period="1mo")
+        df = store.read_many(tickers, start=period_to_start("1mo"))
 
         if df.empty:
             print("データが取得できませんでした。ネット接続やコードを確認してください。")
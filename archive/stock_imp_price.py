@@ -1,7 +1,10 @@
-import yfinance as yf
 import pandas as pd
 import os
-import time
+import sys
+
+#stock_appの株価保存庫を共有する
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "stock_app"))
+from price_store import PriceStore, period_to_start
 
 def load_tickers_from_text(file_path: str) -> list[str]:
     if not os.path.exists(file_path):
@@ -23,31 +26,14 @@ def load_tickers_from_text(file_path: str) -> list[str]:
                 print(f"スキップしました(形式不備): {code}")
         return processed_tickers
 
-def fetch_stock_data_in_batches(tickers: list[str], batch_size: int = 3) -> pd.DataFrame:
-    data_frames = []
-
-    for i in range(0, len(tickers), batch_size):
-        batch_tickers = tickers[i:i + batch_size]
-
-        print(f"処理中: {batch_tickers} のデータを取得しています…")
-
-        try:
-            df_batch = yf.download(batch_tickers, period="1mo", group_by='ticker')
-
-            if not df_batch.empty:
-                data_frames.append(df_batch)
-
-        except Exception as e:
-            print(f"エラー発生({batch_tickers}): {e}")
-
-        print("待機中(1秒)...")
-        time.sleep(1)
+def fetch_stock_data_in_batches(tickers: list[str], batch_size: int = 200, period: str = "1mo") -> pd.DataFrame:
+    #保存庫に足りない日付だけをbatch_size件ずつまとめてダウンロードし、保存庫から読み出す
+    store = PriceStore(batch_size=batch_size)
+    print(f"処理中: {len(tickers)}銘柄の株価を更新しています…")
+    summary = store.update(tickers, period=period)
+    print(f"更新{summary['downloaded']}件 / 最新{summary['skipped']}件 (ダウンロード{summary['requests']}回)")
 
-    if data_frames:
-        final_df = pd.concat(data_frames, axis=1)
-        return final_df
-    else:
-        return pd.DataFrame()
+    return store.read_many(tickers, start=period_to_start(period))
 
     
 if __name__ == "__main__":
@@ -62,7 +48,7 @@ if __name__ == "__main__":
     print("\n--- 変換結果 ---")
     print(f"読み込んだリスト: {my_tickers}")
 
-    result_df = fetch_stock_data_in_batches(my_tickers, batch_size=3)
+    result_df = fetch_stock_data_in_batches(my_tickers)
 
     if not result_df.empty:
         print("\n--- 全データの取得完了 ---")
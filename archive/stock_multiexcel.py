@@ -1,32 +1,19 @@
-import yfinance as yf
 import pandas as pd
-import time
-
-def fetch_stock_data_in_batches(tickers: list[str], batch_size: int = 3) -> pd.DataFrame:
-    data_frames = []
-
-    for i in range(0, len(tickers), batch_size):
-        batch_tickers = tickers[i:i + batch_size]
-
-        print(f"処理中: {batch_tickers} のデータを取得しています…")
-
-        try:
-            df_batch = yf.download(batch_tickers, period="1mo", group_by='ticker')
-
-            if not df_batch.empty:
-                data_frames.append(df_batch)
-
-        except Exception as e:
-            print(f"エラー発生({batch_tickers}): {e}")
-
-        print("待機中(1秒)...")
-        time.sleep(1)
-
-    if data_frames:
-        final_df = pd.concat(data_frames, axis=1)
-        return final_df
-    else:
-        return pd.DataFrame()
+import os
+import sys
+
+#stock_appの株価保存庫を共有する
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "stock_app"))
+from price_store import PriceStore, period_to_start
+import export
+
+def update_stock_data_in_batches(tickers: list[str], batch_size: int = 200, period: str = "1mo") -> PriceStore:
+    #保存庫に足りない日付だけをbatch_size件ずつまとめてダウンロードする
+    store = PriceStore(batch_size=batch_size)
+    print(f"処理中: {len(tickers)}銘柄の株価を更新しています…")
+    summary = store.update(tickers, period=period)
+    print(f"更新{summary['downloaded']}件 / 最新{summary['skipped']}件 (ダウンロード{summary['requests']}回)")
+    return store
 
 if __name__ == "__main__":
     
@@ -36,10 +23,11 @@ if __name__ == "__main__":
         "6098.T", "4063.T", "4502.T",
         ]
     
-    result_df = fetch_stock_data_in_batches(my_tickers, batch_size=3)
+    period = "1mo"
+    store = update_stock_data_in_batches(my_tickers, period=period)
 
-    if not result_df.empty:
+    #全銘柄を1つの表につなげずに、保存庫から少しずつ読んでExcelに書き足す
+    rows = export.export(export.iter_price_history(store, my_tickers, start=period_to_start(period)), "all_stock.xlsx")
+    if rows:
         print("\n--- 全データの取得完了 ---")
-        print(result_df.head())
-
-        result_df.to_excel("all_stock.xlsx")
\ No newline at end of file
+        print(f"all_stock.xlsx に{rows:,}行を保存しました")
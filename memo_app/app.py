@@ -3,6 +3,10 @@ import pandas as pd
 import datetime
 import gspread
 from oauth2client.service_account import ServiceAccountCredentials
+import ledger_cache
+import ledger_partitions
+import ledger_queue
+import ledger_rollups
 
 # --- 設定エリア ---
 # ★ここにさっきのIDをコピペしてください！
@@ -14,9 +18,9 @@ st.title("家計簿アプリ 💰 (Google Sheets版)")
 # --- 関数エリア: 毎回書くのが大変な処理をまとめる ---
 
 # 1. スプレッドシートに接続する関数（キャッシュ機能付きで高速化）
-# 修正版 get_worksheet 関数
+# (月ごとにワークシートを分けたので、ワークシートではなくスプレッドシート全体を開く)
 @st.cache_resource
-def get_worksheet():
+def get_spreadsheet():
     # 認証情報を設定
     scope = ['https://spreadsheets.google.com/feeds', 'https://www.googleapis.com/auth/drive']
     
@@ -31,47 +35,51 @@ def get_worksheet():
         creds = ServiceAccountCredentials.from_json_keyfile_name('service_account.json', scope)
         
     client = gspread.authorize(creds)
-    sheet = client.open_by_key(SPREADSHEET_KEY).sheet1
-    return sheet
-
-# 2. データを読み込む関数
-def load_data(sheet):
-    data = sheet.get_all_records()
-    # データが空っぽのときの処理
-    if not data:
-        return pd.DataFrame(columns=["日付", "内容", "金額", "年月"])
-    
-    df = pd.DataFrame(data)
-    # 日付データを正しく認識させる
-    # (スプレッドシートから読むと文字列になりがちなので変換)
-    # ※既存データが空文字の場合などに備えて errors='coerce'
-    df["日付"] = pd.to_datetime(df["日付"], errors='coerce') 
-    # 再度、文字列のきれいな形に戻しておく（表示用）
-    df["日付"] = df["日付"].dt.strftime("%Y-%m-%d")
-    return df
-
-# 3. データを保存（全書き換え）する関数
-def save_data(sheet, df):
-    # データフレームの日付などが崩れないように全て文字列にする
-    df_to_save = df.astype(str)
-    
-    # シートを一旦まっさらにする
-    sheet.clear()
-    
-    # ヘッダー（列名）と中身を書き込む
-    # [columns] + [values] でリストを合体させて書き込みます
-    sheet.update([df_to_save.columns.values.tolist()] + df_to_save.values.tolist())
+    return client.open_by_key(SPREADSHEET_KEY)
 
+# 2. 月ごとのワークシートに分けた家計簿(手元のキャッシュ付き)
+#    表示・修正・保存で読み書きするのは選んだ月のワークシートだけ。何年分たまっても重くならない
+#    シートが変わっていなければ手元のコピーを使う(日付は日付型、金額は整数になっている)
+@st.cache_resource
+def get_ledger():
+    return ledger_partitions.PartitionedLedger(get_spreadsheet(), ledger_cache.LedgerCache())
+
+# 3. 今までの1枚のシートから、月ごとのワークシートに移す(最初の1回だけ。元のシートは残る)
+def migrate_if_needed(ledger):
+    if ledger.months():
+        return
+    with st.spinner("月ごとのワークシートに移しています..."):
+        result = ledger.migrate()
+    if result["rows"]:
+        st.info(f"{result['rows']}件の明細を{result['months']}か月分のワークシートに移しました"
+                "(元のシートはそのまま残しています。これからは月ごとのワークシートに書き込みます)")
+
+# 4. データを読み込む関数(選んだ月の分だけ)
+def load_data(ledger, month):
+    # index には「その月のワークシートの何行目か」が入る(修正した行だけを書き戻すために使う)
+    # 日付順に並べ替え済み(行番号はそのまま)
+    return ledger.load_month(month)
+
+# 5. 登録した明細の送信待ちの列(登録はすぐ終わり、シートへは裏のスレッドがまとめて送る)
+#    つながらないときも登録でき、つながったら送る。アプリを閉じても送信待ちの分は消えない
+@st.cache_resource
+def get_queue():
+    queue = ledger_queue.WriteQueue(get_ledger)
+    queue.start()
+    return queue
 
-# --- アプリのメイン処理 ---
+# 6. データを保存する関数(全部は書き直さず、変わった分だけ。手元のコピーにも同じ変更をする)
+def add_data(df_new):
+    # 送信待ちの列に入れるだけ(その月のワークシートの末尾には裏で追加される)
+    get_queue().enqueue(df_new)
 
-# 接続開始！
-try:
-    sheet = get_worksheet()
-    df_current = load_data(sheet)
-except Exception as e:
-    st.error(f"スプレッドシートへの接続エラー: {e}")
-    st.stop() # ここで止める
+def save_data(ledger, month, df_before, df_after):
+    # 編集前と編集後を比べて、書き換え・削除・追加のあった行だけを書き込む
+    # 日付を別の月に変えた行は、その月のワークシートへ移る
+    return ledger.save_month(month, df_before, df_after)
+
+
+# --- アプリのメイン処理 ---
 
 # 入力フォーム
 with st.form("input_form", clear_on_submit=True):
@@ -89,56 +97,70 @@ with st.form("input_form", clear_on_submit=True):
             "年月": [date.strftime("%Y-%m")] # 年月もここで作っちゃいます
         })
 
-        # 結合して保存
-        df_combined = pd.concat([df_current, new_data], ignore_index=True)
-        save_data(sheet, df_combined)
+        # 送信待ちの列に入れる(シートの応答を待たないので、すぐ次の入力ができる)
+        add_data(new_data)
         
-        st.success("スプレッドシートに登録しました！")
+        st.success("登録しました！(スプレッドシートへは裏で送ります)")
         st.rerun() # リロードして最新データを表示
 
+# 送信待ちの明細(数秒おきに見直し、全部送れたら画面を読み直して表に反映する)
+@st.fragment(run_every=3)
+def show_pending():
+    pending = get_queue().pending()
+    if pending.empty:
+        if st.session_state.pop("had_pending", False):
+            st.rerun()
+        return
+    st.session_state["had_pending"] = True
+    st.caption(f"⏳ スプレッドシートへの送信待ち: {len(pending)}件")
+    if pending["エラー"].notna().any():
+        st.warning("送信に失敗した明細があります。しばらくしてから自動で送り直します。")
+    st.dataframe(pending, hide_index=True)
+
+show_pending()
+
+# 接続開始！(つながらなくても、上のフォームからの登録はできる)
+try:
+    ledger = get_ledger()
+    migrate_if_needed(ledger)
+    month_list = ledger.months()
+except Exception as e:
+    st.error(f"スプレッドシートへの接続エラー: {e}")
+    st.stop() # ここで止める
+
 # --- データの表示・編集エリア ---
 st.divider()
 st.subheader("📝 データの確認・修正")
 
-if not df_current.empty:
+if month_list:
     # データがあれば表示処理
-    # (日付変換などは load_data で済んでいるので楽ちん！)
-    
-    # 年月リスト作成
-    if "年月" not in df_current.columns:
-        # もし昔のデータで「年月」列がなかったら、日付から作る
-        df_current["年月"] = pd.to_datetime(df_current["日付"]).dt.strftime("%Y-%m")
-        
-    month_list = df_current["年月"].unique()
+    # (月の一覧はワークシートの名前から。日付変換などは load_data で済んでいるので楽ちん！)
     # 新しい月が上に来るように逆順ソート
     month_list = sorted(month_list, reverse=True) 
     
     target_month = st.selectbox("表示する月を選んでください", month_list)
 
-    # フィルタリング
-    df_filtered = df_current[df_current["年月"] == target_month]
+    # 選んだ月のワークシートだけを読む
+    df_filtered = load_data(ledger, target_month)
+    # 編集画面で新しい内容も入力できるように、カテゴリ型から文字列に戻しておく
+    df_filtered = df_filtered.astype({"内容": str, "年月": str})
 
     # 編集画面
-    df_edited = st.data_editor(df_filtered, num_rows="dynamic", key="editor_filtered")
+    df_edited = st.data_editor(
+        df_filtered, num_rows="dynamic", key="editor_filtered", hide_index=True,
+        column_config={"日付": st.column_config.DateColumn("日付", format="YYYY-MM-DD")},
+    )
 
     if st.button("修正内容を保存する"):
         try:
-            # 1. 元データから該当月のデータを削除（除外）
-            df_current = df_current[df_current["年月"] != target_month]
-            
-            # 2. 編集後のデータを結合
-            # (編集画面で追加した行には「年月」が入っていないことがあるので補完する)
+            # 1. 編集画面で追加した行には「年月」が入っていないことがあるので補完する
             if not df_edited.empty:
                 # 日付列から再度「年月」を作り直してあげるのが安全
-                df_edited["年月"] = pd.to_datetime(df_edited["日付"]).dt.strftime("%Y-%m")
-            
-            df_current = pd.concat([df_current, df_edited], ignore_index=True)
-            
-            # 3. 日付順に並べ替え
-            df_current = df_current.sort_values("日付")
-            
-            # 4. スプレッドシートに書き込み
-            save_data(sheet, df_current)
+                df_edited["日付"] = pd.to_datetime(df_edited["日付"])
+                df_edited["年月"] = df_edited["日付"].dt.strftime("%Y-%m")
+
+            # 2. この月の編集前と編集後を比べて、変わった行だけスプレッドシートに書き込み
+            save_data(ledger, target_month, df_filtered, df_edited)
             
             st.success("データを更新しました！")
             st.rerun()
@@ -149,10 +171,29 @@ if not df_current.empty:
     st.divider()
     st.subheader(f"📊 {target_month} の支出分析")
     
-    # 集計（金額を数値型にしておく念入れ）
-    df_filtered["金額"] = df_filtered["金額"].astype(int)
-    df_grouped = df_filtered.groupby("内容")[["金額"]].sum()
-    st.bar_chart(df_grouped)
+    # 集計表(明細が変わるたびに直してある)を読むだけ
+    df_grouped = ledger.rollup(ledger_rollups.month_category, [target_month])
+    st.bar_chart(df_grouped.T.rename(columns={target_month: "金額"}))
+
+    # --- 何か月分もまとめて見る(集計表を読むだけなので、何年分あってもすぐ出る) ---
+    st.divider()
+    st.subheader("📈 月ごとの推移")
+    n_months = st.selectbox("表示する期間", [6, 12, 24, 60], index=1, format_func=lambda n: f"直近{n}か月")
+    recent = sorted(month_list)[-n_months:]
+    st.bar_chart(ledger.rollup(ledger_rollups.month_category, recent))
+    st.caption("累計(最初の月から)")
+    # 明細が1行も無い月は集計表に載らないので、その前の月の累計で埋める
+    running = ledger.rollup(ledger_rollups.running_totals)["累計"]
+    st.line_chart(running.reindex(running.index.union(recent)).ffill().fillna(0).loc[recent])
+
+    st.subheader("📅 前の年との比較")
+    st.line_chart(ledger.rollup(ledger_rollups.year_over_year))
+    df_yearly = ledger.rollup(ledger_rollups.year_category)
+    if df_yearly.shape[1] >= 2:
+        # 一番新しい年と、その前の年の内容ごとの合計
+        last, prev = df_yearly.columns[-1], df_yearly.columns[-2]
+        df_yearly["前年比(%)"] = (df_yearly[last] / df_yearly[prev].where(df_yearly[prev] != 0) * 100).round(1)
+    st.dataframe(df_yearly)
 
 else:
     st.info("まだデータがありません。")
\ No newline at end of file
@@ -0,0 +1,620 @@
+import json
+import re
+import time
+
+from gspread.utils import a1_range_to_grid_range
+
+# ==========================================
+#  動作確認用の「にせスプレッドシート」
+#  gspreadのワークシートと同じ名前のメソッドを持ち、中身はPythonのリストで持つ
+#  ・何回リクエストしたか、何バイト送受信したか(JSONにしたときの大きさ)を記録する
+#  ・本物のGoogle Sheetsにつながなくても、書き込み方の良し悪しを数字で比べられる
+#
+#  使い方: python fake_sheet.py   # 全部書き直す方式と差分だけ書く方式、手元キャッシュを確かめる
+# ==========================================
+
+
+class FakeSpreadsheet:
+    """gspread.Spreadsheetの代わり。ワークシートを何枚か持ち、書き込むたびに最終更新時刻が進む
+
+    リクエストの記録はスプレッドシート全体で1つ(どのワークシートへのリクエストも数える)。
+    latency を入れると1リクエストごとにその秒数だけ待つ。fail() で通信の失敗をまねる。
+    """
+
+    def __init__(self):
+        self.sheets = []
+        self.revision = 0
+        self.requests = []  # (メソッド名, 送ったバイト数, 受け取ったバイト数)
+        self.latency = 0.0
+        self.failures = []  # これから起こす失敗の順番("before" / "after")
+
+    def fail(self, *modes: str) -> None:
+        """次のリクエストから順に失敗させる
+
+        "before": リクエストが届かない(何も変わらない)
+        "after":  書き込みは届いたが、応答が返ってこない(中身は変わっている)
+        """
+        self.failures.extend(modes)
+
+    # --- 記録 ---
+    def _record(self, method: str, sent=None, received=None) -> None:
+        time.sleep(self.latency)
+        if self.failures and self.failures[0] == "before":
+            self.failures.pop(0)
+            raise ConnectionError(f"{method}: 接続できませんでした")
+        size = lambda payload: len(json.dumps(payload, ensure_ascii=False).encode("utf-8")) if payload is not None else 0
+        self.requests.append((method, size(sent), size(received)))
+
+    def stats(self) -> dict:
+        """{"full_reads": シートの中身を全部読んだ回数, "requests": 回数, "sent": 送ったバイト数, "received": 受け取ったバイト数}"""
+        return {
+            "full_reads": sum(r[0] in ("get_all_values", "get_all_records") for r in self.requests),
+            "requests": len(self.requests),
+            "sent": sum(r[1] for r in self.requests),
+            "received": sum(r[2] for r in self.requests),
+        }
+
+    def reset_stats(self) -> None:
+        self.requests = []
+
+    def touch(self) -> None:
+        #書き込みの最後に呼ぶ(ここで失敗させると「書けたのに応答が無い」になる)
+        self.revision += 1
+        if self.failures and self.failures[0] == "after":
+            self.failures.pop(0)
+            raise TimeoutError("応答がありませんでした")
+
+    # --- メタデータ ---
+    def get_lastUpdateTime(self):
+        #本物はDriveのAPIで modifiedTime だけを取ってくる(小さなリクエスト)
+        value = f"2025-01-01T00:00:00.{self.revision:06d}Z"
+        self._record("get_lastUpdateTime", received={"modifiedTime": value})
+        return value
+
+    @property
+    def sheet1(self):
+        return self.sheets[0]
+
+    def worksheets(self):
+        self._record("worksheets", received=[ws.title for ws in self.sheets])
+        return list(self.sheets)
+
+    def worksheet(self, title: str):
+        self._record("worksheet", received=title)
+        for ws in self.sheets:
+            if ws.title == title:
+                return ws
+        raise WorksheetNotFound(title)
+
+    def values_batch_get(self, ranges, params=None):
+        #このアプリで使うのはワークシート全体("'2025-06'")の読み込みだけ
+        value_ranges = []
+        for range_name in ranges:
+            values = self._find(range_name.strip("'"))._rendered()
+            value_ranges.append({"range": range_name, "values": values} if values else {"range": range_name})
+        self._record("values_batch_get", sent=ranges, received=value_ranges)
+        return {"valueRanges": value_ranges}
+
+    # --- 書き込み ---
+    def add_worksheet(self, title: str, rows: int, cols: int, index: int = None):
+        self._record("add_worksheet", sent=title)
+        ws = self._add(title)
+        self.touch()
+        return ws
+
+    def batch_update(self, body):
+        #このアプリで使うのはワークシートの追加(addSheet)だけ
+        self._record("batch_update", sent=body)
+        for request in body["requests"]:
+            self._add(request["addSheet"]["properties"]["title"])
+        self.touch()
+
+    def values_batch_update(self, body):
+        self._record("values_batch_update", sent=body)
+        for item in body["data"]:
+            title, range_name = item["range"].rsplit("!", 1)
+            self._find(title.strip("'"))._write(range_name, item["values"])
+        self.touch()
+
+    def _add(self, title: str):
+        if any(ws.title == title for ws in self.sheets):
+            raise ValueError(f"同じ名前のワークシートがあります: {title}")
+        return FakeWorksheet(title=title, spreadsheet=self)
+
+    def _find(self, title: str):
+        return next(ws for ws in self.sheets if ws.title == title)
+
+    def _evaluate(self, formula: str) -> str:
+        """式の値。このアプリで使う式(ledger_partitions.CHECKSUM_FORMULA)だけを、本物と同じ計算で求める"""
+        title = re.search(r"'([^']+)'!", formula).group(1)
+        ws = next((ws for ws in self.sheets if ws.title == title), None)
+        if ws is None:
+            return "#REF!"
+        rows = [row + [""] * 4 for row in ws._trimmed()[1:]]
+        count = sum(1 for row in rows if row[0])
+        total = sum(number * position * ord(char)
+                    for number, row in enumerate(rows, start=2)
+                    for position, char in enumerate("".join(row[:4])[:60], start=1))
+        return f"{count}/{total}"
+
+
+class WorksheetNotFound(Exception):
+    pass
+
+
+class FakeWorksheet:
+    """gspread.Worksheetの代わり(このアプリで使うメソッドだけ)"""
+
+    def __init__(self, rows=None, title="Sheet1", spreadsheet=None):
+        self.title = title
+        self.rows = [list(map(str, row)) for row in (rows or [])]
+        self.spreadsheet = spreadsheet or FakeSpreadsheet()
+        self.spreadsheet.sheets.append(self)
+
+    # --- 記録(スプレッドシート全体の記録を見る) ---
+    @property
+    def requests(self):
+        return self.spreadsheet.requests
+
+    def _record(self, method: str, sent=None, received=None) -> None:
+        self.spreadsheet._record(method, sent, received)
+
+    def stats(self) -> dict:
+        return self.spreadsheet.stats()
+
+    def reset_stats(self) -> None:
+        self.spreadsheet.reset_stats()
+
+    # --- 読み込み ---
+    def get_all_values(self):
+        values = self._rendered()
+        self._record("get_all_values", received=values)
+        return values
+
+    def get_all_records(self):
+        values = self._trimmed()
+        self._record("get_all_records", received=values)
+        if not values:
+            return []
+        header = values[0]
+        return [dict(zip(header, _numericise(row))) for row in values[1:]]
+
+    def row_values(self, row: int):
+        values = list(self.rows[row - 1]) if row <= len(self.rows) else []
+        self._record("row_values", received=values)
+        return values
+
+    # --- 書き込み ---
+    def clear(self):
+        self._record("clear")
+        self.rows = []
+        self.spreadsheet.touch()
+
+    def update(self, values, range_name="A1", **kwargs):
+        #gspread 6 と同じく、1つ目の引数が値(古い書き方の update("A1", 値) も受け付ける)
+        if isinstance(values, str):
+            values, range_name = range_name, values
+        self._record("update", sent=values)
+        self._write(range_name, values)
+        self.spreadsheet.touch()
+
+    def batch_update(self, data, **kwargs):
+        self._record("batch_update", sent=data)
+        for item in data:
+            self._write(item["range"], item["values"])
+        self.spreadsheet.touch()
+
+    def append_row(self, values, **kwargs):
+        self.append_rows([values], **kwargs)
+
+    def append_rows(self, values, **kwargs):
+        self._record("append_rows", sent=values)
+        #本物と同じく、データがある最後の行の次から書く
+        self.rows = self._trimmed() + [list(map(str, row)) for row in values]
+        self.spreadsheet.touch()
+
+    def resize(self, rows: int = None, cols: int = None):
+        self._record("resize", sent={"rows": rows, "cols": cols})
+        if rows is not None:
+            del self.rows[rows:]
+        self.spreadsheet.touch()
+
+    def delete_rows(self, start_index: int, end_index: int = None):
+        end_index = end_index or start_index
+        self._record("delete_rows", sent={"start": start_index, "end": end_index})
+        del self.rows[start_index - 1:end_index]
+        self.spreadsheet.touch()
+
+    # --- 中身の操作 ---
+    def _rendered(self):
+        #本物と同じく、式のセルは計算した値を返す
+        return [[self.spreadsheet._evaluate(v) if v.startswith("=") else v for v in row] for row in self._trimmed()]
+
+    def _trimmed(self):
+        rows = list(self.rows)
+        while rows and not any(rows[-1]):
+            rows.pop()
+        return rows
+
+    def _write(self, range_name: str, values) -> None:
+        grid = a1_range_to_grid_range(range_name)
+        top, left = grid.get("startRowIndex", 0), grid.get("startColumnIndex", 0)
+        for i, row in enumerate(values):
+            while len(self.rows) <= top + i:
+                self.rows.append([])
+            target = self.rows[top + i]
+            while len(target) < left + len(row):
+                target.append("")
+            target[left:left + len(row)] = [str(v) for v in row]
+
+
+def _numericise(row):
+    """get_all_records と同じく、数字だけの文字列は数値にする"""
+    return [int(v) if re.fullmatch(r"-?\d+", v) else v for v in row]
+
+
+if __name__ == "__main__":
+    import datetime
+    import os
+
+    import pandas as pd
+
+    import ledger_sync
+
+    #5年分・1日3件の家計簿
+    start = datetime.date(2021, 1, 1)
+    items = ["食費", "日用品", "交通費", "外食", "趣味"]
+    ledger = [ledger_sync.COLUMNS]
+    for day in range(365 * 5):
+        date = start + datetime.timedelta(days=day)
+        for i in range(3):
+            ledger.append([date.isoformat(), items[(day + i) % 5], str(100 * (day % 37 + i + 1)), date.strftime("%Y-%m")])
+    print(f"明細 {len(ledger) - 1:,}行")
+
+    def full_rewrite(sheet, df):
+        #これまでの save_data と同じ書き方
+        df_to_save = df.astype(str)
+        sheet.clear()
+        sheet.update([df_to_save.columns.values.tolist()] + df_to_save.values.tolist())
+
+    new_entry = pd.DataFrame({"日付": ["2025-12-31"], "内容": ["食費"], "金額": [1200], "年月": ["2025-12"]})
+
+    # 1. 1件の追加
+    results = {}
+    for name in ("全部書き直す", "差分だけ"):
+        sheet = FakeWorksheet(ledger)
+        df = ledger_sync.load_ledger(sheet)
+        sheet.reset_stats()
+        if name == "全部書き直す":
+            full_rewrite(sheet, pd.concat([df, new_entry], ignore_index=True))
+        else:
+            ledger_sync.append_entries(sheet, new_entry)
+        results[name] = (sheet.stats(), sheet.rows)
+    assert results["全部書き直す"][1] == results["差分だけ"][1], "追加後の中身が一致しません"
+    assert results["差分だけ"][0]["requests"] == 1
+    assert results["差分だけ"][0]["sent"] * 100 < results["全部書き直す"][0]["sent"]
+    print("1件の追加:", {name: stats for name, (stats, _) in results.items()})
+
+    # 2. ある月の修正(1行書き換え・1行削除・1行追加)
+    for name in ("全部書き直す", "差分だけ"):
+        sheet = FakeWorksheet(ledger)
+        df = ledger_sync.load_ledger(sheet)
+        month = df[df["年月"] == "2023-06"]
+        edited = month.copy()
+        edited.loc[edited.index[0], "金額"] = 99999
+        edited = edited.drop(index=edited.index[5])
+        edited = pd.concat([edited, pd.DataFrame({"日付": ["2023-06-30"], "内容": ["趣味"], "金額": [5000],
+                                                  "年月": ["2023-06"]}, index=[-1])])
+        sheet.reset_stats()
+        if name == "全部書き直す":
+            rest = df[df["年月"] != "2023-06"]
+            full_rewrite(sheet, pd.concat([rest, edited]).sort_values("日付", kind="stable"))
+        else:
+            summary = ledger_sync.save_changes(sheet, month, edited)
+            assert summary == {"updates": 1, "deletes": 1, "inserts": 1}, summary
+        results[name] = (sheet.stats(), sheet.rows)
+    #差分の方は行の並びが違う(追加した行は末尾)ので、並べ替えて比べる
+    assert sorted(map(tuple, results["全部書き直す"][1][1:])) == sorted(map(tuple, results["差分だけ"][1][1:])), \
+        "修正後の中身が一致しません"
+    assert results["差分だけ"][0]["requests"] == 3
+    assert results["差分だけ"][0]["sent"] * 100 < results["全部書き直す"][0]["sent"]
+    print("1か月分の修正:", {name: stats for name, (stats, _) in results.items()})
+
+    # 3. 空のシートへの最初の1件(見出しも書く)
+    sheet = FakeWorksheet()
+    df = ledger_sync.load_ledger(sheet)
+    ledger_sync.append_entries(sheet, new_entry, has_header=df.attrs["has_header"])
+    assert sheet.rows == [ledger_sync.COLUMNS, ["2025-12-31", "食費", "1200", "2025-12"]]
+    assert ledger_sync.load_ledger(sheet).index.tolist() == [2]
+
+    # 4. 手元キャッシュ: 変わっていなければ最終更新時刻を見るだけ、自分の書き込みは読み直さない
+    import tempfile
+    import time
+
+    import ledger_cache
+
+    def same_as_sheet(cache, sheet):
+        local = cache.load(sheet).sort_index()
+        remote = ledger_sync.load_ledger(sheet)
+        return ledger_sync.to_rows(local) == ledger_sync.to_rows(remote) and local.index.equals(remote.index)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        sheet = FakeWorksheet(ledger)
+        cache = ledger_cache.LedgerCache(os.path.join(tmp, "ledger.sqlite"), check_interval=0)
+        start_time = time.perf_counter()
+        df = cache.load(sheet)
+        first = time.perf_counter() - start_time
+        assert sheet.stats()["full_reads"] == 1
+        assert df["金額"].dtype == "int64" and df["日付"].dtype.kind == "M" and df["内容"].dtype == "category"
+
+        #変更なしで画面を開き直す: 小さなリクエスト1回だけ
+        sheet.reset_stats()
+        start_time = time.perf_counter()
+        cache.load(sheet)
+        again = time.perf_counter() - start_time
+        assert sheet.stats()["requests"] == 1 and sheet.stats()["full_reads"] == 0, sheet.stats()
+        print(f"開き直し: 最初 {first * 1000:.0f}ms → {again * 1000:.1f}ms, {sheet.stats()}")
+
+        #アプリを起動し直しても(メモリが空でも)SQLiteから読むだけ
+        cache = ledger_cache.LedgerCache(cache.path, check_interval=0)
+        sheet.reset_stats()
+        cache.load(sheet)
+        assert sheet.stats()["full_reads"] == 0
+
+        #アプリからの追加・修正: シートと手元が同じになり、読み直しは起きない
+        sheet.reset_stats()
+        cache.append(sheet, new_entry)
+        df = cache.load(sheet)
+        month = df[df["年月"] == "2023-06"].astype({"内容": str, "年月": str})
+        edited = month.copy()
+        edited.loc[edited.index[0], "金額"] = 99999
+        edited = edited.drop(index=edited.index[[2, 3, 7]])
+        edited = pd.concat([edited, pd.DataFrame({"日付": [pd.Timestamp("2023-06-30")], "内容": ["新しい内容"],
+                                                  "金額": [5000], "年月": ["2023-06"]}, index=[-1])])
+        assert cache.save_changes(sheet, month, edited) == {"updates": 1, "deletes": 3, "inserts": 1}
+        assert sheet.stats()["full_reads"] == 0, sheet.stats()
+        assert same_as_sheet(cache, sheet), "書き込み後に手元とシートが一致しません"
+
+        #別の場所でシートを直接編集した: 1回だけ読み直す
+        sheet.update([["2024-01-05", "外食", "3000", "2024-01"]], "A5")
+        sheet.reset_stats()
+        assert same_as_sheet(cache, sheet)
+        assert sheet.stats()["full_reads"] == 2  # 読み直し1回 + 確認用の1回
+
+        #読んだ後に別の場所で変更されたら、行番号がずれているかもしれないので保存しない
+        df = cache.load(sheet)
+        sheet.delete_rows(3)
+        month = df[df["年月"] == "2024-01"].astype({"内容": str, "年月": str})
+        try:
+            cache.save_changes(sheet, month, month.iloc[1:])
+            raise AssertionError("変更されたシートに書き込んでしまいました")
+        except RuntimeError:
+            pass
+        assert same_as_sheet(cache, sheet)
+
+    # 5. 月ごとのワークシートへの移行と、1か月分だけの読み書き
+    import ledger_partitions
+
+    def all_rows(spreadsheet, titles):
+        return sorted(tuple(row) for ws in spreadsheet.sheets if ws.title in titles for row in ws._trimmed()[1:])
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = FakeWorksheet(ledger, title="シート1")
+        spreadsheet = source.spreadsheet
+        cache = ledger_cache.LedgerCache(os.path.join(tmp, "ledger.sqlite"), check_interval=0)
+        book = ledger_partitions.PartitionedLedger(spreadsheet, cache)
+        result = book.migrate()
+        assert result == {"months": 60, "rows": len(ledger) - 1, "skipped": 0}, result
+        assert spreadsheet.stats()["full_reads"] == 1 and spreadsheet.stats()["requests"] <= 8, spreadsheet.stats()
+        months = book.months()
+        assert len(months) == 60 and months[0] == "2021-01" and source.rows == ledger  # 元のシートはそのまま
+        assert all_rows(spreadsheet, months) == sorted(map(tuple, ledger[1:]))
+        assert book.migrate()["months"] == 0  # 2回目は何もしない
+
+        #起動し直してある月を開く: 中身は手元から、ワークシートを開くだけ
+        cache = ledger_cache.LedgerCache(cache.path, check_interval=0)
+        book = ledger_partitions.PartitionedLedger(spreadsheet, cache)
+        spreadsheet.reset_stats()
+        month = book.load_month("2023-06")
+        assert len(month) == 90 and spreadsheet.stats()["full_reads"] == 0, spreadsheet.stats()
+
+        #別の場所で変更されても、読み直すのは開いた月だけ(何年分あっても同じ大きさ)
+        spreadsheet.sheet1.update([["x"]], "A1")
+        spreadsheet.reset_stats()
+        book.load_month("2023-06")
+        per_month = spreadsheet.stats()
+        single = FakeWorksheet(ledger)
+        ledger_sync.load_ledger(single)
+        assert per_month["full_reads"] == 1 and per_month["received"] * 30 < single.stats()["received"], per_month
+        print("別の場所で変更された後に1か月分を開く:", {"月ごと": per_month, "1枚のシート": single.stats()})
+
+        #1か月分の修正: 1行は別の月へ日付を変える → その月のワークシートへ移る
+        book.load_month("2023-07")
+        month = book.load_month("2023-06").astype({"内容": str, "年月": str})
+        edited = month.copy()
+        edited.loc[edited.index[0], "金額"] = 99999
+        edited.loc[edited.index[1], "日付"] = pd.Timestamp("2023-07-01")
+        edited["年月"] = edited["日付"].dt.strftime("%Y-%m")
+        spreadsheet.reset_stats()
+        summary = book.save_month("2023-06", month, edited)
+        assert summary == {"updates": 1, "deletes": 1, "inserts": 0, "moved": 1}, summary
+        assert spreadsheet.stats()["full_reads"] == 0, spreadsheet.stats()
+        assert len(book.load_month("2023-06")) == 89 and len(book.load_month("2023-07")) == 94
+        for title in ("2023-06", "2023-07"):
+            assert same_as_sheet(cache, book.worksheet(title)), f"{title} の手元とシートが一致しません"
+
+        #まだ無い月への追加: ワークシートを作って見出しと一緒に書く
+        book.append(new_entry.assign(日付="2026-01-02", 年月="2026-01"))
+        assert book.months()[-1] == "2026-01" and len(book.load_month("2026-01")) == 1
+        assert book.worksheet("2026-01").rows == [ledger_sync.COLUMNS, ["2026-01-02", "食費", "1200", "2026-01"]]
+        assert same_as_sheet(cache, book.worksheet("2026-01"))
+
+        # 6. 集計表: 追加・修正のたびに直した結果が、全部の明細を集計し直した結果と同じ
+        import ledger_rollups
+
+        def naive(spreadsheet):
+            frames = [ledger_cache.typed(ledger_sync.from_values(ws._trimmed())) for ws in spreadsheet.sheets
+                      if ledger_partitions.MONTH_TITLE.match(ws.title)]
+            df = pd.concat(frames).astype({"内容": str, "年月": str})
+            monthly = df.pivot_table(index="年月", columns="内容", values="金額", aggfunc="sum", fill_value=0)
+            totals = df.groupby("年月")["金額"].sum()
+            return monthly, totals
+
+        def check_rollups(book):
+            monthly, totals = naive(book.spreadsheet)
+            got = book.rollup(ledger_rollups.month_category)
+            pd.testing.assert_frame_equal(got, monthly, check_dtype=False, check_names=False)
+            running = book.rollup(ledger_rollups.running_totals)
+            assert running["金額"].tolist() == totals.tolist()
+            assert running["累計"].tolist() == totals.cumsum().tolist()
+            yearly = book.rollup(ledger_rollups.year_category)
+            assert yearly.sum().tolist() == totals.groupby(totals.index.str[:4]).sum().tolist()
+
+        check_rollups(book)
+        month = book.load_month("2024-03").astype({"内容": str, "年月": str})
+        edited = month.copy()
+        edited.loc[edited.index[3], "金額"] = 123456
+        edited = edited.drop(index=edited.index[10])
+        book.save_month("2024-03", month, edited)
+        book.append(new_entry.assign(日付="2021-01-15", 年月="2021-01"))
+        spreadsheet.reset_stats()
+        check_rollups(book)
+        assert spreadsheet.stats()["full_reads"] == 0 and "values_batch_get" not in {r[0] for r in spreadsheet.requests}
+
+        #手元のキャッシュが空(別のパソコン)なら、全部の月をまとめて1回で読んでから集計する
+        book = ledger_partitions.PartitionedLedger(
+            spreadsheet, ledger_cache.LedgerCache(os.path.join(tmp, "other.sqlite"), check_interval=0))
+        spreadsheet.reset_stats()
+        assert book.sync() == 61
+        assert [r[0] for r in spreadsheet.requests].count("values_batch_get") == 1, spreadsheet.requests
+        every_month = spreadsheet.stats()
+        check_rollups(book)
+
+        #別の場所で1か月分だけ直してからグラフを描く: 目印を1回読んで、変わった月だけを読み直す
+        #(同じ長さの内容に書き換えて、金額も行数も変わらなくても気づく)
+        other = book.worksheet("2022-05")
+        row = list(other.rows[3])
+        row[1] = "趣味" if row[1] != "趣味" else "外食"
+        other.update([row], "A4")
+        spreadsheet.reset_stats()
+        assert book.sync() == 1
+        one_month = spreadsheet.stats()
+        assert [r[0] for r in spreadsheet.requests].count("values_batch_get") == 2, spreadsheet.requests
+        assert one_month["received"] * 20 < every_month["received"], (one_month, every_month)
+        book.load_month("2026-01")
+        book.rollup(ledger_rollups.month_category, ["2026-01"])
+        reads = [r[0] for r in spreadsheet.requests]
+        assert reads.count("values_batch_get") == 2 and spreadsheet.stats()["full_reads"] == 0, reads
+        check_rollups(book)
+        assert same_as_sheet(book.cache, other)
+        print("別の場所で1か月分直した後にグラフを描く:", {"変わった月だけ": one_month, "全部の月": every_month})
+
+        #どの月も変わっていなければ(別のワークシートだけが変わった)、目印を読むだけ
+        spreadsheet.sheet1.update([["y"]], "A1")
+        spreadsheet.reset_stats()
+        assert book.sync() == 0
+        reads = [r for r in spreadsheet.requests if r[0] == "values_batch_get"]
+        assert len(reads) == 1 and reads[0][2] * 50 < every_month["received"], spreadsheet.requests
+        trend = book.rollup(ledger_rollups.year_over_year)
+        assert list(trend.columns) == ["2021", "2022", "2023", "2024", "2025", "2026"] and len(trend) == 12
+
+    # 7. 送信待ちの列: 登録はすぐ終わり、通信が失敗しても消えず、二重にも登録しない
+    import ledger_queue
+
+    def entry(i):
+        return pd.DataFrame({"日付": [f"2025-07-{i % 28 + 1:02d}"], "内容": ["食費"], "金額": [100 + i],
+                             "年月": ["2025-07"]})
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = FakeWorksheet(ledger[:1000], title="シート1")
+        spreadsheet = source.spreadsheet
+        book = ledger_partitions.PartitionedLedger(
+            spreadsheet, ledger_cache.LedgerCache(os.path.join(tmp, "ledger.sqlite"), check_interval=0))
+        book.migrate()
+        queue = ledger_queue.WriteQueue(lambda: book, os.path.join(tmp, "queue.sqlite"))
+        spreadsheet.latency = 0.05  # 1リクエスト50ms
+
+        #登録の待ち時間: シートに直接書く場合と比べる
+        start_time = time.perf_counter()
+        book.append(entry(0))
+        direct = time.perf_counter() - start_time
+        start_time = time.perf_counter()
+        for i in range(1, 21):
+            queue.enqueue(entry(i))
+        queued = (time.perf_counter() - start_time) / 20
+        assert queued * 10 < direct, (queued, direct)
+        spreadsheet.reset_stats()
+        assert queue.flush() == {"sent": 20, "reconciled": 0, "failed": 0}
+        assert [r[0] for r in spreadsheet.requests].count("append_rows") == 1  # 20件を1回で
+        print(f"登録1件の待ち時間: 直接 {direct * 1000:.0f}ms → 列に入れる {queued * 1000:.1f}ms")
+        spreadsheet.latency = 0.0
+
+        def july_count():
+            return len(book.worksheet("2025-07")._trimmed()) - 1
+
+        # a. 届かなかった: 列に残り、時間をおいて送り直す
+        base = july_count()
+        queue.enqueue(entry(30))
+        spreadsheet.fail("before", "before", "before", "before")
+        assert queue.flush()["failed"] == 1 and len(queue.pending()) == 1
+        assert queue.flush()["sent"] == 0  # 次に送る時刻まではそのまま
+        for hours in range(1, 10):
+            queue.flush(now=time.time() + 3600 * hours)
+        assert july_count() == base + 1
+
+        # b. 書けたのに応答が無かった: 送り直す前にシートを確かめて、二重に書かない
+        base = july_count()
+        queue.enqueue(pd.concat([entry(31), entry(32), entry(31)]))
+        spreadsheet.fail("after")
+        assert queue.flush()["failed"] == 3 and july_count() == base + 3
+        #アプリを起動し直しても列は残っている
+        queue = ledger_queue.WriteQueue(lambda: book, queue.path)
+        assert len(queue.pending()) == 3
+        assert queue.flush(now=time.time() + 3600) == {"sent": 0, "reconciled": 3, "failed": 0}
+        assert july_count() == base + 3 and same_as_sheet(book.cache, book.worksheet("2025-07"))
+
+        #応答が無かった後に、同じ月の上の行を消す編集があった: 行番号がずれても、値で見つけて二重に書かない
+        base = july_count()
+        queue.enqueue(entry(34))
+        spreadsheet.fail("after")
+        assert queue.flush()["failed"] == 1
+        month = book.load_month("2025-07").astype({"内容": str, "年月": str})
+        book.save_month("2025-07", month, month.drop(index=month.index[:3]))
+        assert queue.flush(now=time.time() + 3600) == {"sent": 0, "reconciled": 1, "failed": 0}
+        rows = book.worksheet("2025-07")._trimmed()
+        assert len(rows) - 1 == base + 1 - 3 and rows.count(ledger_sync.to_rows(entry(34))[0]) == 1
+
+        # c. シートにつながらない間も登録でき、つながったら送る
+        attempts = []
+
+        def flaky_connect():
+            attempts.append(1)
+            if len(attempts) < 3:
+                raise ConnectionError("オフライン")
+            return book
+
+        base = july_count()
+        queue = ledger_queue.WriteQueue(flaky_connect, queue.path)
+        queue.enqueue(entry(33))
+        assert queue.flush()["failed"] == 1 and queue.flush(now=time.time() + 3600)["failed"] == 1
+        assert queue.flush(now=time.time() + 7200)["sent"] == 1 and july_count() == base + 1
+
+        # d. 裏のスレッドで送る(遅い回線でも、登録した分は全部まとめて届く)
+        spreadsheet.latency = 0.02
+        queue = ledger_queue.WriteQueue(lambda: book, queue.path, flush_interval=0.05)
+        queue.start()
+        base = july_count()
+        for i in range(40, 50):
+            queue.enqueue(entry(i))
+            if i == 45:
+                spreadsheet.fail("before")
+        deadline = time.time() + 30
+        while len(queue.pending()) and time.time() < deadline:
+            time.sleep(0.05)
+            if len(queue.pending()) and queue.pending()["エラー"].notna().any():
+                queue.flush(now=time.time() + 3600)  # 失敗した分の待ち時間を飛ばす
+        queue.stop()
+        spreadsheet.latency = 0.0
+        assert len(queue.pending()) == 0 and july_count() == base + 10
+        assert same_as_sheet(book.cache, book.worksheet("2025-07"))
+    print("OK")
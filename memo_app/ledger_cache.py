@@ -0,0 +1,256 @@
+import os
+import sqlite3
+import threading
+import time
+
+import pandas as pd
+
+import ledger_rollups
+import ledger_sync
+
+# ==========================================
+#  家計簿の手元キャッシュ (SQLite)
+#  ・画面を触るたびにシート全体を読み込むのをやめて、手元のコピーを使う
+#  ・シートが変わったかどうかは「最終更新時刻」(Driveのメタデータ、数百バイト)だけで確かめる
+#    変わっていたら(別の端末やシートを直接編集したとき)だけ、そのワークシートを読み直す
+#  ・このアプリから書き込んだ分は、シートと同じ変更を手元にも反映するので読み直さない
+#  ・日付は日付型、金額は整数、内容はカテゴリ型にしてから渡すので、月ごとの絞り込みや集計が速い
+#  ワークシートごと(月ごとに分けたときは1か月ごと)に、タイトルで区別して持ちます
+# ==========================================
+
+#保存先。環境変数 MEMO_APP_CACHE_DIR で変更できます
+CACHE_DIR = os.environ.get(
+    "MEMO_APP_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache"),
+)
+CHECK_INTERVAL = 10.0  # 最終更新時刻を確かめる間隔(秒)。この間は手元のコピーをそのまま使う
+SCHEMA_VERSION = 4     # 保存形式を変えたら上げる(古いキャッシュは作り直す)
+
+
+def typed(df: pd.DataFrame) -> pd.DataFrame:
+    """シートから読んだ文字列の表を、日付型・整数・カテゴリ型の表にする(index = 行番号)"""
+    out = pd.DataFrame(index=df.index)
+    out["日付"] = pd.to_datetime(df["日付"] if "日付" in df.columns else None, errors="coerce")
+    out["内容"] = (df["内容"] if "内容" in df.columns else "").astype(str).astype("category")
+    amounts = df["金額"] if "金額" in df.columns else 0
+    out["金額"] = pd.to_numeric(amounts, errors="coerce").fillna(0).round().astype("int64")
+    #昔のデータで「年月」列が無いときは日付から作る
+    months = df["年月"].astype(str) if "年月" in df.columns else out["日付"].dt.strftime("%Y-%m")
+    out["年月"] = months.astype("category")
+    out.index.name = "行"
+    return out
+
+
+class LedgerCache:
+    """シートの中身の手元コピー(SQLiteに保存し、メモリにも持っておく)"""
+
+    def __init__(self, path: str = None, check_interval: float = CHECK_INTERVAL):
+        self.path = path or os.path.join(CACHE_DIR, "ledger.sqlite")
+        self.check_interval = check_interval
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.lock = threading.RLock()  # 裏で送信するスレッド(ledger_queue)とも共有する
+        self._frames = {}       # ワークシートのタイトル → 表
+        self._revision = None   # 最後に確かめたシートの最終更新時刻
+        self._checked_at = 0.0
+        with self._connect() as conn:
+            if conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+                #ただのコピーなので、形式が古ければ捨てて作り直す(次の load でシートから読む)
+                for table in ("ledger", "meta", "sheets", "partitions", *ledger_rollups.TABLES):
+                    conn.execute(f"DROP TABLE IF EXISTS {table}")
+                conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            conn.execute("CREATE TABLE IF NOT EXISTS ledger (シート TEXT, 行 INTEGER, 日付 TEXT, 内容 TEXT, "
+                         "金額 INTEGER, 年月 TEXT, PRIMARY KEY (シート, 行))")
+            #checksum: 手元のコピーを読んだ時点の、そのワークシートの目印(ledger_partitions.CHECKSUM_FORMULA の値)
+            conn.execute("CREATE TABLE IF NOT EXISTS sheets (シート TEXT PRIMARY KEY, revision TEXT, "
+                         "has_header INTEGER, checksum TEXT)")
+            conn.execute("CREATE TABLE IF NOT EXISTS partitions (シート TEXT PRIMARY KEY)")
+            ledger_rollups.create_tables(conn)
+
+    def _connect(self):
+        return sqlite3.connect(self.path)
+
+    # --- 目印(最終更新時刻) ---
+    def revision(self, spreadsheet, force: bool = False) -> str:
+        """シートの最終更新時刻(Driveのメタデータ)。check_interval秒の間は前回の値を使う"""
+        with self.lock:
+            now = time.monotonic()
+            if force or self._revision is None or now - self._checked_at >= self.check_interval:
+                self._revision = spreadsheet.get_lastUpdateTime()
+                self._checked_at = now
+            return self._revision
+
+    def _sheet_meta(self, title: str) -> tuple:
+        """(手元のコピーの時点の最終更新時刻, 見出しがあるか)"""
+        with self._connect() as conn:
+            row = conn.execute("SELECT revision, has_header FROM sheets WHERE シート = ?", (title,)).fetchone()
+        return (row[0], bool(row[1])) if row else (None, False)
+
+    def is_fresh(self, title: str, revision: str) -> bool:
+        return self._sheet_meta(title)[0] == revision
+
+    def carry_forward(self, before: str, after: str) -> None:
+        """自分の書き込みで最終更新時刻が before → after に進んだ
+
+        before の時点で最新だったコピーは、書き込んだもの以外も after の時点で最新のまま。
+        (こうしないと、1か月分を書いただけで他の月を全部読み直すことになる)
+        """
+        with self.lock:
+            with self._connect() as conn:
+                conn.execute("UPDATE sheets SET revision = ? WHERE revision = ?", (after, before))
+            self._revision = after
+            self._checked_at = time.monotonic()
+
+    # --- 月ごとに分けたときの、ワークシートの一覧 ---
+    def partitions(self) -> list[str]:
+        with self._connect() as conn:
+            return [row[0] for row in conn.execute("SELECT シート FROM partitions ORDER BY シート")]
+
+    def set_partitions(self, titles, key: str, revision: str) -> None:
+        """ワークシートの一覧を入れ替える(いつの時点の一覧かは key の名前で sheets に記録する)"""
+        with self.lock, self._connect() as conn:
+            conn.execute("DELETE FROM partitions")
+            conn.executemany("INSERT INTO partitions VALUES (?)", [(title,) for title in titles])
+            conn.execute("INSERT OR REPLACE INTO sheets (シート, revision, has_header) VALUES (?, ?, 0)",
+                         (key, revision))
+
+    # --- 読み込み ---
+    def load(self, sheet) -> pd.DataFrame:
+        """家計簿の表(日付順、index = シートの行番号)。シートが変わっていなければ手元のコピーを返す"""
+        with self.lock:
+            title = sheet.title
+            revision = self.revision(sheet.spreadsheet)
+            if not self.is_fresh(title, revision):
+                #別の場所で変更された: このワークシートを1回だけ読み直して手元を入れ替える
+                raw = ledger_sync.load_ledger(sheet)
+                self._store(title, typed(raw), revision=revision, has_header=raw.attrs.get("has_header", False))
+            elif title not in self._frames:
+                self._frames[title] = self._read_local(title)
+            return self._copy(title)
+
+    def _copy(self, title: str) -> pd.DataFrame:
+        df = self._frames[title].copy()
+        df.attrs["has_header"] = self._sheet_meta(title)[1]
+        return df
+
+    def _read_local(self, title: str) -> pd.DataFrame:
+        with self._connect() as conn:
+            df = pd.read_sql("SELECT 行, 日付, 内容, 金額, 年月 FROM ledger WHERE シート = ?", conn,
+                             params=(title,), index_col="行")
+        return self._sorted(typed(df))
+
+    @staticmethod
+    def _sorted(df: pd.DataFrame) -> pd.DataFrame:
+        #表示用に日付順(同じ日付はシートの順)
+        return df.sort_values("日付", kind="stable")
+
+    def _store(self, title: str, frame: pd.DataFrame, revision: str, has_header: bool, checksum: str = None) -> None:
+        """1つのワークシートの手元のコピーを入れ替える"""
+        records = [(title, int(row), *values) for row, values in zip(frame.index, ledger_sync.to_rows(frame))]
+        with self._connect() as conn:
+            conn.execute("DELETE FROM ledger WHERE シート = ?", (title,))
+            conn.executemany("INSERT INTO ledger VALUES (?, ?, ?, ?, ?, ?)", records)
+            conn.execute("INSERT OR REPLACE INTO sheets VALUES (?, ?, ?, ?)",
+                         (title, revision, int(has_header), checksum))
+            #集計表も同じトランザクションで直す(明細と集計がずれないように)
+            ledger_rollups.update(conn, title, frame)
+        self._frames[title] = self._sorted(frame)
+
+    def store(self, title: str, raw: pd.DataFrame, revision: str, has_header: bool = True,
+              checksum: str = None) -> None:
+        """シートに書いたばかりの中身(index = 行番号)や作ったばかりの空のシートを、読み込まずに手元に登録する"""
+        with self.lock:
+            self._store(title, typed(raw), revision=revision, has_header=has_header, checksum=checksum)
+
+    def read_rollup(self, fn, *args):
+        """集計表を読む(fn は ledger_rollups.month_category などの読み出し用の関数)"""
+        with self._connect() as conn:
+            return fn(conn, *args)
+
+    def stale(self, titles, revision: str) -> list[str]:
+        """titles のうち、手元に無いか、revision の時点より古いもの"""
+        with self._connect() as conn:
+            fresh = {row[0] for row in conn.execute("SELECT シート FROM sheets WHERE revision = ?", (revision,))}
+        return [title for title in titles if title not in fresh]
+
+    def checksums(self, titles) -> dict:
+        """titles の手元のコピーを読んだ時点の目印(わからないものは None)"""
+        with self._connect() as conn:
+            known = dict(conn.execute("SELECT シート, checksum FROM sheets"))
+        return {title: known.get(title) for title in titles}
+
+    def mark_fresh(self, titles, revision: str) -> None:
+        """目印を比べて中身が変わっていなかったワークシートを、読み直さずに revision の時点で最新とする"""
+        with self.lock, self._connect() as conn:
+            conn.executemany("UPDATE sheets SET revision = ? WHERE シート = ?", [(revision, title) for title in titles])
+
+    def forget(self, title: str) -> None:
+        """消されたワークシートの分を、手元のコピーと集計表から除く"""
+        with self.lock, self._connect() as conn:
+            conn.execute("DELETE FROM ledger WHERE シート = ?", (title,))
+            conn.execute("DELETE FROM sheets WHERE シート = ?", (title,))
+            ledger_rollups.forget(conn, title)
+            self._frames.pop(title, None)
+
+    # --- 書き込み(シートと手元の両方に同じ変更をする) ---
+    def _before_write(self, sheet) -> tuple[pd.DataFrame, str, bool]:
+        """書き込む前の手元のコピー(シートの形の文字列)、今の最終更新時刻、シートが別の場所で変わっていたか"""
+        title = sheet.title
+        revision = self.revision(sheet.spreadsheet, force=True)
+        frame = self._frames[title] if title in self._frames else self._read_local(title)
+        raw = pd.DataFrame(ledger_sync.to_rows(frame), columns=ledger_sync.COLUMNS, index=frame.index)
+        return raw, revision, not self.is_fresh(title, revision)
+
+    @staticmethod
+    def _appended(raw: pd.DataFrame, rows: list) -> pd.DataFrame:
+        #シートと同じく、データがある最後の行の次から行番号をふる
+        first = (int(raw.index.max()) if len(raw) else ledger_sync.HEADER_ROWS) + 1
+        added = pd.DataFrame(rows, columns=ledger_sync.COLUMNS, index=range(first, first + len(rows)))
+        return pd.concat([raw, added])
+
+    def append(self, sheet, df_new: pd.DataFrame) -> None:
+        """新しい明細をシートの末尾に追加し、手元のコピーにも同じ行番号で追加する"""
+        with self.lock:
+            raw, before, stale = self._before_write(sheet)
+            ledger_sync.append_entries(sheet, df_new, has_header=self._sheet_meta(sheet.title)[1])
+            if stale:
+                #末尾への追加は行番号に関係ないので書き込んでよいが、手元は読み直す
+                after = self.revision(sheet.spreadsheet, force=True)
+                self._store(sheet.title, typed(ledger_sync.load_ledger(sheet)), revision=after, has_header=True)
+                return
+            self._commit(sheet, self._appended(raw, ledger_sync.to_rows(df_new)), before)
+
+    def save_changes(self, sheet, df_before: pd.DataFrame, df_after: pd.DataFrame) -> dict:
+        """編集で変わった行だけをシートに書き、手元のコピーにも同じ変更(行番号のずれも含めて)をする"""
+        with self.lock:
+            diff = ledger_sync.diff_rows(df_before, df_after)
+            if not any(diff.values()):
+                return {name: 0 for name in diff}
+            raw, before, stale = self._before_write(sheet)
+            if stale:
+                #行番号で書き換えるので、シートが変わっていたら書き込まない(別の行を壊してしまう)
+                raise RuntimeError("シートが別の場所で変更されています。読み直してからもう一度保存してください")
+            ledger_sync.apply_diff(sheet, diff)
+
+            for row, values in diff["updates"].items():
+                raw.loc[row] = values
+            if diff["deletes"]:
+                #シートで行を消すと、その下の行は消した行数だけ上にずれる
+                deleted = pd.Index(diff["deletes"])
+                raw = raw.drop(index=deleted)
+                raw.index = raw.index - deleted.searchsorted(raw.index)
+            if diff["inserts"]:
+                raw = self._appended(raw, diff["inserts"])
+            self._commit(sheet, raw, before)
+            return {name: len(rows) for name, rows in diff.items()}
+
+    def _commit(self, sheet, raw: pd.DataFrame, before: str) -> None:
+        """手元のコピーを保存し、書き込み後のシートの最終更新時刻を記録する"""
+        after = self.revision(sheet.spreadsheet, force=True)
+        self._store(sheet.title, typed(raw), revision=before, has_header=True)
+        self.carry_forward(before, after)
+
+    def invalidate(self) -> None:
+        """次の load でシートを読み直させる"""
+        with self.lock, self._connect() as conn:
+            conn.execute("UPDATE sheets SET revision = NULL")
+            self._revision = None
@@ -0,0 +1,231 @@
+import functools
+import re
+
+import pandas as pd
+
+import ledger_cache
+import ledger_sync
+
+# ==========================================
+#  家計簿を「1か月 = 1ワークシート」に分けて持つ
+#  ・ワークシートの名前が年月("2025-06")。何か月分あるかの一覧(目次)は手元のキャッシュに持つ
+#  ・月を選んで表示・修正・保存しても、読み書きするのはその月のワークシートだけ
+#    (何年分たまっても、1回の操作の重さは変わらない)
+#  ・今までの1枚のシートからは migrate で移す(元のシートは消さずにそのまま残す)
+#  ・最終更新時刻はスプレッドシート全体で1つなので、別の場所で1か月分を直しただけでも全部の月が
+#    古く見える。月ごとの目印(CHECKSUM_FORMULA)を1回のリクエストで読み、変わった月だけを読み直す
+# ==========================================
+
+MONTH_TITLE = re.compile(r"^\d{4}-\d{2}$")  # 月のワークシートの名前
+INDEX_KEY = "#月の一覧"  # 手元のキャッシュで、月の一覧がいつの時点のものかを記録する名前
+CHECK_SHEET = "#更新確認"  # 月ごとの目印を計算するワークシート(A列 = 年月、B列 = 目印の式)
+#その月の見出しより下の行数と、行番号 × 文字の位置 × 文字コード の合計(A〜D列をつないだ先頭60文字)。
+#中身が変われば値が変わるので、値を比べるだけで読み直すかどうかを決められる
+CHECKSUM_FORMULA = ("=COUNTA('{0}'!A2:A)&\"/\"&TEXT(SUMPRODUCT(ROW('{0}'!A2:A)*SEQUENCE(1,60)*IFERROR(UNICODE(MID("
+                    "'{0}'!A2:A&'{0}'!B2:B&'{0}'!C2:C&'{0}'!D2:D,SEQUENCE(1,60),1)),0)),\"0\")")
+
+
+def month_of(df: pd.DataFrame) -> pd.Series:
+    """各行がどの月のワークシートに入るか("2025-06")。年月が空なら日付から作る"""
+    dates = pd.to_datetime(df["日付"], errors="coerce").dt.strftime("%Y-%m")
+    if "年月" not in df.columns:
+        return dates
+    months = df["年月"].astype(str)
+    return months.where(months.str.fullmatch(MONTH_TITLE.pattern), dates)
+
+
+def _locked(method):
+    """手元のキャッシュと同じロックを持って動かす(裏で送信するスレッドと同時に触らないように)"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.cache.lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+class PartitionedLedger:
+    """月ごとのワークシートに分けた家計簿(読み書きは LedgerCache を通す)"""
+
+    def __init__(self, spreadsheet, cache):
+        self.spreadsheet = spreadsheet
+        self.cache = cache
+        self._sheets = {}  # 年月 → ワークシート
+        self._checks = None  # 目印のワークシート(まだ調べていなければ None、無ければ False)
+
+    # --- 目次(月の一覧) ---
+    @_locked
+    def months(self) -> list[str]:
+        """データがある月の一覧(古い順)。シートが変わっていなければ手元の目次を使う"""
+        revision = self.cache.revision(self.spreadsheet)
+        if not self.cache.is_fresh(INDEX_KEY, revision):
+            self._refresh_index(revision)
+        return self.cache.partitions()
+
+    def _refresh_index(self, revision: str) -> None:
+        #ワークシートの名前を調べるだけ(中身は読まない)
+        worksheets = self.spreadsheet.worksheets()
+        self._sheets = {ws.title: ws for ws in worksheets if MONTH_TITLE.match(ws.title)}
+        self._checks = next((ws for ws in worksheets if ws.title == CHECK_SHEET), False)
+        for title in set(self.cache.partitions()) - set(self._sheets):
+            #別の場所でワークシートが消された
+            self.cache.forget(title)
+        self.cache.set_partitions(sorted(self._sheets), INDEX_KEY, revision)
+
+    @_locked
+    def worksheet(self, month: str, create: bool = False):
+        if month in self._sheets:
+            return self._sheets[month]
+        if month in self.months():
+            if month not in self._sheets:
+                #目次は手元にあるが、ワークシートはまだ開いていない(アプリを起動し直した後など)
+                self._sheets[month] = self.spreadsheet.worksheet(month)
+        elif create:
+            self._add_month(month)
+        else:
+            raise KeyError(f"{month} のワークシートがありません")
+        return self._sheets[month]
+
+    def _add_month(self, month: str) -> None:
+        """新しい月のワークシートを作り、目次と手元のキャッシュに空のシートとして登録する"""
+        if not MONTH_TITLE.match(month):
+            raise ValueError(f"月の名前が正しくありません: {month}")
+        before = self.cache.revision(self.spreadsheet, force=True)
+        if not self.cache.is_fresh(INDEX_KEY, before):
+            self._refresh_index(before)
+        self._sheets[month] = self.spreadsheet.add_worksheet(title=month, rows=100, cols=len(ledger_sync.COLUMNS))
+        self.cache.set_partitions(sorted(self._sheets), INDEX_KEY, before)
+        self.cache.store(month, ledger_sync.empty_ledger(), before, has_header=False)
+        self.cache.carry_forward(before, self.cache.revision(self.spreadsheet, force=True))
+
+    # --- 読み込み・書き込み(1か月分だけ) ---
+    @_locked
+    def load_month(self, month: str) -> pd.DataFrame:
+        """その月の明細(日付順、index = その月のワークシートの行番号)"""
+        if month not in self.months():
+            return ledger_cache.typed(ledger_sync.empty_ledger())
+        return self.cache.load(self.worksheet(month))
+
+    @_locked
+    def append(self, df_new: pd.DataFrame) -> int:
+        """新しい明細を、それぞれの月のワークシートの末尾に追加する(無い月は作る)"""
+        months = month_of(df_new)
+        for month, rows in df_new.groupby(months, sort=True):
+            self.cache.append(self.worksheet(month, create=True), rows)
+        return len(df_new)
+
+    @_locked
+    def save_month(self, month: str, df_before: pd.DataFrame, df_after: pd.DataFrame) -> dict:
+        """その月の編集を保存する。日付を別の月に変えた行は、その月のワークシートへ移す"""
+        months = month_of(df_after).fillna(month)
+        moved = df_after[months != month]
+        summary = self.cache.save_changes(self.worksheet(month), df_before, df_after[months == month])
+        if len(moved):
+            self.append(moved.assign(年月=months[months != month]))
+        summary["moved"] = len(moved)
+        return summary
+
+    # --- 集計表(ledger_rollups) ---
+    @_locked
+    def sync(self) -> int:
+        """手元に無い月・中身が変わった月を、まとめて読む(目印1回 + 中身1回のリクエスト)。読んだ月の数を返す
+
+        集計表は手元にある月の分しか持てないので、何か月分もまとめて見る前にそろえておく。
+        最終更新時刻が変わっていても、目印が前に読んだときと同じ月は読み直さない。
+        """
+        revision = self.cache.revision(self.spreadsheet)
+        months = self.months()
+        stale = self.cache.stale(months, revision)
+        if not stale:
+            return 0
+        if self._checks is None:
+            self._refresh_index(revision)
+        if not self._checks:
+            #目印のワークシートがまだ無い: 先に作っておけば、この後に中身と一緒に目印も読める
+            self._write_checks(months)
+            revision = self.cache.revision(self.spreadsheet)
+        known = self.cache.checksums(stale)
+        if any(known.values()):
+            #目印だけを読む(1か月1セルなので、何年分あっても小さい)
+            response = self.spreadsheet.values_batch_get([f"'{CHECK_SHEET}'"])
+            current = self._parse_checksums(response["valueRanges"][0])
+            unchanged = [month for month in stale if known[month] is not None and known[month] == current.get(month)]
+            self.cache.mark_fresh(unchanged, revision)
+            stale = [month for month in stale if month not in unchanged]
+            if not stale:
+                return 0
+
+        #中身と一緒に目印も読む(同じ時点の値なので、次に比べるときに使える)
+        response = self.spreadsheet.values_batch_get([f"'{month}'" for month in stale] + [f"'{CHECK_SHEET}'"])
+        checksums = self._parse_checksums(response["valueRanges"][-1])
+        for month, value_range in zip(stale, response["valueRanges"]):
+            raw = ledger_sync.from_values(value_range.get("values", []))
+            self.cache.store(month, raw, revision, has_header=raw.attrs["has_header"], checksum=checksums.get(month))
+        if set(checksums) != set(months):
+            #月が増えた・消えた(このアプリで新しい月を作ったときも): 次の回から目印で比べられるように書き直す
+            self._write_checks(months)
+        return len(stale)
+
+    @staticmethod
+    def _parse_checksums(value_range: dict) -> dict:
+        return {row[0]: row[1] for row in value_range.get("values", []) if len(row) >= 2 and row[0]}
+
+    def _write_checks(self, months: list[str]) -> None:
+        """目印のワークシートに、今ある月の分の式を書く(無ければ作る)。次の sync から使える"""
+        before = self.cache.revision(self.spreadsheet, force=True)
+        n_rows = max(len(months), 1)
+        if self._checks:
+            #月の数に合わせる(消えた月の行は消え、増えた月の分は書ける)
+            self._checks.resize(rows=n_rows)
+        else:
+            self._checks = self.spreadsheet.add_worksheet(title=CHECK_SHEET, rows=n_rows, cols=2)
+        self._checks.update([[month, CHECKSUM_FORMULA.format(month)] for month in months], "A1",
+                            value_input_option="USER_ENTERED")
+        self.cache.carry_forward(before, self.cache.revision(self.spreadsheet, force=True))
+
+    @_locked
+    def rollup(self, fn, *args):
+        """集計表を読む(fn は ledger_rollups.month_category などの読み出し用の関数)"""
+        self.sync()
+        return self.cache.read_rollup(fn, *args)
+
+    # --- 1枚のシートからの移行 ---
+    @_locked
+    def migrate(self, source=None) -> dict:
+        """1枚のシートの明細を、月ごとのワークシートに書き写す(元のシートはそのまま残す)
+
+        読み込み1回、ワークシートの作成1回、書き込み1回のリクエストで済ませる。
+        すでにワークシートがある月は書き写さない(2回実行しても二重にならない)。
+        """
+        source = source or self.spreadsheet.sheet1
+        df = ledger_sync.load_ledger(source)
+        if df.empty:
+            return {"months": 0, "rows": 0, "skipped": 0}
+        months = month_of(df)
+        existing = set(self.months())
+        groups = {month: rows for month, rows in df.groupby(months, sort=True) if month not in existing}
+        skipped = len(df) - sum(len(rows) for rows in groups.values())
+        if not groups:
+            return {"months": 0, "rows": 0, "skipped": skipped}
+
+        n_columns = len(ledger_sync.COLUMNS)
+        before = self.cache.revision(self.spreadsheet, force=True)
+        self.spreadsheet.batch_update({"requests": [
+            {"addSheet": {"properties": {"title": month, "gridProperties": {"rowCount": len(rows) + 1,
+                                                                            "columnCount": n_columns}}}}
+            for month, rows in groups.items()
+        ]})
+        self.spreadsheet.values_batch_update({
+            "valueInputOption": "RAW",
+            "data": [{"range": f"'{month}'!A1",
+                      "values": [ledger_sync.COLUMNS] + ledger_sync.to_rows(rows.assign(年月=month))}
+                     for month, rows in groups.items()],
+        })
+        after = self.cache.revision(self.spreadsheet, force=True)
+
+        #書いた中身はわかっているので、読み直さずに手元のキャッシュに入れる
+        self._refresh_index(after)
+        for month, rows in groups.items():
+            raw = rows.assign(年月=month).reindex(columns=ledger_sync.COLUMNS)
+            raw.index = range(ledger_sync.HEADER_ROWS + 1, ledger_sync.HEADER_ROWS + 1 + len(raw))
+            self.cache.store(month, raw, after)
+        return {"months": len(groups), "rows": len(df) - skipped, "skipped": skipped}
@@ -0,0 +1,186 @@
+import collections
+import os
+import sqlite3
+import threading
+import time
+
+import pandas as pd
+
+import ledger_cache
+import ledger_partitions
+import ledger_sync
+
+# ==========================================
+#  登録した明細の送信待ちの列(オフラインでも登録できるように)
+#  ・「登録」を押したら、まず手元のSQLiteに書いてすぐ終わる(シートの応答を待たない)
+#  ・裏のスレッドが数秒おきに、たまった分を月ごとにまとめて1回の append_rows で送る
+#  ・送れなかったら列に残して、間隔を倍々に空けながら送り直す(アプリを閉じても消えない)
+#  ・送ったのに応答が返ってこなかった(届いたかどうかわからない)分は、送り直す前に
+#    その月のシートを読み直して、もう書かれていないかを値で確かめる(二重に登録しない)
+# ==========================================
+
+QUEUE_PATH = os.path.join(ledger_cache.CACHE_DIR, "queue.sqlite")  # キャッシュとは別(作り直しても消さない)
+FLUSH_INTERVAL = 2.0   # 何秒おきに送るか(この間に登録した分は1回でまとめて送る)
+BATCH_SIZE = 200       # 1回に送る最大の件数
+RETRY_DELAY = 2.0      # 送れなかったときに、次に送るまでの最初の間隔(秒)。失敗するたびに倍にする
+MAX_RETRY_DELAY = 300.0
+
+
+class WriteQueue:
+    """送信待ちの明細(SQLiteに保存)と、それを裏で送るスレッド
+
+    connect はシートにつないで PartitionedLedger を返す関数。送るときに初めて呼ぶので、
+    つながらない間も明細は登録できる(つながるまで送るたびに呼び直す)。
+    """
+
+    def __init__(self, connect, path: str = QUEUE_PATH, flush_interval: float = FLUSH_INTERVAL,
+                 batch_size: int = BATCH_SIZE):
+        self.connect = connect
+        self._ledger = None
+        self.path = path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._stop = threading.Event()
+        self._thread = None
+        self._flushing = threading.Lock()  # 同じ明細を2つのスレッドから同時に送らないように
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            #attempts: 送ろうとした回数。1回以上なら、シートに届いているかもしれない
+            #seen: 送ろうとしたときに、その月のシートにすでにあった同じ値の行の数
+            #      (これより多く見つかれば届いている。行番号は編集でずれるので使わない)
+            #failures: 続けて失敗した回数(次に送るまでの間隔を決める)
+            conn.execute("CREATE TABLE IF NOT EXISTS queue (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                         "日付 TEXT, 内容 TEXT, 金額 TEXT, 年月 TEXT, created REAL, attempts INTEGER DEFAULT 0, "
+                         "seen INTEGER, failures INTEGER DEFAULT 0, next_try REAL DEFAULT 0, last_error TEXT)")
+            if "seen" not in {row[1] for row in conn.execute("PRAGMA table_info(queue)")}:
+                #行番号(after_row)で確かめていた頃の列。seen が無い明細は、届いたかわからないので送り直す
+                conn.execute("ALTER TABLE queue ADD COLUMN seen INTEGER")
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    @property
+    def ledger(self):
+        if self._ledger is None:
+            self._ledger = self.connect()
+        return self._ledger
+
+    # --- 登録(すぐ終わる) ---
+    def enqueue(self, df_new: pd.DataFrame) -> int:
+        """新しい明細を送信待ちの列に入れる。シートには裏で送る"""
+        df = df_new.copy()
+        df["年月"] = ledger_partitions.month_of(df)
+        now = time.time()
+        with self._connect() as conn:
+            conn.executemany("INSERT INTO queue (日付, 内容, 金額, 年月, created) VALUES (?, ?, ?, ?, ?)",
+                             [(*values, now) for values in ledger_sync.to_rows(df)])
+        return len(df)
+
+    def pending(self) -> pd.DataFrame:
+        """まだシートに送れていない明細(古い順)"""
+        with self._connect() as conn:
+            return pd.read_sql("SELECT id, 日付, 内容, 金額, 年月, attempts AS 送信回数, last_error AS エラー "
+                               "FROM queue ORDER BY id", conn, index_col="id")
+
+    # --- 送信 ---
+    def flush(self, now: float = None) -> dict:
+        """送る時刻になった分を、月ごとにまとめて送る。{"sent": 送った件数, "reconciled": 届いていた件数, "failed": 失敗した件数}"""
+        now = time.time() if now is None else now
+        with self._flushing:
+            return self._flush(now)
+
+    def _flush(self, now: float) -> dict:
+        with self._connect() as conn:
+            due = pd.read_sql("SELECT * FROM queue WHERE next_try <= ? ORDER BY id LIMIT ?", conn,
+                              params=(now, self.batch_size), index_col="id")
+        result = {"sent": 0, "reconciled": 0, "failed": 0}
+        if due.empty:
+            return result
+        try:
+            self.ledger
+        except Exception as e:
+            #つながらない: 全部を次の回に回す
+            self._mark_failed(due.index, e, now)
+            result["failed"] = len(due)
+            return result
+        for month, rows in due.groupby("年月", sort=True):
+            try:
+                with self.ledger.cache.lock:
+                    done = self._reconcile(month, rows) if (rows["attempts"] > 0).any() else []
+                    result["reconciled"] += len(done)
+                    self._remove(done)
+                    rows = rows.drop(index=done)
+                    if rows.empty:
+                        continue
+                    self._mark_attempt(rows, self._on_sheet(month))
+                    self.ledger.append(rows[ledger_sync.COLUMNS])
+                self._remove(rows.index)
+                result["sent"] += len(rows)
+            except Exception as e:
+                self._mark_failed(rows.index, e, now)
+                result["failed"] += len(rows)
+        return result
+
+    def _on_sheet(self, month: str) -> collections.Counter:
+        """その月のシートにある行を、値ごとに数える"""
+        return collections.Counter(map(tuple, ledger_sync.to_rows(self.ledger.load_month(month))))
+
+    def _reconcile(self, month: str, rows: pd.DataFrame) -> list:
+        """前に送ろうとした明細のうち、実はシートに届いていたものの id
+
+        その月の全部の行を値で数え、送ろうとしたときより同じ値の行が増えていれば、その分は届いている。
+        (間に別の行が消されて行番号がずれても、値で数えるので見落とさない)
+        """
+        #届いていればシートの最終更新時刻が変わっているので、その月は読み直しになる
+        self.ledger.cache.revision(self.ledger.spreadsheet, force=True)
+        sent = rows[(rows["attempts"] > 0) & rows["seen"].notna()]
+        on_sheet = self._on_sheet(month)
+        done = []
+        #同じ値の明細は、送ろうとしたときに見えていた行が多い(後から送った)ものから対応させる
+        for queue_id, values, seen in sorted(zip(sent.index, map(tuple, ledger_sync.to_rows(sent)), sent["seen"]),
+                                             key=lambda item: -item[2]):
+            if on_sheet[values] > seen:
+                on_sheet[values] -= 1
+                done.append(queue_id)
+        return done
+
+    def _mark_attempt(self, rows: pd.DataFrame, on_sheet: collections.Counter) -> None:
+        #送る前に記録しておく(送っている途中でアプリが止まっても、次は届いたかを確かめてから送る)
+        with self._connect() as conn:
+            conn.executemany("UPDATE queue SET attempts = attempts + 1, seen = COALESCE(seen, ?) WHERE id = ?",
+                             [(on_sheet[tuple(values)], int(i))
+                              for i, values in zip(rows.index, ledger_sync.to_rows(rows))])
+
+    def _mark_failed(self, ids, error: Exception, now: float) -> None:
+        with self._connect() as conn:
+            for i in ids:
+                failures = conn.execute("SELECT failures FROM queue WHERE id = ?", (int(i),)).fetchone()[0]
+                delay = min(MAX_RETRY_DELAY, RETRY_DELAY * 2 ** failures)
+                conn.execute("UPDATE queue SET failures = failures + 1, next_try = ?, last_error = ? WHERE id = ?",
+                             (now + delay, f"{type(error).__name__}: {error}", int(i)))
+
+    def _remove(self, ids) -> None:
+        with self._connect() as conn:
+            conn.executemany("DELETE FROM queue WHERE id = ?", [(int(i),) for i in ids])
+
+    # --- 裏のスレッド ---
+    def start(self) -> None:
+        """flush_interval秒おきに送るスレッドを動かす(何回呼んでも1つだけ)"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="ledger-queue", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = None) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception:
+                #列を読めないなど、思いがけないエラーでもスレッドは止めない(次の回にまた試す)
+                pass
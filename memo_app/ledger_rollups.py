@@ -0,0 +1,90 @@
+import pandas as pd
+
+# ==========================================
+#  支出の集計表(ロールアップ)
+#  ・月×内容、年×内容の合計と、月ごとの累計を手元のSQLiteに持っておく
+#  ・明細が変わるたびに(LedgerCacheが1枚のワークシートの中身を入れ替えるたびに)
+#    そのシートの月×内容だけを作り直し、関係する年と、その月から後の累計だけを足し直す
+#  ・グラフを描くときは集計表を読むだけ(明細を1行ずつ集計し直さない)
+# ==========================================
+
+TABLES = ("rollup_month", "rollup_year", "rollup_running")
+
+
+def create_tables(conn) -> None:
+    #月×内容はワークシートごとに持つ(どのシートの分かわかれば、そのシートの分だけ入れ替えられる)
+    conn.execute("CREATE TABLE IF NOT EXISTS rollup_month (シート TEXT, 年月 TEXT, 内容 TEXT, 金額 INTEGER, "
+                 "件数 INTEGER, PRIMARY KEY (シート, 年月, 内容))")
+    conn.execute("CREATE TABLE IF NOT EXISTS rollup_year (年 TEXT, 内容 TEXT, 金額 INTEGER, 件数 INTEGER, "
+                 "PRIMARY KEY (年, 内容))")
+    conn.execute("CREATE TABLE IF NOT EXISTS rollup_running (年月 TEXT PRIMARY KEY, 金額 INTEGER, 累計 INTEGER)")
+
+
+def update(conn, title: str, frame: pd.DataFrame) -> None:
+    """1枚のワークシートの明細(日付型・整数に変換済みの表)が入れ替わったときに、集計表を直す"""
+    old_months = {row[0] for row in conn.execute("SELECT DISTINCT 年月 FROM rollup_month WHERE シート = ?", (title,))}
+    months = frame["年月"].astype(str)
+    valid = frame[months.str.fullmatch(r"\d{4}-\d{2}")]
+    grouped = valid.groupby([valid["年月"].astype(str), valid["内容"].astype(str)])["金額"].agg(["sum", "count"])
+    conn.execute("DELETE FROM rollup_month WHERE シート = ?", (title,))
+    conn.executemany("INSERT INTO rollup_month VALUES (?, ?, ?, ?, ?)",
+                     [(title, month, item, int(total), int(count))
+                      for (month, item), (total, count) in grouped.iterrows()])
+
+    changed = old_months | set(grouped.index.get_level_values(0))
+    if not changed:
+        return
+    #年×内容: 関係する年だけ、月×内容から足し直す(1年分でも12か月×内容の数の行だけ)
+    for year in sorted({month[:4] for month in changed}):
+        conn.execute("DELETE FROM rollup_year WHERE 年 = ?", (year,))
+        conn.execute("INSERT INTO rollup_year SELECT substr(年月, 1, 4), 内容, SUM(金額), SUM(件数) "
+                     "FROM rollup_month WHERE substr(年月, 1, 4) = ? GROUP BY 内容", (year,))
+    _update_running(conn, min(changed))
+
+
+def _update_running(conn, since: str) -> None:
+    """月ごとの合計と累計を、since の月から後だけ作り直す"""
+    row = conn.execute("SELECT 累計 FROM rollup_running WHERE 年月 < ? ORDER BY 年月 DESC LIMIT 1",
+                       (since,)).fetchone()
+    total = row[0] if row else 0
+    months = conn.execute("SELECT 年月, SUM(金額) FROM rollup_month WHERE 年月 >= ? GROUP BY 年月 ORDER BY 年月",
+                          (since,)).fetchall()
+    records = []
+    for month, amount in months:
+        total += amount
+        records.append((month, amount, total))
+    conn.execute("DELETE FROM rollup_running WHERE 年月 >= ?", (since,))
+    conn.executemany("INSERT INTO rollup_running VALUES (?, ?, ?)", records)
+
+
+def forget(conn, title: str) -> None:
+    """ワークシートを手元から消したときに、その分を集計表から除く"""
+    update(conn, title, pd.DataFrame({"年月": [], "内容": [], "金額": []}))
+
+
+# --- 読み出し(グラフ用) ---
+def month_category(conn, months: list[str] = None) -> pd.DataFrame:
+    """行 = 年月、列 = 内容 の合計金額(months を渡すとその月だけ)"""
+    df = pd.read_sql("SELECT 年月, 内容, SUM(金額) AS 金額 FROM rollup_month GROUP BY 年月, 内容", conn)
+    if months is not None:
+        df = df[df["年月"].isin(months)]
+    return df.pivot_table(index="年月", columns="内容", values="金額", aggfunc="sum", fill_value=0)
+
+
+def year_category(conn) -> pd.DataFrame:
+    """行 = 内容、列 = 年 の合計金額"""
+    df = pd.read_sql("SELECT 年, 内容, 金額 FROM rollup_year", conn)
+    return df.pivot_table(index="内容", columns="年", values="金額", aggfunc="sum", fill_value=0)
+
+
+def running_totals(conn) -> pd.DataFrame:
+    """月ごとの合計と、最初の月からの累計(index = 年月)"""
+    return pd.read_sql("SELECT 年月, 金額, 累計 FROM rollup_running ORDER BY 年月", conn, index_col="年月")
+
+
+def year_over_year(conn) -> pd.DataFrame:
+    """行 = 月(1〜12)、列 = 年 の合計金額(前の年と同じ月どうしを比べる用)"""
+    df = running_totals(conn).reset_index()
+    df["年"] = df["年月"].str[:4]
+    df["月"] = df["年月"].str[5:7].astype(int)
+    return df.pivot_table(index="月", columns="年", values="金額", aggfunc="sum")
@@ -0,0 +1,120 @@
+import pandas as pd
+from gspread.utils import rowcol_to_a1
+
+# ==========================================
+#  スプレッドシートへの書き込みを「差分だけ」にする部品
+#  ・新しい明細は append_rows で末尾に足すだけ(シート全体を消して書き直さない)
+#  ・修正は、変わった行だけをまとめて1回の batch_update で書き換える
+#  ・削除した行は delete_rows で消す(下の行から消すので、行番号がずれない)
+#  読み込んだ表の index に「シートの何行目か」を入れておくのがポイントです
+# ==========================================
+
+COLUMNS = ["日付", "内容", "金額", "年月"]
+HEADER_ROWS = 1  # 1行目は見出し
+
+
+def empty_ledger() -> pd.DataFrame:
+    df = pd.DataFrame(columns=COLUMNS)
+    df.attrs["has_header"] = False
+    return df
+
+
+def load_ledger(sheet) -> pd.DataFrame:
+    """シートを読み込む(index = シートの行番号)。見出ししか無ければ空の表"""
+    return from_values(sheet.get_all_values())
+
+
+def from_values(values: list[list[str]]) -> pd.DataFrame:
+    """シートの値(1行目が見出しのリストのリスト)を表にする(index = シートの行番号)"""
+    if not values:
+        return empty_ledger()
+
+    header, rows = values[0], values[HEADER_ROWS:]
+    #APIは行の末尾の空のセルを省くので、見出しの長さにそろえる
+    rows = [row + [""] * (len(header) - len(row)) for row in rows]
+    df = pd.DataFrame(rows, columns=header, index=range(HEADER_ROWS + 1, HEADER_ROWS + 1 + len(rows)))
+    #途中の空行(手で消した行など)は読み飛ばす。行番号はそのまま残る
+    df = df[(df != "").any(axis=1)].copy()
+    df.attrs["has_header"] = True
+    if "金額" in df.columns:
+        df["金額"] = pd.to_numeric(df["金額"], errors="coerce")
+    return df
+
+
+def to_rows(df: pd.DataFrame) -> list[list[str]]:
+    """シートに書く形(見出しの順の文字列のリスト)にする
+
+    日付型の列は "2025-01-31"、金額は整数の文字列("1200.0" ではなく "1200")にそろえる。
+    """
+    df = df.reindex(columns=COLUMNS)
+    if pd.api.types.is_datetime64_any_dtype(df["日付"]):
+        df["日付"] = df["日付"].dt.strftime("%Y-%m-%d").fillna("")
+    if pd.api.types.is_numeric_dtype(df["金額"]):
+        df["金額"] = df["金額"].round().astype("Int64").astype(str).replace("<NA>", "")
+    return df.astype(str).values.tolist()
+
+
+# --- 1. 追加 ---
+def append_entries(sheet, df_new: pd.DataFrame, has_header: bool = True) -> int:
+    """新しい明細を末尾に追加する(見出しが無いシートなら見出しも一緒に)。リクエストは1回"""
+    rows = to_rows(df_new)
+    if not has_header:
+        rows = [COLUMNS] + rows
+    if rows:
+        sheet.append_rows(rows)
+    return len(df_new)
+
+
+# --- 2. 修正(選んだ月の分だけ) ---
+def diff_rows(df_before: pd.DataFrame, df_after: pd.DataFrame) -> dict:
+    """編集前後の表(index = 行番号)を比べて、書き換え・削除・追加する行を調べる
+
+    編集画面で追加した行は、元の表に無い index になるので「追加」として扱う。
+    """
+    before = dict(zip(df_before.index, to_rows(df_before)))
+    after = to_rows(df_after)
+    updates, inserts, kept = {}, [], set()
+    for row_number, values in zip(df_after.index, after):
+        if row_number in before:
+            kept.add(row_number)
+            if values != before[row_number]:
+                updates[row_number] = values
+        else:
+            inserts.append(values)
+    deletes = sorted(set(before) - kept)
+    return {"updates": updates, "deletes": deletes, "inserts": inserts}
+
+
+def _blocks(row_numbers: list[int]) -> list[tuple[int, int]]:
+    """連続した行番号を(開始, 終了)のかたまりにまとめる"""
+    blocks = []
+    for row in sorted(row_numbers):
+        if blocks and row == blocks[-1][1] + 1:
+            blocks[-1] = (blocks[-1][0], row)
+        else:
+            blocks.append((row, row))
+    return blocks
+
+
+def apply_diff(sheet, diff: dict) -> None:
+    """diff_rowsの結果をシートに書き込む
+
+    書き換え → 削除(下の行から) → 追加 の順にするので、書き換える行の番号は削除の影響を受けない。
+    リクエストは、書き換え1回 + 削除するかたまりの数 + 追加1回 まで。
+    """
+    if diff["updates"]:
+        sheet.batch_update([
+            {"range": f"{rowcol_to_a1(row, 1)}:{rowcol_to_a1(row, len(COLUMNS))}", "values": [values]}
+            for row, values in diff["updates"].items()
+        ])
+    for start, end in reversed(_blocks(diff["deletes"])):
+        sheet.delete_rows(start, end)
+    if diff["inserts"]:
+        sheet.append_rows(diff["inserts"])
+
+
+def save_changes(sheet, df_before: pd.DataFrame, df_after: pd.DataFrame) -> dict:
+    """編集で変わった行だけをシートに反映する。{"updates": 件数, "deletes": 件数, "inserts": 件数}を返す"""
+    diff = diff_rows(df_before, df_after)
+    apply_diff(sheet, diff)
+    return {name: len(rows) for name, rows in diff.items()}
@@ -1,6 +1,8 @@
 import streamlit as st
 import pandas as pd
 import stock_utils  # ★作成した裏方ファイルを読み込む！
+import screener
+import backtest
 
 # ==========================================
 #  アプリの画面処理 (UI)
@@ -10,7 +12,7 @@ st.title("株価分析ダッシュボード 📊")
 
 # --- 1. サイドバー（入力） ---
 st.sidebar.header("分析モード選択")
-mode = st.sidebar.radio("データの入力方法", ["手入力・ファイル", "業種別リスト(JPX)"])
+mode = st.sidebar.radio("データの入力方法", ["手入力・ファイル", "業種別リスト(JPX)", "全銘柄スクリーニング"])
 
 target_tickers = []
 name_map = {}
@@ -29,38 +31,102 @@ if mode == "手入力・ファイル":
 
 elif mode == "業種別リスト(JPX)":
     jpx_file = "data_j.xls"
-    # ★裏方の関数呼び出し
-    df_jpx = stock_utils.load_jpx_data(jpx_file)
+    # ★裏方の関数呼び出し(業種ごとの索引は起動時に1回だけ作られる)
+    jpx_index = stock_utils.load_jpx_index(jpx_file)
     
-    if df_jpx.empty:
+    if jpx_index.empty:
         st.sidebar.error(f"'{jpx_file}' が見つかりません。")
     else:
-        sectors = df_jpx["33業種区分"].unique().tolist()
-        selected_sector = st.sidebar.selectbox("業種を選択してください", sectors)
+        selected_sector = st.sidebar.selectbox("業種を選択してください", jpx_index.sectors)
         
-        df_sector_stocks = df_jpx[df_jpx["33業種区分"] == selected_sector]
+        df_sector_stocks = jpx_index.sector_frame(selected_sector)
         st.sidebar.info(f"{selected_sector}: {len(df_sector_stocks)}銘柄")
         
         target_tickers = df_sector_stocks["コード"].tolist()
-        name_map = dict(zip(df_sector_stocks["コード"], df_sector_stocks["銘柄名"]))
+        name_map = jpx_index.name_map
 
         limit = st.sidebar.slider("取得上限数", 5, len(df_sector_stocks), 10)
         target_tickers = target_tickers[:limit]
         st.sidebar.text(f"上位{len(target_tickers)}件を取得します")
 
+elif mode == "全銘柄スクリーニング":
+    jpx_file = "data_j.xls"
+    jpx_index = stock_utils.load_jpx_index(jpx_file)
+
+    if jpx_index.empty:
+        st.sidebar.error(f"'{jpx_file}' が見つかりません。")
+    else:
+        # 全銘柄の指標・株価をキャッシュに入れておく(2回目以降は古い分だけ取得)
+        with st.sidebar.expander("データ更新(全銘柄)"):
+            all_codes = jpx_index.df["コード"].tolist()
+            if st.button(f"指標を更新する({len(all_codes)}銘柄)"):
+                stock_utils.fetch_financial_metrics(all_codes, name_map=jpx_index.name_map, max_workers=16)
+                stock_utils.refresh_sector_stats(jpx_file)
+                stock_utils.load_screening_universe.clear()
+            if st.button("株価を更新する(6ヶ月)"):
+                with st.spinner("株価を更新中..."):
+                    stock_utils.get_price_store().update(all_codes, period="6mo")
+                stock_utils.load_screening_universe.clear()
+
+        st.sidebar.subheader("スクリーニング条件")
+        markets = st.sidebar.multiselect("市場", jpx_index.markets, default=jpx_index.markets)
+        per_range = st.sidebar.slider("PER(予)", 0.0, 100.0, (0.0, 15.0), 0.5)
+        pbr_range = st.sidebar.slider("PBR", 0.0, 10.0, (0.0, 1.5), 0.1)
+        min_roe = st.sidebar.slider("ROEの下限(%)", -20.0, 50.0, 8.0, 1.0)
+        min_yield_screen = st.sidebar.slider("配当利回りの下限(%)", 0.0, 10.0, 3.0, 0.1)
+        min_cap = st.sidebar.slider("時価総額の下限(億円)", 0, 10000, 100, 50)
+        use_price = st.sidebar.checkbox("株価の条件も使う(騰落率・RSI)", value=False)
+        if use_price:
+            momentum_range = st.sidebar.slider("騰落率(3ヶ月, %)", -100.0, 200.0, (-100.0, 200.0), 5.0)
+            rsi_range = st.sidebar.slider("RSI(14日)", 0.0, 100.0, (0.0, 100.0), 1.0)
+        top_n = st.sidebar.slider("表示件数", 10, 200, 50, 10)
+
+        if st.sidebar.button("スクリーニング実行"):
+            df_universe = stock_utils.load_screening_universe(jpx_file)
+            criteria = {
+                "PER(予)": per_range,
+                "PBR": pbr_range,
+                "ROE": (min_roe / 100, None),
+                "配当利回り": (min_yield_screen, None),
+                "時価総額": (min_cap * 100_000_000, None),
+            }
+            if use_price:
+                criteria["騰落率(3ヶ月)"] = momentum_range
+                criteria["RSI"] = rsi_range
+            df_universe = df_universe[df_universe["市場・商品区分"].isin(markets)]
+            df_screened = screener.screen(
+                df_universe, criteria,
+                rank_by={"PER(予)": True, "PBR": True, "配当利回り": False, "ROE": False},
+                top=top_n,
+            )
+            st.write(f"### スクリーニング結果: {len(df_universe)}銘柄中 上位{len(df_screened)}件")
+            st.session_state["df_data"] = df_screened
+
 
 # --- 2. データ取得実行 ---
-if st.sidebar.button("データを取得する"):
+max_workers = st.sidebar.slider("同時取得数(並列)", 1, 32, 8)
+force_refresh = st.sidebar.checkbox("キャッシュを使わずに取り直す", value=False)
+
+if mode != "全銘柄スクリーニング" and st.sidebar.button("データを取得する"):
     if target_tickers:
         if mode == "業種別リスト(JPX)":
             st.write(f"### 業種分析: {len(target_tickers)}件を取得中...")
-        
+
         # ★裏方にデータ取得を依頼
-        df = stock_utils.fetch_financial_metrics(target_tickers, name_map=name_map)
+        df = stock_utils.fetch_financial_metrics(target_tickers, name_map=name_map,
+                                                max_workers=max_workers, force_refresh=force_refresh)
         st.session_state["df_data"] = df
     else:
         st.sidebar.warning("銘柄コードが見つかりません")
 
+cache_stats = stock_utils.get_fundamentals_cache().stats()
+if cache_stats["entries"]:
+    st.sidebar.caption(
+        f"指標キャッシュ: {cache_stats['entries']}銘柄保存 / "
+        f"ヒット{cache_stats['hits']}件・取得{cache_stats['misses']}件 / "
+        f"最古 {cache_stats['oldest_age'] / 3600:.1f}時間前"
+    )
+
 
 # --- 3. 結果表示 ---
 if "df_data" in st.session_state:
@@ -87,6 +153,9 @@ if "df_data" in st.session_state:
 
     st.success(f"条件に合う銘柄: {len(df_filtered)}件")
 
+    #下の「個別銘柄の業績分析」ですぐ表示できるよう、決算データを裏で先読みしておく
+    prefetch_status = stock_utils.prefetch_statements(df_filtered["コード"].tolist())
+
     # 表示用データの作成
     df_display = df_filtered.copy()
     if not df_display.empty:
@@ -109,13 +178,14 @@ if "df_data" in st.session_state:
                 "時価総額": "{:,.0f}"
             })
         )
-        csv_data = df_display.to_csv(index=False).encode("utf-8-sig")
-        st.download_button(label="分析結果CSVダウンロード", data=csv_data, file_name="my_stock.csv", mime="text/csv")
+        export_format = st.radio("ダウンロード形式", ["csv", "xlsx", "parquet"], horizontal=True)
+        st.download_button(label="分析結果ダウンロード", data=stock_utils.export_bytes(df_display, export_format),
+                           file_name=f"my_stock.{export_format}", mime=stock_utils.EXPORT_MIME[export_format])
 
     # --- グラフ表示エリア ---
     st.divider()
     st.subheader("分析グラフ")
-    tab1, tab2 = st.tabs(["時価総額比較", "割安性分析(PER/PBR)"])
+    tab1, tab2, tab3, tab4, tab5 = st.tabs(["時価総額比較", "割安性分析(PER/PBR)", "値動き比較", "業種別の水準", "バックテスト"])
 
     with tab1:
         if not df_filtered.empty:
@@ -127,6 +197,38 @@ if "df_data" in st.session_state:
             df_chart = df_filtered.dropna(subset=["PER(予)", "PBR"])
             # ★裏方のグラフ描画関数を呼ぶだけ！
             stock_utils.visualize_scatter(df_chart)
+
+    with tab3:
+        if not df_filtered.empty:
+            # 絞り込んだ銘柄すべてを、日経平均・TOPIXと同じグラフで比べる
+            stock_utils.visualize_comparison(df_filtered, st.session_state.get('selected_period_code', '1y'))
+
+    with tab4:
+        # 指標の更新時に作っておいた業種別の集計表を表示するだけ
+        stock_utils.visualize_sector_table()
+
+    with tab5:
+        if not df_filtered.empty:
+            # 絞り込んだ銘柄に売買ルールを当てはめて、過去の成績を計算する
+            col_a, col_b, col_c = st.columns(3)
+            bt_signal = col_a.selectbox("売買ルール", list(backtest.SIGNALS), index=1)
+            bt_rebalance = col_b.selectbox("リバランス", list(backtest.REBALANCE_RULES), index=2)
+            bt_period = col_c.selectbox("検証期間", list(backtest.PERIODS), index=2)
+            bt_cost = st.slider("売買コスト(片道, %)", 0.0, 1.0, backtest.DEFAULT_COST_BPS / 100, 0.05)
+            if bt_signal == "移動平均クロス":
+                bt_params = {"short_span": st.slider("短期線", 5, 50, 5, 5), "long_span": st.slider("長期線", 20, 200, 25, 5)}
+            elif bt_signal == "ボリンジャーバンド逆張り":
+                bt_params = {"window": st.slider("移動平均の期間", 10, 60, 20, 5), "k": st.slider("バンドの幅(σ)", 1.0, 3.0, 2.0, 0.5)}
+            elif bt_signal == "RSI逆張り":
+                bt_params = {"period": st.slider("RSIの期間", 5, 30, 14, 1),
+                             "lower": st.slider("買い(RSIがこれ未満)", 10, 50, 30, 5),
+                             "upper": st.slider("売り(RSIがこれ超え)", 50, 90, 70, 5)}
+            else:
+                bt_params = {}
+            if st.button("バックテスト実行"):
+                stock_utils.visualize_backtest(
+                    df_filtered["コード"].tolist(), backtest.PERIODS[bt_period], bt_signal,
+                    bt_params, backtest.REBALANCE_RULES[bt_rebalance], bt_cost * 100)
     
     # --- 4.個別銘柄の深掘り分析エリア ---
     st.divider()
@@ -145,6 +247,11 @@ if "df_data" in st.session_state:
             selected_name = selected_company.split(" : ")[1]
             
             st.write(f"**{selected_name} ({selected_code})** の決算データを取得中...")
+            if prefetch_status["pending"]:
+                st.caption(f"決算データの先読み: {prefetch_status['done']}/{prefetch_status['total']}件 完了")
+
+            #業種の中での位置(事前に集計した表から)
+            stock_utils.show_sector_position(selected_code)
 
             #裏方の関数を呼び出してデータ取得
             df_performance = stock_utils.fetch_company_performance(selected_code)
@@ -171,29 +278,40 @@ if "df_data" in st.session_state:
                         long_span = st.slider('長期線の周期を選択してください', 50, 200, 50, 25)
                         show_bollinger = st.checkbox('ボリンジャーバンドを表示する', value=True)
 
-                    #2.裏方に「plotly図の作成」を依頼
-                    fig = stock_utils.plot_stock_plotly(df_history, selected_name, short_span, long_span, show_bollinger)
+                    #2.裏方に「plotly図の作成」を依頼(変わった設定の部分だけ作り直される)
+                    current_period = st.session_state.get('selected_period_code', '1y')
+                    charts = stock_utils.build_price_charts(selected_code, selected_name, current_period,
+                                                            short_span, long_span, show_bollinger)
                     #3.画面に表示
-                    st.plotly_chart(fig, use_container_width=True)
+                    st.plotly_chart(charts["price"], use_container_width=True)
                     #4.出来高グラフを追加
                     st.subheader("出来高推移")
-                    fig_vol = stock_utils.plot_volume_plotly(df_history, selected_name)
-                    st.plotly_chart(fig_vol, use_container_width=True)
+                    st.plotly_chart(charts["volume"], use_container_width=True)
                     #5.RSIグラフを追加
                     st.subheader("RSI")
-                    fig_rsi = stock_utils.plot_RSI_plotly(df_history, selected_name)
-                    st.plotly_chart(fig_rsi, use_container_width=True)
+                    st.plotly_chart(charts["rsi"], use_container_width=True)
                     #6.銘柄と日経平均の変化率比較
                     st.subheader("日経平均との変化率比較")
-                    current_period = st.session_state.get('selected_period_code', '1y')
-                    df_benchmark = stock_utils.fetch_stock_history('^N225', period=current_period)
-                    if not df_benchmark.empty:
-                        fig_comparison = stock_utils.plot_comparison_plotly(df_history, df_benchmark, selected_name)
-                        st.plotly_chart(fig_comparison, use_container_width=True)
+                    if charts["comparison"] is not None:
+                        st.plotly_chart(charts["comparison"], use_container_width=True)
                     else:
                         st.warning("日経平均データが取得できませんでした")
                 else:
                     st.warning("株価データが取得できませんでした")
             else:
                 st.warning("決算データが取得できませんでした(ETFや直近上場企業の可能性があります)")
-    
\ No newline at end of file
+    
+
+# --- デバッグ: キャッシュの効き具合と通信状況 ---
+with st.sidebar.expander("デバッグ: キャッシュ・通信状況"):
+    memo = stock_utils.get_memo()
+    memo_stats = memo.stats()
+    if memo_stats.empty:
+        st.caption("まだキャッシュは使われていません")
+    else:
+        st.dataframe(memo_stats.style.format({"ヒット率(%)": "{:.0f}", "メモリ(KB)": "{:,.0f}"}), hide_index=True)
+        st.caption(f"使用メモリ: {memo.total_bytes / 1024 / 1024:.1f} / {memo.max_bytes / 1024 / 1024:.0f} MB")
+    request_stats = stock_utils.get_scheduler().stats()
+    if not request_stats.empty:
+        st.write("Yahoo Financeへのリクエスト")
+        st.dataframe(request_stats.style.format({"平均遅延(ms)": "{:.0f}", "最大遅延(ms)": "{:.0f}"}), hide_index=True)
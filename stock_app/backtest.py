@@ -0,0 +1,182 @@
+import numpy as np
+import pandas as pd
+
+import indicators
+import screener
+
+# ==========================================
+#  バックテスト (Backtest)
+#  全銘柄の終値(行が日付、列がコード)に対して、売買シグナル・スクリーニング条件・リバランス周期・
+#  売買コストを与えて資産の推移を計算する。銘柄ごとのループは使わず、配列の一括計算で行う
+#  ・シグナルはその日の終値で判定し、その日の終値で売買したものとして翌日からの値動きを反映する
+#  ・リバランス日に条件を満たす銘柄を等金額で買い、次のリバランス日までは持ちっぱなし(値動きで比率は変わる)
+#  ※Streamlitに依存しません
+# ==========================================
+
+DEFAULT_COST_BPS = 10.0  # 片道の売買コスト(0.1%)
+TRADING_DAYS = 245
+#リバランス周期: 表示名 -> pandasの期間の単位
+REBALANCE_RULES = {"毎日": "D", "毎週": "W", "毎月": "M", "四半期ごと": "Q"}
+#検証期間: 表示名 -> yfinanceの期間
+PERIODS = {"1年": "1y", "2年": "2y", "5年": "5y", "10年": "10y"}
+
+
+# --- 売買シグナル(保有するならTrue。入力・出力とも (日数, 銘柄数)) ---
+def _hold_between(entries: np.ndarray, exits: np.ndarray) -> np.ndarray:
+    """買いシグナルから売りシグナルまで持ち続ける(同じ日に両方出たら売り)"""
+    n_rows = len(entries)
+    rows = np.arange(n_rows)[:, None]
+    #列ごとに「最後に買い/売りシグナルが出た行」を前から順に引き継いで、新しい方を採る
+    last_entry = np.maximum.accumulate(np.where(entries, rows, -1), axis=0)
+    last_exit = np.maximum.accumulate(np.where(exits, rows, -1), axis=0)
+    return last_entry > last_exit
+
+
+def sma_cross(close: np.ndarray, short_span: int = 5, long_span: int = 25) -> np.ndarray:
+    """短期線が長期線より上にある間は保有(ゴールデンクロスで買い、デッドクロスで売り)"""
+    with np.errstate(invalid="ignore"):
+        return indicators.sma(close, short_span) > indicators.sma(close, long_span)
+
+
+def bollinger_reversion(close: np.ndarray, window: int = 20, k: float = 2.0) -> np.ndarray:
+    """終値が下のバンドを割ったら買い、中心線まで戻ったら売り"""
+    middle, _, lower = indicators.bollinger(close, window, k)
+    with np.errstate(invalid="ignore"):
+        return _hold_between(close < lower, close >= middle)
+
+
+def rsi_reversion(close: np.ndarray, period: int = 14, lower: float = 30, upper: float = 70) -> np.ndarray:
+    """RSIがlowerを下回ったら買い、upperを上回ったら売り"""
+    values = indicators.rsi(close, period)
+    with np.errstate(invalid="ignore"):
+        return _hold_between(values < lower, values > upper)
+
+
+def buy_and_hold(close: np.ndarray) -> np.ndarray:
+    """株価がある間はずっと保有(比較用)"""
+    return np.isfinite(close)
+
+
+#表示名 -> シグナル関数
+SIGNALS = {
+    "保有し続ける": buy_and_hold,
+    "移動平均クロス": sma_cross,
+    "ボリンジャーバンド逆張り": bollinger_reversion,
+    "RSI逆張り": rsi_reversion,
+}
+
+
+def screen_mask(universe: pd.DataFrame, criteria: dict, codes) -> np.ndarray:
+    """スクリーニング条件を満たす銘柄をTrueにした配列(codesの順)
+
+    指標は今のキャッシュの値なので、過去のどの日も同じ銘柄が対象になる(当時の指標ではない点に注意)。
+    """
+    selected = set(screener.screen(universe, criteria)["コード"])
+    return np.array([code in selected for code in codes])
+
+
+# --- 本体 ---
+def rebalance_rows(index: pd.DatetimeIndex, rule) -> np.ndarray:
+    """リバランスする行番号(各期間の最初の取引日)。ruleは"D"/"W"/"M"/"Q"か、何営業日ごとかの整数"""
+    n_rows = len(index)
+    if isinstance(rule, (int, np.integer)):
+        return np.arange(0, n_rows, max(1, int(rule)))
+    if rule == "D":
+        return np.arange(n_rows)
+    periods = index.to_period(rule).asi8
+    return np.flatnonzero(np.r_[True, periods[1:] != periods[:-1]])
+
+
+def run(closes: pd.DataFrame, positions: np.ndarray, rebalance="M", cost_bps: float = DEFAULT_COST_BPS) -> dict:
+    """保有シグナルから資産の推移を計算する
+
+    closes: 終値(行が日付、列がコード)。positions: 保有するならTrueの (日数, 銘柄数) の配列
+    リバランス日の終値の時点でTrueの銘柄を等金額で持ち、該当が無ければ現金(値動きなし)にする。
+    戻り値: {"equity": 資産の推移(初め=1), "returns": 日次の損益率, "turnover": リバランス日ごとの売買比率,
+             "holdings": リバランス日ごとの保有銘柄数, "stats": 成績のまとめ}
+    """
+    values = closes.to_numpy(dtype=float)
+    n_rows, n_cols = values.shape
+    cost = cost_bps / 10_000
+
+    #日々の値動き(株価が無い日は動かないものとする)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        log_growth = np.log(values[1:] / values[:-1])
+    log_growth[~np.isfinite(log_growth)] = 0.0
+    cum_log = np.vstack([np.zeros((1, n_cols)), np.cumsum(log_growth, axis=0)])
+
+    #リバランス日の目標比率(等金額)。株価が無い銘柄は買えない
+    rows = rebalance_rows(closes.index, rebalance)
+    held = np.asarray(positions, dtype=bool)[rows] & np.isfinite(values[rows])
+    counts = held.sum(axis=1)
+    weights = held / np.maximum(counts, 1)[:, None]
+    cash = 1.0 - weights.sum(axis=1)
+
+    #各日の資産は、前日までで最後のリバランス日を1として「比率×その日までの値上がり」の合計
+    #(リバランス日の当日の値動きは、まだ前の期間の比率で受ける)
+    period = np.searchsorted(rows, np.arange(n_rows), side="left") - 1
+    valid = period >= 0
+    base = rows[np.maximum(period, 0)]
+    growth = np.exp(cum_log - cum_log[base])
+    value = np.where(valid, cash[np.maximum(period, 0)], 1.0)
+    value += np.einsum("ij,ij->i", np.where(valid[:, None], weights[np.maximum(period, 0)], 0.0), growth)
+
+    #リバランス直前の(値動きで変わった)比率と新しい比率の差が売買した量
+    drifted = np.zeros_like(weights)
+    if len(rows) > 1:
+        before = rows[1:]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            drifted[1:] = weights[:-1] * growth[before] / value[before][:, None]
+    turnover = np.abs(weights - drifted).sum(axis=1)
+
+    #日次の損益率: 同じ期間内は前日比、リバランス日の翌日は期間の始め(=1)との比
+    daily = np.zeros(n_rows)
+    starts = np.zeros(n_rows, dtype=bool)
+    starts[rows] = True
+    previous = np.r_[1.0, value[:-1]]
+    previous[1:][starts[:-1]] = 1.0
+    daily[1:] = value[1:] / previous[1:] - 1
+    daily[~valid] = 0.0
+    #売買コストはリバランス日の終値で資産から差し引く
+    cost_factor = np.ones(n_rows)
+    cost_factor[rows] = 1 - turnover * cost
+    equity = np.cumprod((1 + daily) * cost_factor)
+
+    index = closes.index
+    result = {
+        "equity": pd.Series(equity, index=index, name="資産"),
+        "returns": pd.Series(np.r_[0.0, equity[1:] / equity[:-1] - 1], index=index, name="損益率"),
+        "turnover": pd.Series(turnover, index=index[rows], name="売買比率"),
+        "holdings": pd.Series(counts, index=index[rows], name="保有銘柄数"),
+    }
+    result["stats"] = summarize(result)
+    return result
+
+
+def summarize(result: dict) -> dict:
+    """年率リターン・年率ボラティリティ・シャープレシオ・最大下落率・平均保有数・年間売買比率"""
+    equity = result["equity"].to_numpy()
+    returns = result["returns"].to_numpy()[1:]
+    years = max(len(equity) - 1, 1) / TRADING_DAYS
+    volatility = returns.std(ddof=1) * np.sqrt(TRADING_DAYS) if len(returns) > 1 else np.nan
+    return {
+        "年率リターン(%)": (equity[-1] ** (1 / years) - 1) * 100 if len(equity) else np.nan,
+        "年率ボラティリティ(%)": volatility * 100,
+        "シャープレシオ": returns.mean() * TRADING_DAYS / volatility if volatility else np.nan,
+        "最大下落率(%)": (equity / np.maximum.accumulate(equity) - 1).min() * 100 if len(equity) else np.nan,
+        "平均保有数": result["holdings"].mean(),
+        "年間売買比率(%)": result["turnover"].iloc[1:].sum() / years * 100,
+    }
+
+
+def backtest(closes: pd.DataFrame, signal: str = "移動平均クロス", params: dict = None, rebalance="M",
+             cost_bps: float = DEFAULT_COST_BPS, mask: np.ndarray = None) -> dict:
+    """シグナルの名前(SIGNALSのキー)とパラメータで全銘柄のバックテストをする
+
+    mask: 対象にする銘柄(列)をTrueにした配列(screen_maskの結果など)。Noneなら全銘柄
+    """
+    values = closes.to_numpy(dtype=float)
+    positions = SIGNALS[signal](values, **(params or {}))
+    if mask is not None:
+        positions = positions & np.asarray(mask, dtype=bool)[None, :]
+    return run(closes, positions, rebalance=rebalance, cost_bps=cost_bps)
@@ -0,0 +1,483 @@
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import fetcher
+import indicators
+import jpx_master
+import screener
+from scheduler import RequestScheduler
+from statements import StatementWarehouse
+from stub_provider import StubProvider, make_codes
+
+# ==========================================
+#  性能計測スクリプト
+#  使い方: python benchmark.py [fetch|jpx|indicators|screen|scheduler|imports|statements|scatter|downsample|comparison|backtest|sweep|export]
+# ==========================================
+
+
+def bench_fetch(n_codes: int = 64, latency: float = 0.05):
+    """並列取得エンジンの同時取得数ごとの所要時間を測る(スタブ相手なのでネット不要)"""
+    codes = make_codes(n_codes)
+    print(f"銘柄数: {n_codes}, 1件あたりの遅延: {latency * 1000:.0f}ms")
+    print(f"{'workers':>8} {'秒':>8} {'件/秒':>8} {'倍率':>6}")
+
+    base = None
+    for workers in [1, 2, 4, 8, 16, 32]:
+        provider = StubProvider(latency=latency)
+        start = time.perf_counter()
+        results = fetcher.fetch_concurrently(codes, provider.info, max_workers=workers)
+        elapsed = time.perf_counter() - start
+        assert len(results) == n_codes
+        base = base or elapsed
+        print(f"{workers:>8} {elapsed:>8.2f} {n_codes / elapsed:>8.1f} {base / elapsed:>6.1f}")
+
+    #レート制限をかけると、並列数を増やしても秒間件数で頭打ちになる
+    rate = 20.0
+    provider = StubProvider(latency=latency)
+    start = time.perf_counter()
+    fetcher.fetch_concurrently(codes, provider.info, max_workers=32,
+                               scheduler=RequestScheduler(rate=rate))
+    elapsed = time.perf_counter() - start
+    print(f"レート制限 {rate:.0f}件/秒, workers=32: {elapsed:.2f}秒 ({n_codes / elapsed:.1f}件/秒)")
+
+
+def bench_jpx(file_path: str = None, repeat: int = 5):
+    """銘柄マスターの読み込み時間: Excelを毎回解析する場合と、変換済みParquetを読む場合"""
+    file_path = file_path or os.path.join(os.path.dirname(os.path.abspath(__file__)), "data_j.xls")
+    if not os.path.exists(file_path):
+        print(f"'{file_path}' が見つからないのでスキップします")
+        return
+
+    def best_of(fn):
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            times.append(time.perf_counter() - start)
+        return min(times)
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        t_xls = best_of(lambda: jpx_master.parse_master(file_path))
+        start = time.perf_counter()
+        df = jpx_master.load_master(file_path, cache_dir=cache_dir)
+        t_first = time.perf_counter() - start
+        t_cached = best_of(lambda: jpx_master.load_master(file_path, cache_dir=cache_dir))
+
+    print(f"銘柄数: {len(df)}")
+    print(f"xls解析       : {t_xls * 1000:8.1f} ms")
+    print(f"初回(解析+変換): {t_first * 1000:8.1f} ms")
+    print(f"2回目以降     : {t_cached * 1000:8.1f} ms  ({t_xls / t_cached:.0f}倍速)")
+
+
+def _random_prices(days: int, tickers: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    close = 1000 * np.exp(np.cumsum(rng.normal(0, 0.02, (days, tickers)), axis=0))
+    spread = np.abs(rng.normal(0, 0.01, (days, tickers)))
+    return close, close * (1 + spread), close * (1 - spread)
+
+
+def bench_indicators(days: int = 2520, tickers: int = 4000, short_span: int = 5, long_span: int = 50):
+    """テクニカル指標: 従来のpandas rolling(銘柄ごと)とNumPyエンジン(全銘柄まとめて)の比較"""
+    close, high, low = _random_prices(days, tickers)
+    print(f"{days}日 × {tickers}銘柄 (SMA{short_span}/SMA{long_span}/ボリンジャー/RSI14)")
+
+    #従来の計算(plot_stock_plotly/plot_RSI_plotlyと同じ処理を銘柄ごとに)
+    df = pd.DataFrame(close)
+    start = time.perf_counter()
+    for col in df.columns:
+        s = df[col]
+        sma_short = s.rolling(window=short_span).mean()
+        s.rolling(window=long_span).mean()
+        std = s.rolling(window=short_span).std()
+        sma_short + 2 * std, sma_short - 2 * std
+        delta = s.diff()
+        gain = delta.where(delta > 0, 0)
+        loss = -delta.where(delta < 0, 0)
+        100 - (100 / (1 + gain.rolling(window=14).mean() / loss.rolling(window=14).mean()))
+    t_loop = time.perf_counter() - start
+
+    #pandasでも横持ちの表にまとめれば速い(参考)
+    start = time.perf_counter()
+    sma_short = df.rolling(window=short_span).mean()
+    df.rolling(window=long_span).mean()
+    std = df.rolling(window=short_span).std()
+    sma_short + 2 * std, sma_short - 2 * std
+    delta = df.diff()
+    gain = delta.where(delta > 0, 0)
+    loss = -delta.where(delta < 0, 0)
+    100 - (100 / (1 + gain.rolling(window=14).mean() / loss.rolling(window=14).mean()))
+    t_wide = time.perf_counter() - start
+
+    start = time.perf_counter()
+    indicators.bollinger(close, short_span, 2)
+    indicators.sma(close, long_span)
+    indicators.rsi(close, 14)
+    t_numpy = time.perf_counter() - start
+
+    print(f"pandas(銘柄ごとのループ): {t_loop:8.2f} 秒")
+    print(f"pandas(横持ちで一括)    : {t_wide:8.2f} 秒")
+    print(f"NumPyエンジン           : {t_numpy:8.2f} 秒  (ループ比 {t_loop / t_numpy:.0f}倍速)")
+
+    #全指標(SMA/ボリンジャー/EMA/RSI(Wilder)/MACD/ATR)と、1本追加したときの差分計算
+    engine = indicators.IndicatorEngine(sma_windows=(short_span, long_span), ema_spans=(20,), rsi_method="wilder")
+    start = time.perf_counter()
+    engine.compute(close[:-1], high[:-1], low[:-1])
+    t_full = time.perf_counter() - start
+    start = time.perf_counter()
+    engine.update(close[-1:], high[-1:], low[-1:])
+    t_update = time.perf_counter() - start
+    print(f"全指標を全期間計算      : {t_full:8.2f} 秒")
+    print(f"新しい足1本の差分計算   : {t_update * 1000:8.2f} ms")
+
+
+def bench_screen(tickers: int = 4000, days: int = 126):
+    """全銘柄スクリーニング: 全銘柄の表の作成と、条件での絞り込み・順位付けの時間"""
+    rng = np.random.default_rng(0)
+    codes = make_codes(tickers)
+    master = pd.DataFrame({"コード": codes, "銘柄名": codes, "33業種区分": "業種", "市場・商品区分": "プライム（内国株式）"})
+    provider = StubProvider(latency=0)
+    infos = {code: provider.info(code) for code in codes}
+    close, _, _ = _random_prices(days, tickers)
+    closes = pd.DataFrame(close, columns=codes)
+    #一部の銘柄は欠損(上場直後・データ無し)にしておく
+    closes.iloc[:days // 2, rng.choice(tickers, tickers // 10, replace=False)] = np.nan
+
+    start = time.perf_counter()
+    universe = screener.build_universe(master, infos, closes)
+    t_build = time.perf_counter() - start
+
+    criteria = {"PER(予)": (0, 15), "PBR": (0, 1.5), "ROE": (0.08, None), "配当利回り": (3.0, None),
+                "騰落率(3ヶ月)": (-20, None), "RSI": (0, 70)}
+    rank_by = {"PER(予)": True, "PBR": True, "配当利回り": False, "ROE": False}
+    repeat = 20
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = screener.screen(universe, criteria, rank_by=rank_by, top=50)
+    t_screen = (time.perf_counter() - start) / repeat
+
+    print(f"{tickers}銘柄 × {days}日")
+    print(f"全銘柄の表の作成(更新時に1回): {t_build * 1000:8.1f} ms")
+    print(f"絞り込み+順位付け(毎回)      : {t_screen * 1000:8.1f} ms  (該当{len(result)}件)")
+
+
+def bench_scheduler(n_codes: int = 100, latency: float = 0.02, rate_limit_ratio: float = 0.2):
+    """リクエストスケジューラ: 429を混ぜたスタブ相手に、リトライ・重複まとめ・流量制限を確認する"""
+    codes = make_codes(n_codes)
+    provider = StubProvider(latency=latency, rate_limit_ratio=rate_limit_ratio, seed=1)
+    scheduler = RequestScheduler(rate=200, burst=20, backoff=0.02, seed=1)
+
+    #同じ銘柄を2回ずつ並べて、同時に走った分が1回にまとまることを確認する
+    keys = [code for code in codes for _ in range(2)]
+    start = time.perf_counter()
+    results = {}
+    errors = []
+    with ThreadPoolExecutor(max_workers=32) as executor:
+        futures = {executor.submit(scheduler.call, ("info", key), lambda key=key: provider.info(key)): key for key in keys}
+        for future, key in futures.items():
+            try:
+                results[key] = future.result()
+            except Exception as e:
+                errors.append((key, e))
+    elapsed = time.perf_counter() - start
+
+    total = scheduler.summary()
+    print(f"{n_codes}銘柄 × 2回の呼び出し, 遅延{latency * 1000:.0f}ms, 429の割合{rate_limit_ratio:.0%}")
+    print(f"成功: {len(results)}銘柄 / 失敗: {len(errors)}件 / {elapsed:.2f}秒")
+    print(f"呼び出し{total['calls']}回 → 実リクエスト{total['requests']}回 "
+          f"(まとめた{total['collapsed']}回, 429エラー{provider.rate_limited}回, リトライ{total['retries']}回)")
+    assert len(results) == n_codes and not errors
+
+    #流量制限: 秒間20件なら、バースト分を除いて件数/20秒かかる
+    provider = StubProvider(latency=0)
+    scheduler = RequestScheduler(rate=20, burst=5)
+    start = time.perf_counter()
+    fetcher.fetch_concurrently(make_codes(45), provider.info, max_workers=16, scheduler=scheduler)
+    elapsed = time.perf_counter() - start
+    print(f"流量制限 20件/秒(バースト5), 45件: {elapsed:.2f}秒 (理論値 {(45 - 5) / 20:.2f}秒)")
+
+
+def bench_statements(tickers: int = 4000, items: int = 40, periods: int = 4, chunk: int = 200):
+    """決算データの保存庫: 全銘柄分の保存(まとめて書き込み)と、全銘柄の増収率の計算"""
+    rng = np.random.default_rng(0)
+    names = [f"Item {i:02d}" for i in range(items)] + ["Total Revenue"]
+    columns = pd.date_range("2022-03-31", periods=periods, freq="12ME")[::-1]
+    codes = make_codes(tickers)
+
+    def statements_of(code):
+        return {kind: pd.DataFrame(rng.uniform(1, 100, (len(names), periods)) * 1e9, index=names, columns=columns)
+                for kind in ("income", "balance", "cashflow")}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        warehouse = StatementWarehouse(root=tmp)
+        batches = [{code: statements_of(code) for code in codes[i:i + chunk]} for i in range(0, tickers, chunk)]
+        start = time.perf_counter()
+        for batch in batches:
+            warehouse.upsert(batch)
+        elapsed = time.perf_counter() - start
+        size = sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(tmp) for f in files)
+        rows = tickers * 3 * len(names) * periods
+        print(f"保存: {tickers}銘柄×3種類 ({rows:,}行) {elapsed:.2f}秒, {size / 1e6:.1f}MB")
+
+        #新しい決算期が1つ増えた場合(一部の銘柄だけ書き直す)
+        start = time.perf_counter()
+        warehouse.upsert({code: statements_of(code) for code in codes[:100]})
+        print(f"100銘柄の更新: {time.perf_counter() - start:.2f}秒")
+
+        start = time.perf_counter()
+        growth = warehouse.growth("Total Revenue")
+        print(f"全銘柄の増収率: {time.perf_counter() - start:.3f}秒 ({len(growth)}銘柄)")
+
+        start = time.perf_counter()
+        for code in codes[:20]:
+            warehouse.get(code, "income")
+        print(f"1銘柄の損益計算書: {(time.perf_counter() - start) / 20 * 1000:.1f}ms")
+
+
+def bench_scatter(sizes=(100, 1000, 4000), label_top: int = 30):
+    """PER/PBR散布図: matplotlib(全銘柄に名前, PNG化まで)とPlotly WebGL(上位だけ名前, JSON化まで)"""
+    import io
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    import charts
+
+    rng = np.random.default_rng(0)
+    charts.per_pbr_scatter_gl(pd.DataFrame({"PER(予)": [10.0], "PBR": [1.0], "会社名": ["準備"]}))  # 読み込み分を除く
+    print(f"{'銘柄数':>6} {'matplotlib秒':>12} {'WebGL秒':>8} {'JSON(KB)':>9}")
+    for n in sizes:
+        df = pd.DataFrame({
+            "コード": make_codes(n),
+            "会社名": [f"テスト銘柄{i}" for i in range(n)],
+            "PER(予)": rng.uniform(1, 49, n),
+            "PBR": rng.uniform(0.1, 4.9, n),
+            "時価総額": rng.lognormal(25, 1.5, n),
+        })
+        start = time.perf_counter()
+        fig = charts.per_pbr_scatter(df)
+        fig.savefig(io.BytesIO(), format="png")
+        plt.close(fig)
+        old = time.perf_counter() - start
+
+        start = time.perf_counter()
+        payload = charts.per_pbr_scatter_gl(df, label_top=label_top).to_json()
+        new = time.perf_counter() - start
+        print(f"{n:>6} {old:>12.2f} {new:>8.3f} {len(payload) / 1024:>9.0f}")
+    print("(WebGL版はブラウザ側の描画時間を含みません。点の描画はGPUで行われます)")
+
+
+def bench_downsample(years=(1, 5, 10, 20)):
+    """株価・出来高・RSIのグラフ: 日足を全部送る場合と、間引いた場合のJSONの大きさと作成時間"""
+    import charts
+
+    rng = np.random.default_rng(0)
+    charts.plot_volume_plotly(pd.DataFrame({"Volume": [1]}, index=pd.bdate_range("2024-01-01", periods=1)), "準備")
+    print(f"{'期間':>4} {'日足':>6} {'全部(KB)':>9} {'全部秒':>7} {'間引き(KB)':>10} {'間引き秒':>8} {'足':>6}")
+    for n_years in years:
+        index = pd.bdate_range(end="2025-12-31", periods=245 * n_years)
+        close = 1000 * np.exp(np.cumsum(rng.normal(0, 0.015, len(index))))
+        df = pd.DataFrame({
+            "Open": close * rng.uniform(0.99, 1.01, len(index)),
+            "High": close * 1.02, "Low": close * 0.98, "Close": close,
+            "Volume": rng.integers(10_000, 1_000_000, len(index)),
+        }, index=index)
+
+        results = []
+        for max_bars in (None, charts.downsample.DEFAULT_MAX_BARS):
+            start = time.perf_counter()
+            figs = [
+                charts.plot_stock_plotly(df, "テスト", 5, 50, True, max_bars=max_bars),
+                charts.plot_volume_plotly(df, "テスト", max_bars=max_bars),
+                charts.plot_RSI_plotly(df, "テスト", max_bars=max_bars),
+            ]
+            size = sum(len(fig.to_json()) for fig in figs)
+            results.append((size, time.perf_counter() - start, figs[0].layout.title.text))
+        (full_size, full_time, _), (thin_size, thin_time, title) = results
+        label = title.split("(")[-1].rstrip(")") if "(" in title else "日足"
+        print(f"{n_years:>3}年 {len(index):>6} {full_size / 1024:>9.0f} {full_time:>7.3f} "
+              f"{thin_size / 1024:>10.0f} {thin_time:>8.3f} {label:>6}")
+
+
+def bench_comparison(sizes=(10, 100, 500), days=490):
+    """値動き比較: 銘柄ごとにpandasで計算する場合と、1つの配列でまとめて計算する場合(2年分)"""
+    import comparison
+
+    rng = np.random.default_rng(0)
+    index = pd.bdate_range(end="2025-12-31", periods=days)
+    bench = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, days)))
+    print(f"{'銘柄数':>6} {'1銘柄ずつ(秒)':>14} {'まとめて(秒)':>13}")
+    for n in sizes:
+        returns = 0.8 * np.diff(np.log(bench), prepend=np.log(bench[0]))[:, None] + rng.normal(0, 0.01, (days, n))
+        closes = pd.DataFrame(100 * np.exp(np.cumsum(returns, axis=0)), index=index, columns=make_codes(n))
+        closes["^N225"] = bench
+
+        start = time.perf_counter()
+        bench_returns = closes["^N225"].pct_change()
+        for code in closes.columns:
+            r = closes[code].pct_change()
+            _ = (closes[code] / closes[code].iloc[0] - 1) * 100
+            _ = closes[code] / closes[code].cummax() - 1
+            _ = r.rolling(comparison.DEFAULT_WINDOW).cov(bench_returns) / bench_returns.rolling(comparison.DEFAULT_WINDOW).var()
+            _ = r.rolling(comparison.DEFAULT_WINDOW).corr(bench_returns)
+        loop_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        comparison.compare(comparison.align_closes(closes), "^N225")
+        vector_time = time.perf_counter() - start
+        print(f"{n:>6} {loop_time:>14.3f} {vector_time:>13.3f}")
+
+
+def bench_backtest(n_tickers=4000, years=10):
+    """バックテスト: 10年×4000銘柄を、売買ルール・リバランス周期ごとに1回ずつ実行する時間"""
+    import backtest
+
+    rng = np.random.default_rng(0)
+    days = 245 * years
+    index = pd.bdate_range(end="2025-12-31", periods=days)
+    closes = pd.DataFrame(100 * np.exp(np.cumsum(rng.normal(0.0002, 0.02, (days, n_tickers)), axis=0)),
+                          index=index, columns=make_codes(n_tickers))
+    print(f"{years}年 × {n_tickers}銘柄")
+    print(f"{'売買ルール':<14} {'リバランス':<8} {'秒':>6} {'年率(%)':>8} {'平均保有数':>10}")
+    for signal in backtest.SIGNALS:
+        for label in ("毎日", "毎月"):
+            start = time.perf_counter()
+            result = backtest.backtest(closes, signal, rebalance=backtest.REBALANCE_RULES[label])
+            elapsed = time.perf_counter() - start
+            stats = result["stats"]
+            print(f"{signal:<14} {label:<8} {elapsed:>6.2f} {stats['年率リターン(%)']:>8.2f} {stats['平均保有数']:>10.0f}")
+
+
+def bench_sweep(n_tickers=1000, years=5, workers=(1, 2, 4)):
+    """パラメータの総当たり: プロセス数を変えたときの所要時間と、1プロセスあたりの処理量"""
+    import sweep
+
+    closes = sweep.synthetic_closes(n_tickers, years)
+    n_combos = len(sweep.expand_grid(sweep.DEFAULT_GRID))
+    print(f"{years}年 × {n_tickers}銘柄 / {n_combos}通り (CPU {os.cpu_count()}個)")
+    print(f"{'プロセス':>6} {'秒':>7} {'組み合わせ/秒':>12} {'1プロセスあたり':>14} {'速度比':>6}")
+    base = None
+    for n in workers:
+        start = time.perf_counter()
+        _, throughput = sweep.run_sweep(closes, workers=n)
+        elapsed = time.perf_counter() - start
+        base = base or elapsed
+        print(f"{n:>6} {elapsed:>7.1f} {n_combos / elapsed:>12.1f} "
+              f"{throughput['組み合わせ/秒'].mean():>14.1f} {base / elapsed:>6.2f}")
+
+
+UI_MODULES = ["streamlit", "matplotlib", "japanize_matplotlib", "plotly"]
+
+_IMPORT_PROBE = """
+import sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+loaded = [name for name in {ui} if name in sys.modules]
+print(elapsed, ",".join(loaded))
+"""
+
+
+def bench_imports(repeat: int = 3):
+    """読み込み時間: データ処理の本体(stock_core)と画面用(stock_utils)を、それぞれ新しいプロセスで読み込む"""
+    here = os.path.dirname(os.path.abspath(__file__))
+    print(f"{'モジュール':<14} {'秒(最小)':>8}  読み込まれた画面用ライブラリ")
+    for module in ["stock_core", "refresh", "charts", "stock_utils"]:
+        times, loaded = [], ""
+        for _ in range(repeat):
+            out = subprocess.run(
+                [sys.executable, "-c", _IMPORT_PROBE.format(module=module, ui=UI_MODULES)],
+                cwd=here, capture_output=True, text=True, check=True,
+            ).stdout.split()
+            times.append(float(out[0]))
+            loaded = out[1] if len(out) > 1 else ""
+        print(f"{module:<14} {min(times):>8.2f}  {loaded or 'なし'}")
+        if module in ("stock_core", "refresh"):
+            assert not loaded, f"{module} が画面用ライブラリを読み込んでいます: {loaded}"
+
+
+_EXPORT_PROBE = """
+import os, resource, sys, tempfile, time
+import numpy as np, pandas as pd
+import export
+
+def chunks():
+    rng = np.random.default_rng(0)
+    index = pd.bdate_range(end="2025-12-31", periods={days})
+    for first in range(0, {n_tickers}, export.CHUNK_TICKERS):
+        n = min(export.CHUNK_TICKERS, {n_tickers} - first)
+        close = 1000 * np.exp(np.cumsum(rng.normal(0, 0.02, ({days}, n)), axis=0))
+        yield pd.DataFrame({{
+            "Date": np.tile(index.to_numpy(), n),
+            "コード": np.repeat([f"{{1000 + first + i}}.T" for i in range(n)], {days}),
+            "Open": close.ravel(order="F"), "High": close.ravel(order="F") * 1.01,
+            "Low": close.ravel(order="F") * 0.99, "Close": close.ravel(order="F"),
+            "Volume": rng.integers(1_000, 1_000_000, {days} * n),
+        }})
+
+out = os.path.join(tempfile.mkdtemp(), "export.{fmt}")
+start = time.perf_counter()
+if "{mode}" == "stream":
+    rows = export.export(chunks(), out)
+else:
+    df = pd.concat(list(chunks()), ignore_index=True)
+    rows = len(df)
+    {{"csv": lambda: df.to_csv(out, index=False, encoding=export.CSV_ENCODING),
+     "parquet": lambda: df.to_parquet(out, index=False, compression=export.COMPRESSION),
+     "xlsx": lambda: df.to_excel(out, index=False)}}["{fmt}"]()
+elapsed = time.perf_counter() - start
+peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # Linuxの単位はKB
+print(rows, elapsed, peak, os.path.getsize(out) / 1024 ** 2)
+"""
+
+
+def bench_export(n_tickers=4000, years=10, xlsx_tickers=100):
+    """書き出し: 全部つなげてから書く場合と、少しずつ書く場合の時間と最大メモリ(それぞれ新しいプロセスで計測)
+
+    Excelは1シート約100万行が上限で書き込みも遅いので、xlsx_tickers銘柄分だけで比べる。
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    days = 245 * years
+    print(f"{'形式':<8} {'方法':<8} {'銘柄':>5} {'行数':>11} {'秒':>7} {'最大メモリ(MB)':>14} {'サイズ(MB)':>10}")
+    for fmt in ("csv", "parquet", "xlsx"):
+        tickers = xlsx_tickers if fmt == "xlsx" else n_tickers
+        for mode in ("concat", "stream"):
+            code = _EXPORT_PROBE.format(days=days, n_tickers=tickers, fmt=fmt, mode=mode)
+            out = subprocess.run([sys.executable, "-c", code], cwd=here, capture_output=True, text=True, check=True)
+            rows, elapsed, peak, size = out.stdout.split()
+            label = "少しずつ" if mode == "stream" else "一括"
+            print(f"{fmt:<8} {label:<8} {tickers:>5} {int(rows):>11,} {float(elapsed):>7.1f} "
+                  f"{float(peak):>14,.0f} {float(size):>10,.1f}")
+
+
+BENCHMARKS = {
+    "fetch": bench_fetch,
+    "jpx": bench_jpx,
+    "indicators": bench_indicators,
+    "screen": bench_screen,
+    "scheduler": bench_scheduler,
+    "imports": bench_imports,
+    "statements": bench_statements,
+    "scatter": bench_scatter,
+    "downsample": bench_downsample,
+    "comparison": bench_comparison,
+    "backtest": bench_backtest,
+    "sweep": bench_sweep,
+    "export": bench_export,
+}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="stock_appの性能計測")
+    parser.add_argument("name", nargs="?", choices=list(BENCHMARKS), help="実行するベンチマーク(省略時は全部)")
+    args = parser.parse_args()
+
+    names = [args.name] if args.name else list(BENCHMARKS)
+    for name in names:
+        print(f"=== {name} ===")
+        BENCHMARKS[name]()
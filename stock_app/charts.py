@@ -0,0 +1,436 @@
+import numpy as np
+import pandas as pd
+
+import downsample
+import indicators
+
+# ==========================================
+#  グラフを作る関数 (Charts)
+#  ※matplotlib・plotlyは重いので、グラフを作るときに初めて読み込みます
+#    (データ取得だけのバッチ処理では読み込まれません)
+# ==========================================
+
+
+def _pyplot():
+    """日本語フォント設定済みのmatplotlib.pyplotを読み込む"""
+    import matplotlib.pyplot as plt
+    import japanize_matplotlib  # noqa: F401 (読み込むだけで日本語フォントが設定される)
+    return plt
+
+LARGE_SCATTER_POINTS = 300  # これより多い散布図はWebGL(Plotly)で描く
+SCATTER_LABELS = 30         # WebGL版で名前を表示する銘柄数(時価総額の大きい順)
+
+
+def scatter_points(df):
+    """PER/PBR散布図に載せる銘柄(グラフ表示に適した範囲: 0<PER<50, 0<PBR<5)"""
+    per = df["PER(予)"]
+    pbr = df["PBR"]
+    return df[(per > 0) & (per < 50) & (pbr > 0) & (pbr < 5)]
+
+def per_pbr_scatter(df):
+    """PER/PBR散布図を作る(表示に適したデータが無ければNone)"""
+    df_plot = scatter_points(df)
+
+    if df_plot.empty:
+        return None
+    plt = _pyplot()
+
+    fig, ax = plt.subplots(figsize=(10, 6))
+    ax.scatter(df_plot["PER(予)"], df_plot["PBR"], color="royalblue", alpha=0.6)
+
+    per_mean = df_plot["PER(予)"].mean()
+    pbr_mean = df_plot["PBR"].mean()
+    if pd.notna(per_mean):
+        ax.axvline(per_mean, color="red", linestyle="--", alpha=0.5, label=f"平均PER: {per_mean:.1f}倍")
+    if pd.notna(pbr_mean):
+        ax.axhline(pbr_mean, color="red", linestyle="--", alpha=0.5, label=f"平均PBR: {pbr_mean:.1f}倍")
+
+    names = df_plot["会社名"].astype(str).str[:6]
+    for x, y, name in zip(df_plot["PER(予)"].to_numpy(), df_plot["PBR"].to_numpy(), names):
+        ax.text(x, y, name, fontsize=8, alpha=0.7)
+
+    ax.set_title("割安性分析(PER vs PBR)", fontsize=16)
+    ax.set_xlabel("PER(倍) - 収益性", fontsize=12)
+    ax.set_ylabel("PBR(倍) - 資産性", fontsize=12)
+    ax.legend()
+    ax.grid(True, linestyle=":", alpha=0.6)
+
+    return fig
+
+def per_pbr_scatter_gl(df, label_top: int = SCATTER_LABELS):
+    """銘柄数が多いとき用のPER/PBR散布図(Plotly・WebGL)。表示に適したデータが無ければNone
+
+    点はScatterglでまとめて描き、名前は時価総額の大きいlabel_top銘柄だけに付ける。
+    それ以外の銘柄は点にマウスを乗せると名前が出る。
+    """
+    df_plot = scatter_points(df)
+    if df_plot.empty:
+        return None
+    import plotly.graph_objects as go
+
+    per = df_plot["PER(予)"].to_numpy(dtype=float)
+    pbr = df_plot["PBR"].to_numpy(dtype=float)
+    names = df_plot["会社名"].astype(str).to_numpy()
+    codes = df_plot["コード"].astype(str).to_numpy() if "コード" in df_plot.columns else names
+
+    fig = go.Figure()
+    fig.add_trace(go.Scattergl(
+        x=per, y=pbr, mode="markers",
+        marker=dict(color="royalblue", opacity=0.6, size=6),
+        customdata=codes, text=names,
+        hovertemplate="%{text} (%{customdata})<br>PER %{x:.1f}倍 / PBR %{y:.2f}倍<extra></extra>",
+        name="銘柄",
+    ))
+
+    #名前を付ける銘柄を時価総額の上位から選ぶ(全部に付けると読めなくなる)
+    if label_top and "時価総額" in df_plot.columns:
+        caps = pd.to_numeric(df_plot["時価総額"], errors="coerce").fillna(0).to_numpy()
+        top = caps.argsort()[::-1][:label_top]
+        fig.add_trace(go.Scatter(
+            x=per[top], y=pbr[top], mode="text",
+            text=[name[:6] for name in names[top]], textposition="top center",
+            textfont=dict(size=10), hoverinfo="skip", showlegend=False,
+        ))
+
+    per_mean = per.mean()
+    pbr_mean = pbr.mean()
+    fig.add_vline(x=per_mean, line_dash="dash", line_color="red", opacity=0.5,
+                  annotation_text=f"平均PER: {per_mean:.1f}倍")
+    fig.add_hline(y=pbr_mean, line_dash="dash", line_color="red", opacity=0.5,
+                  annotation_text=f"平均PBR: {pbr_mean:.1f}倍")
+
+    fig.update_layout(
+        title=f"割安性分析(PER vs PBR) {len(df_plot):,}銘柄",
+        xaxis_title="PER(倍) - 収益性",
+        yaxis_title="PBR(倍) - 資産性",
+        height=600,
+        template="plotly_white",
+        showlegend=False,
+    )
+    return fig
+
+
+def market_cap_bar(df):
+    """時価総額の棒グラフを作る"""
+    plt = _pyplot()
+    from matplotlib import ticker
+    fig, ax = plt.subplots(figsize=(10, 5))
+    ax.bar(df["会社名"], df["時価総額"], color="skyblue")
+    ax.set_ylabel("時価総額")
+    def trillion_formatter(x, pos):
+        return f'{x / 1_000_000_000_000:.1f}兆円'
+    ax.yaxis.set_major_formatter(ticker.FuncFormatter(trillion_formatter))
+    ax.grid(axis='y', linestyle='--', alpha=0.7)
+    return fig
+
+
+def performance_chart(df_performance, company_name):
+    #売上高(棒グラフ)と純利益(折れ線グラフ)の複合グラフを作る(データが無ければNone)
+    if df_performance.empty:
+        return None
+    plt = _pyplot()
+    from matplotlib import ticker
+
+    #グラフの準備
+    fig, ax1 = plt.subplots(figsize=(10, 5))
+
+    #x軸(年度)のラベル作成(日付型から年だけ取り出す)
+    years = [d.strftime('%Y年') for d in df_performance.index]
+
+    #1.売上高の棒グラフ(左軸ax1)
+    ax1.bar(years, df_performance["売上高"], color="skyblue", alpha=0.6, label="売上高")
+    ax1.set_ylabel("売上高(円)")
+
+    #2.純利益の折れ線グラフ(右軸ax2)
+    #ax1と同じx軸を共有する「双子」の軸を作る
+    ax2 = ax1.twinx()
+    ax2.plot(years, df_performance["純利益"], color="orange", marker="o", linewidth=2, label="純利益")
+    ax2.set_ylabel("純利益(円)")
+
+    #3.数値のフォーマット(兆円単位で見やすく)
+    def trillion_formatter(x, pos):
+        if abs(x) >= 1_000_000_000_000:
+            return f'{x / 1_000_000_000_000:.1f}兆'
+        else:
+            return f'{x / 1_000_000_000:.0f}億'
+    
+    ax1.yaxis.set_major_formatter(ticker.FuncFormatter(trillion_formatter))
+    ax2.yaxis.set_major_formatter(ticker.FuncFormatter(trillion_formatter))
+
+    #タイトルと凡例
+    ax1.set_title(f"{company_name}の業績推移(直近4年)", fontsize=16)
+
+    #凡例をまとめて表示するテクニック
+    lines1, labels1 = ax1.get_legend_handles_labels()
+    lines2, labels2 = ax2.get_legend_handles_labels()
+    ax1.legend(lines1 + lines2, labels1 + labels2, loc="upper left")
+
+    ax1.grid(axis='y', linestyle='--', alpha=0.5)
+
+    return fig
+
+def _thin_line(index, y, max_bars):
+    """折れ線をmax_bars点までLTTBで間引く(max_barsがNoneならそのまま)"""
+    if max_bars is None:
+        return index, y
+    return downsample.lttb(index, y, max_bars)
+
+def _bar_title(title, label):
+    return title if label == "日足" else f"{title}({label})"
+
+# 1. Plotlyでグラフを描く関数
+def plot_stock_plotly(df_history, company_name, short_span, long_span, show_bollinger, lines=None,
+                      max_bars=downsample.DEFAULT_MAX_BARS):
+    #日線とボリンジャーバンドを算定(df_historyには列を追加しない)
+    #計算済みの線があれば lines=(短期線, 長期線, upper, lower) で渡せる
+    #期間が長いときは、ローソク足を週足・月足にまとめ、線は日足で計算してから間引いて送る(max_bars=Noneで全部送る)
+    if lines is None:
+        close = df_history['Close'].to_numpy(dtype=float)
+        sma_short, upper, lower = indicators.bollinger(close, short_span, 2)
+        sma_long = indicators.sma(close, long_span)
+    else:
+        sma_short, sma_long, upper, lower = lines
+
+    if max_bars is None:
+        bars, label = df_history, "日足"
+    else:
+        bars, label = downsample.downsample_ohlc(df_history, max_bars)
+
+    import plotly.graph_objects as go
+    fig = go.Figure()
+
+    # 終値のローソク足を追加
+    fig.add_trace(go.Candlestick(
+        x=bars.index,
+        open=bars['Open'],
+        high=bars['High'],
+        low=bars['Low'],
+        close=bars['Close'],
+    ))
+
+    #短日線(オレンジ色)
+    x, y = _thin_line(df_history.index, sma_short, max_bars)
+    fig.add_trace(go.Scatter(
+        x=x,
+        y=y,
+        mode='lines',
+        name=f'{short_span}日移動平均',
+        line=dict(color='orange', width=1)
+    ))
+
+    #長日線(青色)
+    x, y = _thin_line(df_history.index, sma_long, max_bars)
+    fig.add_trace(go.Scatter(
+        x=x,
+        y=y,
+        mode='lines',
+        name=f'{long_span}日移動平均',
+        line=dict(color='royalblue', width=1)
+    ))
+
+    if show_bollinger:
+        #ボリンジャーバンド(upper)
+        x, y = _thin_line(df_history.index, upper, max_bars)
+        fig.add_trace(go.Scatter(
+            x=x,
+            y=y,
+            mode='lines',
+            name='ボリンジャーバンド(upper+2σ)',
+            line=dict(color='gray', width=1, dash='dash')
+        ))
+
+        #ボリンジャーバンド(lower)
+        x, y = _thin_line(df_history.index, lower, max_bars)
+        fig.add_trace(go.Scatter(
+            x=x,
+            y=y,
+            mode='lines',
+            name='ボリンジャーバンド(lower-2σ)',
+            line=dict(color='gray', width=1, dash='dash')
+        ))
+
+    # レイアウト設定
+    fig.update_layout(
+        title=_bar_title(f"{company_name} の株価推移", label),
+        xaxis_title="日付",
+        yaxis_title="株価 (円)",
+        height=500, # グラフの高さ
+        template="plotly_white",
+        xaxis_rangeslider_visible=False #スライダー非表示
+    )
+    return fig
+
+# 2. Plotlyでグラフを描く関数_出来高の棒グラフ
+def plot_volume_plotly(df_history, company_name, max_bars=downsample.DEFAULT_MAX_BARS):
+    #期間が長いときは、株価チャートと同じ週足・月足にまとめる(出来高は合計)
+    if max_bars is None:
+        bars, label = df_history, "日足"
+    else:
+        bars, label = downsample.downsample_ohlc(df_history[['Volume']], max_bars)
+
+    import plotly.graph_objects as go
+    fig = go.Figure()
+
+    # 出来高の棒グラフを追加
+    fig.add_trace(go.Bar(
+        x=bars.index,
+        y=bars['Volume'],
+        marker_color="royalblue",
+        opacity=0.6,
+        name="出来高"
+        ))
+
+    # レイアウト設定
+    fig.update_layout(
+        title=_bar_title(f"{company_name} の出来高", label),
+        xaxis_title="日付",
+        yaxis_title="出来高 (円)",
+        height=300, # グラフの高さ
+        template="plotly_white"
+    )
+    return fig
+
+# 3. Plotlyでグラフを描く関数_RSIの折れ線グラフ
+def plot_RSI_plotly(df_history, company_name, max_bars=downsample.DEFAULT_MAX_BARS):
+    #業界スタンダードの14日平均を設定
+    rsi_period = 14
+
+    #単純平均(SMA)を使ったRSI計算
+    rsi = indicators.rsi(df_history['Close'].to_numpy(dtype=float), rsi_period, method="sma")
+
+    import plotly.graph_objects as go
+    fig = go.Figure()
+
+    # RSIの折れ線を追加(期間が長いときは間引く)
+    x, y = _thin_line(df_history.index, rsi, max_bars)
+    fig.add_trace(go.Scatter(
+        x=x,
+        y=y,
+        mode='lines',
+        name="RSI(14日)",
+        line=dict(color='purple', width=1.5)
+        ))
+    #基準線
+    fig.add_hline(y=30, line_dash="dash", line_color="gray", annotation_text="売られすぎ(30)")
+    fig.add_hline(y=70, line_dash="dash", line_color="gray", annotation_text="買われすぎ(70)")
+
+    # レイアウト設定
+    fig.update_layout(
+        title=f"{company_name} のRSI",
+        xaxis_title="日付",
+        yaxis_title="RSI(%)",
+        height=300, 
+        yaxis=dict(range=[0, 100]),
+        template="plotly_white"
+    )
+    return fig
+
+#4.日経平均との比較
+def plot_comparison_plotly(df_stock, df_benchmark, company_name, max_bars=downsample.DEFAULT_MAX_BARS):
+    # 例: 最初の日の終値(iloc[0])で、列全体を割る、100倍して％表示に対応
+    # (メモに保存した表を書き換えないよう、列は追加しない)
+    stock_normalized = (df_stock['Close'] / df_stock['Close'].iloc[0] - 1) * 100
+    benchmark_normalized = (df_benchmark['Close'] / df_benchmark['Close'].iloc[0] - 1) * 100
+
+    import plotly.graph_objects as go
+    fig = go.Figure()
+
+    #銘柄の株価変化率
+    x, y = _thin_line(df_stock.index, stock_normalized.to_numpy(), max_bars)
+    fig.add_trace(go.Scatter(
+        x=x,
+        y=y,
+        mode='lines',
+        name=f'{company_name}の株価変化率',
+        line=dict(color='red', width=1)
+    ))
+
+    #日経平均の変化率
+    x, y = _thin_line(df_benchmark.index, benchmark_normalized.to_numpy(), max_bars)
+    fig.add_trace(go.Scatter(
+        x=x,
+        y=y,
+        mode='lines',
+        name='日経平均の株価変化率',
+        line=dict(color='gray', width=1)
+    ))
+
+    # レイアウト設定
+    fig.update_layout(
+        title=f"{company_name} と日経平均の変化率比較",
+        xaxis_title="日付",
+        yaxis_title="変化率(%)",
+        height=300, 
+        template="plotly_white"
+    )
+    return fig
+
+#5.複数銘柄の値動き比較(100銘柄以上でも1本のWebGLの線にまとめて描く)
+def plot_relative_performance(normalized, names=None, benchmarks=None, max_bars=downsample.DEFAULT_MAX_BARS):
+    """基準日比の騰落率(%)を重ねて描く
+
+    normalized: 行が日付、列がコードの表。benchmarksに含まれる列(日経平均・業種平均など)は太線で別に描き、
+    それ以外の銘柄は NaN で区切った1本の線(Scattergl)にまとめるので、銘柄数が増えても線の数は増えない。
+    """
+    import plotly.graph_objects as go
+
+    names = names or {}
+    benchmarks = [col for col in (benchmarks or []) if col in normalized.columns]
+    stocks = normalized.drop(columns=benchmarks)
+
+    #日数が多いときは等間隔に間引く(最後の日は必ず残す)
+    rows = np.arange(len(normalized))
+    if max_bars is not None and len(rows) > max_bars:
+        rows = np.unique(np.append(rows[::int(np.ceil(len(rows) / max_bars))], len(rows) - 1))
+    dates = normalized.index[rows]
+
+    fig = go.Figure()
+    if not stocks.empty:
+        n_days, n_stocks = len(rows), stocks.shape[1]
+        #銘柄ごとの線の間にNaNを1つ挟んで、1本の配列につなげる
+        values = np.vstack([stocks.to_numpy(dtype=float)[rows], np.full((1, n_stocks), np.nan)])
+        x = np.tile(np.append(dates.to_numpy(), np.datetime64("NaT")), n_stocks)
+        labels = np.repeat([names.get(code, code) for code in stocks.columns], n_days + 1)
+        fig.add_trace(go.Scattergl(
+            x=x, y=values.T.ravel(), text=labels, mode="lines",
+            line=dict(color="royalblue", width=1), opacity=0.35,
+            hovertemplate="%{text}<br>%{x|%Y-%m-%d}: %{y:.1f}%<extra></extra>",
+            name=f"銘柄({n_stocks})",
+        ))
+
+    colors = ["red", "black", "orange", "green", "purple", "brown"]
+    for i, col in enumerate(benchmarks):
+        fig.add_trace(go.Scatter(
+            x=dates, y=normalized[col].to_numpy(dtype=float)[rows], mode="lines",
+            line=dict(color=colors[i % len(colors)], width=2.5),
+            name=names.get(col, col),
+        ))
+
+    fig.update_layout(
+        title=f"値動きの比較({len(stocks.columns)}銘柄)",
+        xaxis_title="日付",
+        yaxis_title="基準日からの騰落率(%)",
+        height=500,
+        template="plotly_white",
+    )
+    return fig
+
+#6.バックテストの資産推移
+def plot_equity_curves(curves: dict, title: str = "資産の推移", max_bars=downsample.DEFAULT_MAX_BARS):
+    """{名前: 資産の推移(Series, 初め=1)}を重ねて描く(長い期間はLTTBで間引く)"""
+    import plotly.graph_objects as go
+
+    fig = go.Figure()
+    for name, equity in curves.items():
+        x, y = equity.index, equity.to_numpy(dtype=float)
+        if max_bars is not None:
+            x, y = downsample.lttb(x, y, max_bars)
+        fig.add_trace(go.Scatter(x=x, y=y, mode="lines", name=name))
+    fig.update_layout(
+        title=title,
+        xaxis_title="日付",
+        yaxis_title="資産(初め=1)",
+        height=450,
+        template="plotly_white",
+    )
+    return fig
@@ -0,0 +1,135 @@
+import numpy as np
+import pandas as pd
+
+import indicators
+
+# ==========================================
+#  複数銘柄の値動き比較エンジン (Comparison)
+#  ・N銘柄+ベンチマーク(日経平均・TOPIX・業種平均)を共通の営業日に揃えて1つの配列にする
+#  ・基準日からの騰落率・ドローダウン・移動ベータ・移動相関を、銘柄ごとのループなしでまとめて計算する
+#  ※Streamlitに依存しません
+# ==========================================
+
+#コード -> 表示名
+BENCHMARKS = {"^N225": "日経平均", "1306.T": "TOPIX(1306)"}
+DEFAULT_WINDOW = 60     # 移動ベータ・相関の期間(営業日)
+FILL_LIMIT = 5          # 休場日などの穴埋めは最大5日まで(上場廃止後までは延ばさない)
+TRADING_DAYS = 245
+SECTOR_PREFIX = "業種平均:"
+
+
+def align_closes(closes: pd.DataFrame, fill_limit: int = FILL_LIMIT) -> pd.DataFrame:
+    """終値の横持ち表(行が日付、列がコード)を全銘柄共通の営業日に揃える
+
+    市場ごとの休場日の違いは直前の終値で埋める(上場前の期間はNaNのまま)。
+    """
+    if closes.empty:
+        return closes
+    aligned = closes.sort_index()
+    aligned = aligned[~aligned.index.duplicated(keep="last")]
+    return aligned.ffill(limit=fill_limit)
+
+
+def _first_valid(values: np.ndarray) -> np.ndarray:
+    """列ごとの最初の有効値(すべてNaNの列はNaN)"""
+    valid = np.isfinite(values)
+    first_row = valid.argmax(axis=0)
+    first = values[first_row, np.arange(values.shape[1])]
+    first[~valid.any(axis=0)] = np.nan
+    return first
+
+
+def _last_valid(values: np.ndarray) -> np.ndarray:
+    """列ごとの最後の有効値"""
+    return _first_valid(values[::-1])
+
+
+def daily_returns(values: np.ndarray) -> np.ndarray:
+    """前日比(先頭の行はNaN)"""
+    returns = np.full(values.shape, np.nan)
+    returns[1:] = values[1:] / values[:-1] - 1
+    return returns
+
+
+def sector_indices(closes: pd.DataFrame, sectors) -> pd.DataFrame:
+    """業種ごとの平均の値動き(各銘柄の日々の騰落率を業種内で単純平均し、100から積み上げる)
+
+    sectors: {コード: 業種名} またはSeries。所属銘柄の行列(銘柄数×業種数)との掛け算でまとめて計算する。
+    """
+    sectors = pd.Series(sectors)
+    codes = [code for code in closes.columns if code in sectors.index]
+    if not codes:
+        return pd.DataFrame(index=closes.index)
+    membership = pd.get_dummies(sectors.loc[codes]).astype(float)
+    returns = daily_returns(closes[codes].to_numpy(dtype=float))
+    valid = np.isfinite(returns)
+    totals = np.where(valid, returns, 0.0) @ membership.to_numpy()
+    counts = valid.astype(float) @ membership.to_numpy()
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean_returns = np.where(counts > 0, totals / counts, 0.0)
+    index_values = 100 * np.cumprod(1 + mean_returns, axis=0)
+    return pd.DataFrame(index_values, index=closes.index,
+                        columns=[f"{SECTOR_PREFIX}{name}" for name in membership.columns])
+
+
+def compare(closes: pd.DataFrame, benchmark: str, window: int = DEFAULT_WINDOW) -> dict:
+    """値動きの比較指標をまとめて計算する
+
+    closes: 共通の営業日に揃えた終値(列がコード。ベンチマークの列も含める)
+    戻り値: {"normalized": 基準日比の騰落率(%), "drawdown": 高値からの下落率(%),
+             "beta": 移動ベータ, "correlation": 移動相関, "summary": 銘柄ごとのまとめ}
+    """
+    values = closes.to_numpy(dtype=float)
+    columns = closes.columns
+
+    normalized = (values / _first_valid(values) - 1) * 100
+    #それまでの最高値からの下落率(上場前のNaNは無視して最高値をたどる)
+    running_max = np.fmax.accumulate(np.where(np.isfinite(values), values, -np.inf), axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        drawdown = np.where(np.isfinite(values), (values / running_max - 1) * 100, np.nan)
+
+    #移動ベータ・相関: 期間内の平均 E[xy], E[x], E[y], E[x^2], E[y^2] から共分散と分散を出す
+    returns = daily_returns(values)
+    bench = returns[:, [columns.get_loc(benchmark)]]
+    mean_x = indicators.sma(returns, window)
+    mean_b = indicators.sma(bench, window)
+    mean_xb = indicators.sma(returns * bench, window)
+    mean_xx = indicators.sma(returns * returns, window)
+    mean_bb = indicators.sma(bench * bench, window)
+    cov = mean_xb - mean_x * mean_b
+    var_x = mean_xx - mean_x ** 2
+    var_b = mean_bb - mean_b ** 2
+    with np.errstate(invalid="ignore", divide="ignore"):
+        beta = cov / var_b
+        correlation = cov / np.sqrt(np.maximum(var_x, 0) * np.maximum(var_b, 0))
+
+    #期間全体のまとめ(ベータ・相関は期間全体の日次騰落率から)
+    valid = np.isfinite(returns) & np.isfinite(bench)
+    x = np.where(valid, returns, 0.0)
+    b = np.where(valid, bench, 0.0)
+    n = valid.sum(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mx, mb = x.sum(axis=0) / n, b.sum(axis=0) / n
+        full_cov = (x * b).sum(axis=0) / n - mx * mb
+        full_var_x = (x * x).sum(axis=0) / n - mx ** 2
+        full_var_b = (b * b).sum(axis=0) / n - mb ** 2
+        volatility = np.sqrt(np.maximum(full_var_x, 0) * TRADING_DAYS) * 100
+        summary = pd.DataFrame({
+            "騰落率(%)": _last_valid(normalized),
+            "最大下落率(%)": np.nanmin(np.where(np.isfinite(drawdown), drawdown, np.inf), axis=0),
+            "ベータ": full_cov / full_var_b,
+            "相関": full_cov / np.sqrt(np.maximum(full_var_x, 0) * np.maximum(full_var_b, 0)),
+            "年率ボラティリティ(%)": volatility,
+        }, index=columns)
+    summary.loc[~np.isfinite(summary["最大下落率(%)"]), "最大下落率(%)"] = np.nan
+
+    def frame(a):
+        return pd.DataFrame(a, index=closes.index, columns=columns)
+
+    return {
+        "normalized": frame(normalized),
+        "drawdown": frame(drawdown),
+        "beta": frame(beta),
+        "correlation": frame(correlation),
+        "summary": summary,
+    }
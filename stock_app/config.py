@@ -0,0 +1,11 @@
+import os
+
+# ==========================================
+#  共通設定
+# ==========================================
+
+#キャッシュ類(指標・株価など)の保存先。環境変数 STOCK_APP_CACHE_DIR で変更できます
+CACHE_DIR = os.environ.get(
+    "STOCK_APP_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache"),
+)
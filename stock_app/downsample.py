@@ -0,0 +1,102 @@
+import numpy as np
+import pandas as pd
+
+# ==========================================
+#  チャート用の間引き (Downsample)
+#  何年分の日足でも、ブラウザに送る点の数が一定以下になるようにする
+#  ・ローソク足/出来高: 日足→週足→月足→四半期足のうち、本数がmax_bars以下になる最も細かい足にまとめる
+#  ・折れ線(移動平均・RSIなど): LTTB(Largest-Triangle-Three-Buckets)で形を保ったまま点を減らす
+# ==========================================
+
+#グラフは画面の幅に合わせて広がる(use_container_width)ので、サーバー側では実際の幅がわからない。
+#幅ごとに変えずに、横幅1200px前後で1本あたり3px程度になる本数に固定する
+DEFAULT_MAX_BARS = 400
+
+#細かい順。(表示名, pandasの期間の単位)
+BAR_RULES = [("日足", None), ("週足", "W"), ("月足", "M"), ("四半期足", "Q")]
+
+
+def choose_rule(index: pd.DatetimeIndex, max_bars: int = DEFAULT_MAX_BARS):
+    """本数がmax_bars以下になる最も細かい足を選ぶ。(表示名, 単位)を返す"""
+    if len(index) <= max_bars:
+        return BAR_RULES[0]
+    for label, freq in BAR_RULES[1:]:
+        if index.to_period(freq).nunique() <= max_bars:
+            return label, freq
+    return BAR_RULES[-1]
+
+
+def resample_ohlc(df: pd.DataFrame, freq: str) -> pd.DataFrame:
+    """日足を週足・月足などにまとめる(始値=最初, 高値=最大, 安値=最小, 終値=最後, 出来高=合計)
+
+    各足の日付は、その期間の最初の取引日にする(週末の日曜日などに足が立たないように)。
+    """
+    if freq is None or df.empty:
+        return df
+    keys = df.index.to_period(freq)
+    grouped = df.groupby(keys, sort=True)
+    how = {"Open": "first", "High": "max", "Low": "min", "Close": "last", "Adj Close": "last", "Volume": "sum"}
+    out = grouped.agg({col: func for col, func in how.items() if col in df.columns})
+    out.index = pd.Series(df.index, index=keys).groupby(level=0, sort=True).first().to_numpy()
+    out.index.name = df.index.name
+    return out
+
+
+def downsample_ohlc(df: pd.DataFrame, max_bars: int = DEFAULT_MAX_BARS):
+    """本数がmax_bars以下になるようにまとめた表と、足の表示名を返す"""
+    label, freq = choose_rule(df.index, max_bars)
+    return resample_ohlc(df, freq), label
+
+
+def lttb_indices(y: np.ndarray, n_out: int) -> np.ndarray:
+    """LTTBで残す点の位置(昇順)を返す。x軸は等間隔(取引日の順番)とみなす
+
+    最初と最後の点は必ず残し、残りをn_out-2個の区間に分けて、
+    「前に選んだ点」と「次の区間の平均」と作る三角形の面積が最大の点を各区間から1つ選ぶ。
+    途中のNaNは選ばれないが、すべてNaNの区間は先頭の点を残す。
+    """
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    x = np.arange(n, dtype=float)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    #次の区間の平均(NaNを除く)をまとめて計算しておく
+    filled = np.where(np.isnan(y), 0.0, y)
+    valid = (~np.isnan(y)).astype(float)
+    csum_y = np.concatenate([[0.0], np.cumsum(filled)])
+    csum_n = np.concatenate([[0.0], np.cumsum(valid)])
+
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    prev = 0
+    for i in range(n_out - 2):
+        start, stop = edges[i], edges[i + 1]
+        next_start, next_stop = stop, edges[i + 2] if i + 2 < len(edges) else n
+        count = csum_n[next_stop] - csum_n[next_start]
+        avg_x = (next_start + next_stop - 1) / 2
+        avg_y = (csum_y[next_stop] - csum_y[next_start]) / count if count else y[prev]
+        prev_x, prev_y = float(prev), y[prev]
+        area = np.abs((prev_x - avg_x) * (y[start:stop] - prev_y) - (prev_x - x[start:stop]) * (avg_y - prev_y))
+        #NaNは-1にして選ばれないようにする(全部NaNなら区間の先頭が選ばれる)
+        best = start + int(np.argmax(np.fmax(area, -1.0)))
+        selected[i + 1] = best
+        prev = best
+    return selected
+
+
+def lttb(index, y, n_out: int = DEFAULT_MAX_BARS):
+    """折れ線(x=日付, y=値)をn_out点に間引いて(x, y)で返す
+
+    移動平均の計算前などの先頭・末尾のNaNは、グラフでは描かれないので落としてから間引く。
+    """
+    y = np.asarray(y, dtype=float)
+    index = np.asarray(index)
+    finite = np.flatnonzero(np.isfinite(y))
+    if len(finite) == 0:
+        return index[:0], y[:0]
+    lo, hi = finite[0], finite[-1] + 1
+    keep = lo + lttb_indices(y[lo:hi], n_out)
+    return index[keep], y[keep]
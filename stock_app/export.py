@@ -0,0 +1,190 @@
+import argparse
+import io
+import itertools
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+# ==========================================
+#  大きな表の書き出し (Export)
+#  表を一定の行数・銘柄数ずつ受け取って、CSV・Parquet・Excel(xlsx)にそのまま書き足していく
+#  (全部を1つの表につなげてから書かないので、全銘柄×10年分でもメモリの使用量が増えない)
+#  ※Streamlitに依存しません
+#
+#  使い方: python export.py prices_10y.parquet --period 10y      # 保存庫の株価を全銘柄分書き出す
+#          python export.py prices.csv --period 1y --limit 100
+# ==========================================
+
+FORMATS = {".csv": "csv", ".parquet": "parquet", ".xlsx": "xlsx"}
+CSV_ENCODING = "utf-8-sig"  # Excelで開いても文字化けしないようにBOM付き
+COMPRESSION = "zstd"
+EXCEL_MAX_ROWS = 1_048_576  # 1シートの行数の上限(見出しの行を含む)
+CHUNK_TICKERS = 50          # 株価を何銘柄ずつ読んで書くか
+
+
+def format_of(path: str) -> str:
+    ext = os.path.splitext(str(path))[1].lower()
+    if ext not in FORMATS:
+        raise ValueError(f"未対応の形式です: {ext}(.csv / .parquet / .xlsx)")
+    return FORMATS[ext]
+
+
+def chunked(df: pd.DataFrame, rows: int = 100_000):
+    """1つの表を一定の行数ずつに分ける(すでにメモリにある表を同じ書き出し方で扱うため)"""
+    if df.empty:
+        #空の表でも見出しだけは書き出す
+        yield df
+        return
+    for start in range(0, len(df), rows):
+        yield df.iloc[start:start + rows]
+
+
+def write_csv(chunks, out, encoding: str = CSV_ENCODING) -> int:
+    """表を1つずつCSVに書き足す(見出しは最初の1回だけ)。outはパスかテキストのファイル。書いた行数を返す"""
+    close = isinstance(out, (str, os.PathLike))
+    f = open(out, "w", encoding=encoding, newline="") if close else out
+    total = 0
+    try:
+        for i, chunk in enumerate(chunks):
+            chunk.to_csv(f, index=False, header=(i == 0))
+            total += len(chunk)
+    finally:
+        if close:
+            f.close()
+    return total
+
+
+def write_parquet(chunks, out, compression: str = COMPRESSION) -> int:
+    """表を1つずつParquetの行グループとして書き足す(列と型は最初の表に合わせる)"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    writer = None
+    total = 0
+    try:
+        for chunk in chunks:
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                schema = table.schema
+                writer = pq.ParquetWriter(out, schema, compression=compression)
+            writer.write_table(table.cast(schema))
+            total += len(chunk)
+    finally:
+        if writer is not None:
+            writer.close()
+    return total
+
+
+def _excel_value(value):
+    """openpyxlが書けない型(NaN・numpyの数値・日時)を直す"""
+    if value is None or value is pd.NaT or (isinstance(value, float) and np.isnan(value)):
+        return None
+    if isinstance(value, pd.Timestamp):
+        return None if pd.isna(value) else value.to_pydatetime()
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def write_xlsx(chunks, out, sheet_name: str = "data") -> int:
+    """表を1つずつExcelに書き足す(openpyxlの書き込み専用モード)
+
+    1シートの行数の上限を超えたら、次のシート(data_2, data_3, ...)に続きを書く。
+    """
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet, header, rows_in_sheet, total = None, None, 0, 0
+    for chunk in chunks:
+        if header is None:
+            header = [str(col) for col in chunk.columns]
+        for row in chunk.itertuples(index=False, name=None):
+            if sheet is None or rows_in_sheet >= EXCEL_MAX_ROWS:
+                n_sheets = len(workbook.worksheets)
+                sheet = workbook.create_sheet(sheet_name if n_sheets == 0 else f"{sheet_name}_{n_sheets + 1}")
+                sheet.append(header)
+                rows_in_sheet = 1
+            sheet.append([_excel_value(v) for v in row])
+            rows_in_sheet += 1
+            total += 1
+    if sheet is None:
+        workbook.create_sheet(sheet_name).append(header or [])
+    workbook.save(out)
+    return total
+
+
+WRITERS = {"csv": write_csv, "parquet": write_parquet, "xlsx": write_xlsx}
+
+
+def export(chunks, out, fmt: str = None) -> int:
+    """表のかたまり(イテレータ)を形式に合わせて書き出す。形式を省略したらファイル名の拡張子で決める"""
+    return WRITERS[fmt or format_of(out)](chunks, out)
+
+
+def to_bytes(df: pd.DataFrame, fmt: str) -> bytes:
+    """画面のダウンロードボタン用に、表を指定の形式のバイト列にする"""
+    buffer = io.BytesIO()
+    if fmt == "csv":
+        #文字列にしてからエンコードし直すと中身が2つできるので、バイト列へ直接書く
+        text = io.TextIOWrapper(buffer, encoding=CSV_ENCODING, newline="")
+        write_csv(chunked(df), text)
+        text.flush()
+        text.detach()
+    else:
+        export(chunked(df), buffer, fmt)
+    return buffer.getvalue()
+
+
+def iter_price_history(store, codes, start: pd.Timestamp = None, chunk_tickers: int = CHUNK_TICKERS):
+    """保存庫の日足を、chunk_tickers銘柄ずつ縦持ち(日付, コード, 始値...)の表にして順に返す"""
+    for i in range(0, len(codes), chunk_tickers):
+        frames = []
+        for code in codes[i:i + chunk_tickers]:
+            df = store.read(code, start=start)
+            if df.empty:
+                continue
+            df = df.rename_axis("Date").reset_index()
+            df.insert(1, "コード", code)
+            frames.append(df)
+        if frames:
+            yield pd.concat(frames, ignore_index=True)
+
+
+def main(argv=None) -> int:
+    import jpx_master
+    import stock_core
+
+    parser = argparse.ArgumentParser(description="保存庫の株価(日足)を全銘柄分まとめて書き出す")
+    parser.add_argument("out", help="書き出すファイル(.csv / .parquet / .xlsx)")
+    parser.add_argument("--jpx", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "data_j.xls"),
+                        help="JPXの銘柄マスター(data_j.xls)")
+    parser.add_argument("--period", default="1y", help="期間(1mo, 3mo, 6mo, 1y, 2y, 5y, 10y)")
+    parser.add_argument("--limit", type=int, default=None, help="先頭から何銘柄だけ書き出すか")
+    args = parser.parse_args(argv)
+
+    fmt = format_of(args.out)
+    master = jpx_master.load_master(args.jpx)
+    if master.empty:
+        print(f"'{args.jpx}' が見つかりません")
+        return 1
+    codes = master["コード"].tolist()[:args.limit]
+    store = stock_core.make_price_store(stock_core.make_scheduler())
+
+    start = time.perf_counter()
+    chunks = iter_price_history(store, codes, start=stock_core.period_to_start(args.period))
+    #保存庫にデータが1銘柄も無いときは、ファイルを作らずに終える(中身の無いファイルを残さない)
+    first = next(chunks, None)
+    if first is None:
+        print(f"保存庫に{args.period}分の株価がありません(先に株価を更新してください)")
+        return 1
+    rows = export(itertools.chain([first], chunks), args.out, fmt)
+    print(f"{args.out}: {len(codes)}銘柄 {rows:,}行 ({os.path.getsize(args.out) / 1024 ** 2:,.1f}MB, "
+          f"{time.perf_counter() - start:.1f}秒)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,45 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# ==========================================
+#  並列取得エンジン (Fetcher)
+#  ※Streamlitに依存しないので、バッチ処理からも使えます
+# ==========================================
+
+DEFAULT_MAX_WORKERS = 8
+DEFAULT_RATE_LIMIT = 5.0  # Yahoo Financeへの秒間リクエスト数(RequestSchedulerに渡す)
+
+
+def fetch_concurrently(keys, fetch_fn, max_workers=DEFAULT_MAX_WORKERS, on_progress=None, on_error=None,
+                       scheduler=None, kind="info") -> dict:
+    """fetch_fn(key)を最大max_workers本並列に呼び出し、{key: 結果}を入力順で返す
+
+    on_progress(完了数, 全体数, key) と on_error(key, 例外) は呼び出し元のスレッドで呼ばれるので、
+    st.progress や st.error をそのまま渡しても大丈夫です。失敗したkeyは結果に含めません。
+    scheduler(RequestScheduler)を渡すと、流量制限・リトライ・重複まとめはそちらに任せます。
+    """
+    keys = list(keys)
+    total = len(keys)
+    results = {}
+    if total == 0:
+        return results
+
+    def task(key):
+        if scheduler is not None:
+            return scheduler.call((kind, key), lambda: fetch_fn(key))
+        return fetch_fn(key)
+
+    workers = max(1, min(max_workers, total))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(task, key): key for key in keys}
+        for done, future in enumerate(as_completed(futures), start=1):
+            key = futures[future]
+            try:
+                results[key] = future.result()
+            except Exception as e:
+                if on_error is not None:
+                    on_error(key, e)
+            if on_progress is not None:
+                on_progress(done, total, key)
+
+    #完了順ではなく入力順に並べ直す
+    return {key: results[key] for key in keys if key in results}
@@ -0,0 +1,113 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import config
+
+# ==========================================
+#  指標データ(yfinanceのinfo)の永続キャッシュ
+#  銘柄ごとに取得時刻つきでSQLiteに保存し、古いものだけ取り直す
+# ==========================================
+
+DEFAULT_TTL_HOURS = 12
+
+
+class FundamentalsCache:
+    """銘柄ごとのinfoスナップショットをSQLiteに保存するキャッシュ"""
+
+    def __init__(self, path: str = None, ttl_hours: float = DEFAULT_TTL_HOURS):
+        if path is None:
+            path = os.path.join(config.CACHE_DIR, "fundamentals.sqlite3")
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.ttl_seconds = ttl_hours * 3600
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        #Streamlitは再実行ごとに別スレッドになるので、同じ接続を使い回せるようにする
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS info ("
+            " code TEXT PRIMARY KEY,"
+            " fetched_at REAL NOT NULL,"
+            " payload TEXT NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get_many(self, codes: list[str], now: float = None) -> tuple[dict, list[str]]:
+        """キャッシュ済みの{コード: info}と、取り直しが必要なコードのリストを返す"""
+        now = time.time() if now is None else now
+        rows = self._select(codes)
+        fresh = {}
+        stale = []
+        for code in codes:
+            row = rows.get(code)
+            if row is not None and now - row[0] <= self.ttl_seconds:
+                fresh[code] = json.loads(row[1])
+            else:
+                stale.append(code)
+        with self._lock:
+            self.hits += len(fresh)
+            self.misses += len(stale)
+        return fresh, stale
+
+    def peek_many(self, codes: list[str]) -> dict:
+        """古さに関係なく保存済みの{コード: info}を返す(ヒット数には数えない)"""
+        return {code: json.loads(row[1]) for code, row in self._select(codes).items()}
+
+    def put(self, code: str, info: dict, fetched_at: float = None) -> None:
+        self.put_many({code: info}, fetched_at)
+
+    def put_many(self, infos: dict, fetched_at: float = None) -> None:
+        fetched_at = time.time() if fetched_at is None else fetched_at
+        #infoにはTimestampなどJSONにできない値が混ざることがあるので文字列にしておく
+        records = [(code, fetched_at, json.dumps(info, ensure_ascii=False, default=str))
+                   for code, info in infos.items()]
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO info VALUES (?, ?, ?)", records)
+            self._conn.commit()
+
+    def ages(self, codes: list[str], now: float = None) -> dict:
+        """{コード: 取得からの経過秒数} (未取得のコードは含まない)"""
+        now = time.time() if now is None else now
+        return {code: now - row[0] for code, row in self._select(codes).items()}
+
+    def stats(self, now: float = None) -> dict:
+        """ヒット数・ミス数・保存件数・最古/最新データの経過秒数"""
+        now = time.time() if now is None else now
+        with self._lock:
+            count, oldest, newest = self._conn.execute(
+                "SELECT COUNT(*), MIN(fetched_at), MAX(fetched_at) FROM info"
+            ).fetchone()
+            hits, misses = self.hits, self.misses
+        lookups = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "entries": count,
+            "oldest_age": now - oldest if oldest is not None else None,
+            "newest_age": now - newest if newest is not None else None,
+        }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM info")
+            self._conn.commit()
+
+    def _select(self, codes: list[str]) -> dict:
+        rows = {}
+        codes = list(codes)
+        #SQLiteのプレースホルダ上限に引っかからないよう分割して問い合わせる
+        for i in range(0, len(codes), 500):
+            chunk = codes[i:i + 500]
+            marks = ",".join("?" * len(chunk))
+            with self._lock:
+                cursor = self._conn.execute(
+                    f"SELECT code, fetched_at, payload FROM info WHERE code IN ({marks})", chunk
+                )
+                for code, fetched_at, payload in cursor:
+                    rows[code] = (fetched_at, payload)
+        return rows
@@ -0,0 +1,263 @@
+import numpy as np
+
+# ==========================================
+#  テクニカル指標の計算エンジン (NumPy版)
+#  ・入力は (日数,) または (日数, 銘柄数) の配列。複数銘柄をまとめて計算できる
+#  ・移動平均/標準偏差は累積和を使うので、期間の長さに関係なく O(日数)
+#  ・EMA/Wilder平滑は状態を持ち越せるので、新しい足だけを追加計算できる
+#  ・欠損(NaN)を含む期間の移動平均はNaN(pandasのrollingと同じ扱い)
+# ==========================================
+
+
+def _as_2d(x):
+    x = np.asarray(x, dtype=float)
+    return (x[:, None], True) if x.ndim == 1 else (x, False)
+
+
+def _restore(x, was_1d):
+    return x[:, 0] if was_1d else x
+
+
+def _window_sums(x: np.ndarray, window: int):
+    """直近window本の合計と有効値の数を累積和で求める(欠損が無ければ有効値の数はNone)"""
+    n_rows, n_cols = x.shape
+    nan_mask = np.isnan(x)
+    has_nan = nan_mask.any()
+    sums = np.full(x.shape, np.nan)
+    counts = np.zeros(x.shape) if has_nan else None
+    if window > n_rows:
+        return sums, (counts if has_nan else np.zeros(x.shape))
+
+    #先頭に0の行を置いた累積和をとり、window本離れた行同士の差で合計を出す
+    csum = np.empty((n_rows + 1, n_cols))
+    csum[0] = 0.0
+    np.cumsum(np.where(nan_mask, 0.0, x) if has_nan else x, axis=0, out=csum[1:])
+    np.subtract(csum[window:], csum[:-window], out=sums[window - 1:])
+    if has_nan:
+        np.cumsum(~nan_mask, axis=0, out=csum[1:])
+        np.subtract(csum[window:], csum[:-window], out=counts[window - 1:])
+    return sums, counts
+
+
+def sma(x, window: int):
+    """単純移動平均"""
+    x, was_1d = _as_2d(x)
+    sums, counts = _window_sums(x, window)
+    out = sums / window
+    if counts is not None:
+        out[counts != window] = np.nan
+    return _restore(out, was_1d)
+
+
+def rolling_std(x, window: int, ddof: int = 1):
+    """移動標準偏差(pandasのrolling().std()と同じ不偏標準偏差)"""
+    x, was_1d = _as_2d(x)
+    #桁落ちを防ぐため、銘柄ごとに先頭の値を引いてから2乗和をとる
+    shift = np.nan_to_num(x[0]) if len(x) else 0.0
+    centered = x - shift
+    sums, counts = _window_sums(centered, window)
+    np.square(centered, out=centered)
+    sq_sums, _ = _window_sums(centered, window)
+    #分散 = (2乗和 - 合計^2 / n) / (n - ddof)
+    np.square(sums, out=sums)
+    sums /= window
+    np.subtract(sq_sums, sums, out=sq_sums)
+    sq_sums /= (window - ddof)
+    np.maximum(sq_sums, 0.0, out=sq_sums)
+    out = np.sqrt(sq_sums, out=sq_sums)
+    if counts is not None:
+        out[counts != window] = np.nan
+    return _restore(out, was_1d)
+
+
+def bollinger(x, window: int, k: float = 2.0):
+    """ボリンジャーバンド (中心線, 上限, 下限)"""
+    mid = sma(x, window)
+    std = rolling_std(x, window)
+    return mid, mid + k * std, mid - k * std
+
+
+def _recursive_mean(x: np.ndarray, alpha: float, seed_with_mean: bool, state=None):
+    """指数平滑を時間方向に1本ずつ進める(銘柄方向はまとめて計算)
+
+    seed_with_mean=True: 最初のperiod本は単純平均、その後はWilder平滑(RSI/ATR用)
+    seed_with_mean=False: 最初の値から始めるEMA(pandasのewm(adjust=False)と同じ)
+    stateは(平滑値, 有効本数)。戻り値は(結果, 次回に持ち越すstate)
+    """
+    n_cols = x.shape[1]
+    if state is None:
+        avg = np.zeros(n_cols)
+        count = np.zeros(n_cols)
+    else:
+        avg, count = state[0].copy(), state[1].copy()
+
+    period = 1.0 / alpha
+    out = np.full(x.shape, np.nan)
+    for t in range(x.shape[0]):
+        v = x[t]
+        valid = ~np.isnan(v)
+        if seed_with_mean:
+            weight = np.maximum(alpha, 1.0 / (count + 1))
+        else:
+            weight = np.where(count == 0, 1.0, alpha)
+        avg = np.where(valid, avg + (np.where(valid, v, 0.0) - avg) * weight, avg)
+        count = count + valid
+        ready = count >= period if seed_with_mean else count > 0
+        out[t] = np.where(ready, avg, np.nan)
+    return out, (avg, count)
+
+
+def ema(x, span: int):
+    """指数移動平均"""
+    x, was_1d = _as_2d(x)
+    out, _ = _recursive_mean(x, 2.0 / (span + 1), seed_with_mean=False)
+    return _restore(out, was_1d)
+
+
+def _rsi_from_averages(avg_gain, avg_loss):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rs = np.divide(avg_gain, avg_loss)
+        rs += 1
+        np.divide(100, rs, out=rs)
+        return np.subtract(100, rs, out=rs)
+
+
+def _gains_losses(close: np.ndarray, prev_close=None, fill_nan: bool = False):
+    """前日比を上昇幅と下落幅に分ける(fill_nan=Trueなら前日比が無い日を0として扱う)"""
+    delta = np.empty(close.shape)
+    delta[0] = np.nan if prev_close is None else close[0] - prev_close[0]
+    np.subtract(close[1:], close[:-1], out=delta[1:])
+    #fmaxは欠損を無視して0を返し、maximumは欠損をそのまま残す
+    clip = np.fmax if fill_nan else np.maximum
+    gain = clip(delta, 0.0)
+    np.negative(delta, out=delta)
+    loss = clip(delta, 0.0, out=delta)
+    return gain, loss
+
+
+def rsi(close, period: int = 14, method: str = "sma"):
+    """RSI。method="sma"は単純平均(アプリの従来の計算)、"wilder"はWilderの平滑"""
+    close, was_1d = _as_2d(close)
+    if method == "sma":
+        #従来のpandasの計算(delta.where(delta > 0, 0))と同じく、初日の前日比は0扱い
+        gain, loss = _gains_losses(close, fill_nan=True)
+        out = _rsi_from_averages(sma(gain, period), sma(loss, period))
+    elif method == "wilder":
+        gain, loss = _gains_losses(close)
+        avg_gain, _ = _recursive_mean(gain, 1.0 / period, seed_with_mean=True)
+        avg_loss, _ = _recursive_mean(loss, 1.0 / period, seed_with_mean=True)
+        out = _rsi_from_averages(avg_gain, avg_loss)
+    else:
+        raise ValueError(f"未対応のRSI計算方法です: {method}")
+    return _restore(out, was_1d)
+
+
+def macd(close, fast: int = 12, slow: int = 26, signal: int = 9):
+    """MACD (MACD線, シグナル線, ヒストグラム)"""
+    line = ema(close, fast) - ema(close, slow)
+    sig = ema(line, signal)
+    return line, sig, line - sig
+
+
+def _true_range(high, low, close, prev_close=None):
+    """真の値幅(当日の高安と前日終値からの乖離のうち最大のもの)"""
+    if prev_close is None:
+        prev_close = np.full((1, close.shape[1]), np.nan)
+    prev = np.vstack([prev_close, close[:-1]])
+    hl = high - low
+    tr = np.fmax(hl, np.fmax(np.abs(high - prev), np.abs(low - prev)))
+    return np.where(np.isnan(hl), np.nan, tr)
+
+
+def atr(high, low, close, period: int = 14):
+    """ATR(Wilder平滑した真の値幅の平均)"""
+    high, was_1d = _as_2d(high)
+    low, _ = _as_2d(low)
+    close, _ = _as_2d(close)
+    tr = _true_range(high, low, close)
+    out, _ = _recursive_mean(tr, 1.0 / period, seed_with_mean=True)
+    return _restore(out, was_1d)
+
+
+class IndicatorEngine:
+    """複数の指標をまとめて計算し、新しい足が来たら追加分だけを計算する
+
+    使い方:
+        engine = IndicatorEngine(sma_windows=(5, 25))
+        result = engine.compute(close, high, low)   # 全期間
+        new_rows = engine.update(new_close, new_high, new_low)   # 追加された足の分だけ
+    """
+
+    def __init__(self, sma_windows=(5, 25), bb_window: int = 20, bb_k: float = 2.0,
+                 ema_spans=(), rsi_period: int = 14, rsi_method: str = "sma",
+                 macd_spans=(12, 26, 9), atr_period: int = 14):
+        self.sma_windows = tuple(sma_windows)
+        self.bb_window = bb_window
+        self.bb_k = bb_k
+        self.ema_spans = tuple(ema_spans)
+        self.rsi_period = rsi_period
+        self.rsi_method = rsi_method
+        self.macd_spans = macd_spans
+        self.atr_period = atr_period
+        #移動平均系の再計算に必要な直近の本数
+        self.tail_length = max(self.sma_windows + (bb_window, rsi_period + 1))
+        self._state = None
+
+    def compute(self, close, high=None, low=None) -> dict:
+        """全期間の指標を計算して{名前: 配列}で返す(続きを update できるよう状態を保存する)"""
+        close, was_1d = _as_2d(close)
+        self._state = {"tail": close[:0], "was_1d": was_1d}
+        return self._run(close, _as_2d(high)[0] if high is not None else None,
+                         _as_2d(low)[0] if low is not None else None)
+
+    def update(self, close, high=None, low=None) -> dict:
+        """compute の後に追加された足の分だけ指標を計算する"""
+        if self._state is None:
+            raise RuntimeError("先に compute() を呼んでください")
+        close, _ = _as_2d(close)
+        return self._run(close, _as_2d(high)[0] if high is not None else None,
+                         _as_2d(low)[0] if low is not None else None)
+
+    def _run(self, close, high, low) -> dict:
+        state = self._state
+        tail = state["tail"]
+        n_new = close.shape[0]
+        prev_close = tail[-1:] if len(tail) else None
+        joined = np.vstack([tail, close])
+        result = {}
+
+        #移動平均系: 直近tail_length本と新しい足をつなげて計算し、新しい足の分だけ取り出す
+        for w in self.sma_windows:
+            result[f"sma_{w}"] = sma(joined, w)[-n_new:]
+        mid, upper, lower = bollinger(joined, self.bb_window, self.bb_k)
+        result["bb_mid"], result["bb_upper"], result["bb_lower"] = mid[-n_new:], upper[-n_new:], lower[-n_new:]
+
+        #指数平滑系: 前回の状態から続きを計算する
+        for s in self.ema_spans:
+            result[f"ema_{s}"], state[f"ema_{s}"] = _recursive_mean(
+                close, 2.0 / (s + 1), False, state.get(f"ema_{s}"))
+
+        fast, slow, signal = self.macd_spans
+        ema_fast, state["macd_fast"] = _recursive_mean(close, 2.0 / (fast + 1), False, state.get("macd_fast"))
+        ema_slow, state["macd_slow"] = _recursive_mean(close, 2.0 / (slow + 1), False, state.get("macd_slow"))
+        line = ema_fast - ema_slow
+        sig, state["macd_signal"] = _recursive_mean(line, 2.0 / (signal + 1), False, state.get("macd_signal"))
+        result["macd"], result["macd_signal"], result["macd_hist"] = line, sig, line - sig
+
+        if self.rsi_method == "wilder":
+            gain, loss = _gains_losses(close, prev_close)
+            alpha = 1.0 / self.rsi_period
+            avg_gain, state["rsi_gain"] = _recursive_mean(gain, alpha, True, state.get("rsi_gain"))
+            avg_loss, state["rsi_loss"] = _recursive_mean(loss, alpha, True, state.get("rsi_loss"))
+            result["rsi"] = _rsi_from_averages(avg_gain, avg_loss)
+        else:
+            joined_gain, joined_loss = _gains_losses(joined, fill_nan=True)
+            result["rsi"] = _rsi_from_averages(sma(joined_gain, self.rsi_period),
+                                               sma(joined_loss, self.rsi_period))[-n_new:]
+
+        if high is not None and low is not None:
+            tr = _true_range(high, low, close, prev_close)
+            result["atr"], state["atr"] = _recursive_mean(tr, 1.0 / self.atr_period, True, state.get("atr"))
+
+        state["tail"] = joined[-self.tail_length:]
+        return {name: _restore(values, state["was_1d"]) for name, values in result.items()}
@@ -0,0 +1,118 @@
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+
+import config
+
+# ==========================================
+#  JPXの銘柄マスター(data_j.xls)の読み込み
+#  初回だけExcelを解析してParquetに変換し、2回目以降はParquetから読む
+# ==========================================
+
+TARGET_COLUMNS = ["コード", "銘柄名", "33業種区分", "市場・商品区分"]
+TARGET_MARKETS = ["プライム（内国株式）", "スタンダード（内国株式）", "グロース（内国株式）"]
+#種類の少ない列はカテゴリ型にしてメモリを節約する(Parquetにもそのまま保存される)
+CATEGORY_COLUMNS = ["33業種区分", "市場・商品区分"]
+#変換後の形式を変えたら上げる(古い変換済みファイルを使わないようにする)
+CACHE_VERSION = 2
+
+
+def format_codes(codes: pd.Series) -> pd.Series:
+    """4桁のコードに.Tをつける(1行ずつapplyせず、列全体をまとめて処理する)"""
+    s = codes.astype(str).str.strip()
+    return s.where(s.str.len() != 4, s.str.upper() + ".T")
+
+
+def parse_master(file_path: str) -> pd.DataFrame:
+    """Excelを解析して、必要な列・市場だけに絞った表を作る"""
+    df = pd.read_excel(file_path)
+    use_cols = [c for c in TARGET_COLUMNS if c in df.columns]
+    df = df[use_cols].copy()
+    df["コード"] = format_codes(df["コード"])
+
+    if "市場・商品区分" in df.columns:
+        df = df[df["市場・商品区分"].isin(TARGET_MARKETS)]
+    df = df.reset_index(drop=True)
+    for col in CATEGORY_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype("category").cat.remove_unused_categories()
+    return df
+
+
+def cache_path_for(file_path: str, cache_dir: str = None) -> str:
+    """元ファイルのパス・更新時刻・サイズから変換済みファイルの保存先を決める"""
+    stat = os.stat(file_path)
+    key = f"{os.path.abspath(file_path)}|{stat.st_mtime_ns}|{stat.st_size}|v{CACHE_VERSION}"
+    digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+    cache_dir = cache_dir or os.path.join(config.CACHE_DIR, "jpx")
+    return os.path.join(cache_dir, f"master_{digest}.parquet")
+
+
+def load_master(file_path: str, cache_dir: str = None) -> pd.DataFrame:
+    """銘柄マスターを読む(元ファイルが更新されていなければ変換済みのParquetを使う)"""
+    if not os.path.exists(file_path):
+        return pd.DataFrame()
+
+    cache_path = cache_path_for(file_path, cache_dir)
+    if os.path.exists(cache_path):
+        return pd.read_parquet(cache_path)
+
+    df = parse_master(file_path)
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    #古い変換済みファイルは不要なので消しておく
+    for name in os.listdir(os.path.dirname(cache_path)):
+        if name.startswith("master_") and name.endswith(".parquet"):
+            os.remove(os.path.join(os.path.dirname(cache_path), name))
+    df.to_parquet(cache_path, index=False)
+    return df
+
+
+class JPXIndex:
+    """銘柄マスターの索引(業種・市場ごとの行番号と、コード→社名の辞書)を1回だけ作っておく"""
+
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+        self.sectors = self._unique(df, "33業種区分")
+        self.markets = self._unique(df, "市場・商品区分")
+        self._sector_rows = self._positions(df, "33業種区分")
+        self._market_rows = self._positions(df, "市場・商品区分")
+        if "銘柄名" in df.columns:
+            self.name_map = dict(zip(df["コード"], df["銘柄名"]))
+        else:
+            self.name_map = {}
+
+    @staticmethod
+    def _unique(df, col) -> list:
+        return df[col].unique().tolist() if col in df.columns else []
+
+    @staticmethod
+    def _positions(df, col) -> dict:
+        if col not in df.columns:
+            return {}
+        return {key: np.asarray(rows) for key, rows
+                in df.groupby(col, sort=False, observed=True).indices.items()}
+
+    def __len__(self):
+        return len(self.df)
+
+    @property
+    def empty(self) -> bool:
+        return self.df.empty
+
+    def sector_rows(self, sector) -> np.ndarray:
+        return self._sector_rows.get(sector, np.empty(0, dtype=np.intp))
+
+    def market_rows(self, market) -> np.ndarray:
+        return self._market_rows.get(market, np.empty(0, dtype=np.intp))
+
+    def sector_frame(self, sector) -> pd.DataFrame:
+        """指定業種の行だけを取り出す(毎回全行を比較しない)"""
+        return self.df.iloc[self.sector_rows(sector)]
+
+    def market_frame(self, market) -> pd.DataFrame:
+        return self.df.iloc[self.market_rows(market)]
+
+    def name_of(self, code: str, default=None):
+        return self.name_map.get(code, default)
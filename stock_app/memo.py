@@ -0,0 +1,99 @@
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+# ==========================================
+#  計算結果のメモ化 (LRU + メモリ上限)
+#  株価・指標・グラフを(銘柄, 期間, 周期, 表示設定)などの入力をキーに保存し、
+#  スライダーを動かしたときは変わった部分だけを作り直す
+# ==========================================
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+def estimate_size(value) -> int:
+    """保存する値のおおよそのメモリ量(バイト)"""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, (pd.Series, pd.Index)):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(estimate_size(v) for v in value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_size(v) for v in value.values())
+    if hasattr(value, "data") and hasattr(value, "layout"):
+        #Plotlyの図: 各系列のデータ配列の合計で見積もる
+        return sum(estimate_size(v) for trace in value.data for v in trace.to_plotly_json().values())
+    return sys.getsizeof(value)
+
+
+class LRUMemo:
+    """名前空間ごとにヒット率を記録する、メモリ上限つきのLRUキャッシュ"""
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._entries = OrderedDict()  # (名前空間, キー) -> (値, サイズ)
+        self._stats = {}
+        self._lock = threading.RLock()
+
+    def get_or_compute(self, namespace: str, key, compute):
+        """保存済みならそれを返し、無ければcompute()を呼んで保存する"""
+        full_key = (namespace, key)
+        with self._lock:
+            stats = self._stats.setdefault(namespace, {"hits": 0, "misses": 0, "evictions": 0})
+            if full_key in self._entries:
+                self._entries.move_to_end(full_key)
+                stats["hits"] += 1
+                return self._entries[full_key][0]
+            stats["misses"] += 1
+
+        #計算はロックの外で行う(時間のかかるダウンロードで他の呼び出しを止めない)
+        value = compute()
+        self.put(namespace, key, value)
+        return value
+
+    def put(self, namespace: str, key, value) -> None:
+        size = estimate_size(value)
+        full_key = (namespace, key)
+        with self._lock:
+            if size > self.max_bytes:
+                return
+            if full_key in self._entries:
+                self.total_bytes -= self._entries.pop(full_key)[1]
+            self._entries[full_key] = (value, size)
+            self.total_bytes += size
+            #上限を超えたら、最も長く使われていないものから捨てる
+            while self.total_bytes > self.max_bytes:
+                (old_namespace, _), (_, old_size) = self._entries.popitem(last=False)
+                self.total_bytes -= old_size
+                self._stats.setdefault(old_namespace, {"hits": 0, "misses": 0, "evictions": 0})["evictions"] += 1
+
+    def stats(self) -> pd.DataFrame:
+        """名前空間ごとのヒット数・ミス数・ヒット率・件数・メモリ量"""
+        with self._lock:
+            rows = []
+            for namespace, s in self._stats.items():
+                entries = [size for (ns, _), (_, size) in self._entries.items() if ns == namespace]
+                lookups = s["hits"] + s["misses"]
+                rows.append({
+                    "種類": namespace,
+                    "ヒット": s["hits"],
+                    "ミス": s["misses"],
+                    "ヒット率(%)": 100 * s["hits"] / lookups if lookups else 0.0,
+                    "件数": len(entries),
+                    "メモリ(KB)": sum(entries) / 1024,
+                    "追い出し": s["evictions"],
+                })
+        return pd.DataFrame(rows)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._stats.clear()
+            self.total_bytes = 0
@@ -0,0 +1,124 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from scheduler import RequestScheduler
+from statements import STATEMENT_KINDS, StatementWarehouse, fetch_statements
+
+# ==========================================
+#  決算データの先読み (Prefetch)
+#  絞り込み結果が決まった時点で、全銘柄の決算表を裏で並列に取得してキャッシュに入れておく
+#  (個別銘柄を選んだときには取得済みなので、すぐに表示できる)
+#  ※Streamlitに依存しません
+# ==========================================
+
+DEFAULT_PREFETCH_WORKERS = 4  # 画面からのリクエストの邪魔をしないよう控えめに
+
+
+class StatementPrefetcher:
+    """銘柄リストの決算表(損益・貸借・キャッシュフロー)を裏で先読みする
+
+    1つの先読み係を複数の利用者(Streamlitのセッションなど)で共有できる。
+    start(codes, owner) を呼ぶたびに、そのownerの前回の先読みのうちまだ始まっていない分を取り消す
+    (ほかのownerも欲しがっている銘柄は取り消さない)。
+    get(code) は先読み済みならキャッシュから、先読み中なら完了を待って、未着手ならその場で取得して返す。
+    """
+
+    def __init__(self, cache: StatementWarehouse, scheduler: RequestScheduler,
+                 max_workers: int = DEFAULT_PREFETCH_WORKERS, fetch_fn=fetch_statements):
+        self.cache = cache
+        self.scheduler = scheduler
+        self.fetch_fn = fetch_fn
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="prefetch")
+        self._lock = threading.Lock()
+        self._codes = {}   # {owner: 先読み中の銘柄リスト}
+        self._wanted = {}  # {銘柄: 欲しがっているownerの数}
+        self._futures = {}
+        self.errors = {}
+
+    def _fetch(self, code: str) -> dict:
+        """取得してキャッシュに保存する(同じ銘柄の同時取得はスケジューラが1回にまとめる)"""
+        frames = self.scheduler.call(("statements", code), lambda: self.fetch_fn(code))
+        self.cache.put_many(code, frames)
+        return frames
+
+    def _task(self, code: str):
+        #もう誰も欲しがっていない銘柄や、画面側で先に取得済みの銘柄はスキップ
+        with self._lock:
+            wanted = code in self._wanted
+        if not wanted or self.cache.is_fresh(code):
+            return None
+        try:
+            return self._fetch(code)
+        except Exception as e:
+            self.errors[code] = e
+            raise
+
+    def start(self, codes, owner=None) -> None:
+        """ownerの先読みをcodesに切り替える(前回と同じリストなら何もしない)"""
+        codes = tuple(codes)
+        with self._lock:
+            if codes == self._codes.get(owner):
+                return
+            self._release(owner)
+            self._codes[owner] = codes
+            for code in codes:
+                self._wanted[code] = self._wanted.get(code, 0) + 1
+                future = self._futures.get(code)
+                #ほかのownerの先読みが待ち・取得中ならそれを使う(失敗して終わった分だけ取り直す)
+                if future is not None and not (future.done() and future.exception() is not None):
+                    continue
+                if not self.cache.is_fresh(code):
+                    self.errors.pop(code, None)
+                    self._futures[code] = self._executor.submit(self._task, code)
+
+    def cancel(self, owner=None) -> None:
+        """ownerの先読みのうち、まだ始まっていない分を取り消す(取得中の分は終わり次第キャッシュに入る)"""
+        with self._lock:
+            self._release(owner)
+
+    def _release(self, owner) -> None:
+        #ほかに欲しがっているownerがいなくなった銘柄だけ取り消す
+        for code in self._codes.pop(owner, ()):
+            self._wanted[code] -= 1
+            if self._wanted[code] > 0:
+                continue
+            del self._wanted[code]
+            future = self._futures.pop(code, None)
+            if future is not None:
+                future.cancel()
+
+    def get(self, code: str) -> dict:
+        """{種類: 決算表}を返す(取得に失敗したら例外)"""
+        frames = {kind: self.cache.get(code, kind) for kind in STATEMENT_KINDS}
+        if all(df is not None for df in frames.values()):
+            return frames
+
+        with self._lock:
+            future = self._futures.get(code)
+        #先読みが走っていればそれを待つ。まだ順番待ちならその場で取得する(後から来た先読みはスキップされる)
+        if future is not None and future.running():
+            try:
+                result = future.result()
+                if result is not None:
+                    return result
+            except Exception:
+                pass
+        return self._fetch(code)
+
+    def status(self, owner=None) -> dict:
+        """ownerの先読みの進み具合(対象・完了・失敗・待ち)"""
+        with self._lock:
+            codes = self._codes.get(owner, ())
+            futures = [self._futures[code] for code in codes if code in self._futures]
+            total = len(codes)
+        finished = sum(f.done() for f in futures)
+        failed = sum(f.done() and not f.cancelled() and f.exception() is not None for f in futures)
+        return {
+            "total": total,
+            "done": total - len(futures) + finished - failed,
+            "failed": failed,
+            "pending": len(futures) - finished,
+        }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,294 @@
+import json
+import os
+import time
+
+import pandas as pd
+
+import config
+
+# ==========================================
+#  株価(日足OHLCV)のローカル保存庫
+#  cache/prices/<コード>/<年>.parquet に年ごとに分けて保存し、
+#  2回目以降は足りない日付(末尾)だけをまとめてダウンロードする
+# ==========================================
+
+PRICE_COLUMNS = ["Open", "High", "Low", "Close", "Volume"]
+DEFAULT_BATCH_SIZE = 200
+
+PERIOD_OFFSETS = {
+    "1mo": pd.DateOffset(months=1),
+    "3mo": pd.DateOffset(months=3),
+    "6mo": pd.DateOffset(months=6),
+    "1y": pd.DateOffset(years=1),
+    "2y": pd.DateOffset(years=2),
+    "5y": pd.DateOffset(years=5),
+    "10y": pd.DateOffset(years=10),
+}
+
+
+def period_to_start(period: str, today: pd.Timestamp = None) -> pd.Timestamp:
+    """'1y'などのyfinance形式の期間を開始日に変換する"""
+    today = pd.Timestamp.today().normalize() if today is None else today.normalize()
+    if period not in PERIOD_OFFSETS:
+        raise ValueError(f"未対応の期間です: {period}")
+    return today - PERIOD_OFFSETS[period]
+
+
+def yf_history(code: str, start: pd.Timestamp) -> pd.DataFrame:
+    """yfinanceで1銘柄の日足をダウンロードする
+
+    アクセス過多(429)や通信エラーは例外のまま返すので、スケジューラがリトライできる。
+    (yf.download は銘柄ごとの失敗を中でログに出すだけで、呼び出し元に返さない)
+    データが無い銘柄(上場廃止など)は空の表になる。
+    """
+    import yfinance as yf
+    return yf.Ticker(code).history(start=start.strftime("%Y-%m-%d"), interval="1d", actions=False)
+
+
+class PartialDownloadError(Exception):
+    """一部の銘柄のダウンロードに失敗した(取れた銘柄の分は frame に、失敗した銘柄は errors に入っている)"""
+
+    def __init__(self, frame: pd.DataFrame, errors: dict):
+        super().__init__(f"{len(errors)}銘柄のダウンロードに失敗: {sorted(errors)[:5]}")
+        self.frame = frame
+        self.errors = errors
+
+
+def join_histories(frames: dict, errors: dict = None) -> pd.DataFrame:
+    """{コード: 日足}を(コード, 項目)の2段の列の表にまとめる(yf.downloadのgroup_by='ticker'と同じ形)
+
+    失敗した銘柄({コード: 例外})があれば、まとめた表と一緒に PartialDownloadError で知らせる
+    (データが無かっただけの銘柄と区別できるように)。
+    """
+    parts = {}
+    for code, df in frames.items():
+        if df is None or df.empty:
+            continue
+        df = df.copy()
+        #取引所ごとのタイムゾーンは外して日付だけにする(違う市場の銘柄を並べても日付がずれないように)
+        if isinstance(df.index, pd.DatetimeIndex) and df.index.tz is not None:
+            df.index = df.index.tz_localize(None)
+        parts[code] = df
+    out = pd.concat(parts, axis=1) if parts else pd.DataFrame()
+    if errors:
+        raise PartialDownloadError(out, dict(errors))
+    return out
+
+
+def yf_download(codes: list[str], start: pd.Timestamp) -> pd.DataFrame:
+    """複数銘柄を1銘柄ずつ順にダウンロードする(列は(コード, 項目)の2段)
+
+    失敗した銘柄があれば PartialDownloadError(取れた分の表も持っている)。
+    """
+    frames, errors = {}, {}
+    for code in codes:
+        try:
+            frames[code] = yf_history(code, start)
+        except Exception as e:
+            errors[code] = e
+    return join_histories(frames, errors)
+
+
+def split_download(df: pd.DataFrame, codes: list[str]) -> dict:
+    """まとめてダウンロードした表を{コード: OHLCV表}に分ける"""
+    frames = {}
+    if df is None or df.empty:
+        return frames
+    for code in codes:
+        if isinstance(df.columns, pd.MultiIndex):
+            if code in df.columns.get_level_values(0):
+                part = df[code]
+            elif code in df.columns.get_level_values(1):
+                part = df.xs(code, axis=1, level=1)
+            else:
+                continue
+        elif len(codes) == 1:
+            part = df
+        else:
+            continue
+        part = part[[c for c in PRICE_COLUMNS if c in part.columns]].dropna(how="all")
+        if not part.empty:
+            frames[code] = part
+    return frames
+
+
+class PriceStore:
+    """銘柄×年ごとのParquetファイルで日足を保存する"""
+
+    def __init__(self, root: str = None, downloader=yf_download, batch_size: int = DEFAULT_BATCH_SIZE):
+        self.root = root or os.path.join(config.CACHE_DIR, "prices")
+        self.downloader = downloader
+        self.batch_size = batch_size
+        os.makedirs(self.root, exist_ok=True)
+
+    # --- 読み込み ---
+    def read(self, code: str, start: pd.Timestamp = None, end: pd.Timestamp = None) -> pd.DataFrame:
+        """保存済みの日足を読む(start/endで期間を絞る)"""
+        years = self._years(code)
+        if start is not None:
+            years = [y for y in years if y >= start.year]
+        if end is not None:
+            years = [y for y in years if y <= end.year]
+        if not years:
+            return pd.DataFrame(columns=PRICE_COLUMNS)
+
+        df = pd.concat([pd.read_parquet(self._year_path(code, y)) for y in years])
+        if start is not None:
+            df = df[df.index >= start]
+        if end is not None:
+            df = df[df.index <= end]
+        return df
+
+    def read_period(self, code: str, period: str) -> pd.DataFrame:
+        return self.read(code, start=period_to_start(period))
+
+    def read_many(self, codes: list[str], start: pd.Timestamp = None) -> pd.DataFrame:
+        """複数銘柄を(コード, 項目)の2段の列にまとめて返す(yf.downloadのgroup_by='ticker'と同じ形)"""
+        frames = {code: self.read(code, start=start) for code in codes}
+        frames = {code: df for code, df in frames.items() if not df.empty}
+        if not frames:
+            return pd.DataFrame()
+        return pd.concat(frames, axis=1)
+
+    def read_closes(self, codes: list[str], start: pd.Timestamp = None, column: str = "Close") -> pd.DataFrame:
+        """終値などの1項目を横持ち(行が日付、列がコード)で返す。全銘柄の一括計算用"""
+        series = {}
+        for code in codes:
+            df = self.read(code, start=start)
+            if not df.empty and column in df.columns:
+                series[code] = df[column]
+        if not series:
+            return pd.DataFrame()
+        return pd.DataFrame(series).sort_index()
+
+    def last_date(self, code: str):
+        years = self._years(code)
+        if not years:
+            return None
+        df = pd.read_parquet(self._year_path(code, years[-1]), columns=["Close"])
+        return df.index.max() if not df.empty else None
+
+    # --- 書き込み ---
+    def write(self, code: str, df: pd.DataFrame) -> None:
+        """日足を年ごとのファイルにマージして保存する(同じ日付は新しい方で上書き)"""
+        if df.empty:
+            return
+        df = df.copy()
+        df.index = pd.DatetimeIndex(df.index)
+        if df.index.tz is not None:
+            df.index = df.index.tz_localize(None)
+        df.index.name = "Date"
+        os.makedirs(self._ticker_dir(code), exist_ok=True)
+
+        for year, part in df.groupby(df.index.year):
+            path = self._year_path(code, year)
+            if os.path.exists(path):
+                part = pd.concat([pd.read_parquet(path), part])
+                part = part[~part.index.duplicated(keep="last")]
+            part.sort_index().to_parquet(path)
+
+    # --- 更新 ---
+    def update(self, codes: list[str], period: str = "1y", today: pd.Timestamp = None) -> dict:
+        """足りない日付だけをまとめてダウンロードして保存する
+
+        同じ日付から取り直す銘柄同士をbatch_size件ずつまとめて1回のダウンロードにする。
+        戻り値は {"downloaded": 更新した銘柄数, "skipped": 最新だった銘柄数, "requests": ダウンロード回数,
+                  "failed": 失敗した銘柄のリスト, "errors": {失敗したバッチ(または銘柄)のタプル: 例外}}
+        """
+        today = pd.Timestamp.today().normalize() if today is None else today.normalize()
+        want_start = period_to_start(period, today)
+
+        #取り直しの開始日ごとに銘柄をグループ分けする
+        groups = {}
+        skipped = 0
+        for code in dict.fromkeys(codes):
+            start = self._missing_from(code, want_start, today)
+            if start is None:
+                skipped += 1
+                continue
+            groups.setdefault(start, []).append(code)
+
+        downloaded = 0
+        requests = 0
+        failed = []
+        errors = {}
+        for start, group in groups.items():
+            for i in range(0, len(group), self.batch_size):
+                batch = group[i:i + self.batch_size]
+                requests += 1
+                code_errors = {}
+                try:
+                    frames = split_download(self.downloader(batch, start), batch)
+                except PartialDownloadError as e:
+                    #取れた銘柄は保存し、失敗した銘柄だけを次回の更新で取り直す
+                    frames = split_download(e.frame, batch)
+                    code_errors = e.errors
+                except Exception as e:
+                    #1回分の失敗で全体を止めず、次回の更新で取り直す
+                    failed.extend(batch)
+                    errors[tuple(batch)] = e
+                    continue
+                for code in batch:
+                    if code in frames:
+                        self.write(code, frames[code])
+                        downloaded += 1
+                    elif code in code_errors:
+                        #アクセス過多などで取れなかった銘柄は確認済みにしない(黙って1日抜けないように)
+                        failed.append(code)
+                        errors[(code,)] = code_errors[code]
+                        continue
+                    #データが無く、エラーも無かった銘柄(上場廃止など)は、確認済みとして記録して毎回取りに行かないようにする
+                    self._save_meta(code, start, today)
+
+        return {"downloaded": downloaded, "skipped": skipped, "requests": requests,
+                "failed": failed, "errors": errors}
+
+    def _missing_from(self, code: str, want_start: pd.Timestamp, today: pd.Timestamp):
+        """取り直しが必要な開始日(不要ならNone)"""
+        meta = self._load_meta(code)
+        if meta is None:
+            return want_start
+        covered_from = pd.Timestamp(meta["covered_from"])
+        if want_start < covered_from:
+            #もっと古い期間を求められたら、そこから取り直す
+            return want_start
+        if pd.Timestamp(meta["checked_on"]) >= today:
+            return None
+        last = self.last_date(code)
+        #最終日は場中の途中値かもしれないので、最終日から取り直して上書きする
+        return want_start if last is None else max(want_start, last)
+
+    # --- ファイル配置 ---
+    def _ticker_dir(self, code: str) -> str:
+        return os.path.join(self.root, code)
+
+    def _year_path(self, code: str, year: int) -> str:
+        return os.path.join(self._ticker_dir(code), f"{year}.parquet")
+
+    def _years(self, code: str) -> list[int]:
+        folder = self._ticker_dir(code)
+        if not os.path.isdir(folder):
+            return []
+        return sorted(int(name[:-8]) for name in os.listdir(folder) if name.endswith(".parquet"))
+
+    def _meta_path(self, code: str) -> str:
+        return os.path.join(self._ticker_dir(code), "_meta.json")
+
+    def _load_meta(self, code: str):
+        path = self._meta_path(code)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _save_meta(self, code: str, start: pd.Timestamp, today: pd.Timestamp) -> None:
+        meta = self._load_meta(code) or {}
+        covered_from = pd.Timestamp(meta.get("covered_from", start))
+        meta = {
+            "covered_from": min(covered_from, start).strftime("%Y-%m-%d"),
+            "checked_on": today.strftime("%Y-%m-%d"),
+            "updated_at": time.time(),
+        }
+        os.makedirs(self._ticker_dir(code), exist_ok=True)
+        with open(self._meta_path(code), "w", encoding="utf-8") as f:
+            json.dump(meta, f)
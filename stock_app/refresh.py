@@ -0,0 +1,233 @@
+import argparse
+import datetime
+import hashlib
+import json
+import os
+import sys
+import time
+
+import config
+import fetcher
+import jpx_master
+import stock_core
+from fundamentals_cache import FundamentalsCache
+from scheduler import RequestScheduler
+from sector_stats import SectorStatsStore
+from statements import StatementWarehouse, fetch_statements
+
+# ==========================================
+#  全銘柄のデータ更新(コマンドライン版)
+#  Streamlitを使わずに、指標・決算・株価のキャッシュを並列でまとめて更新する
+#  寄り付き前に実行しておけば、アプリは最初からキャッシュを使えます
+#  (指標を更新したときは、業種・市場ごとの集計表も作り直します)
+#
+#  使い方: python refresh.py                      # 全部
+#          python refresh.py --only prices --period 5y
+#          (途中で止まっても、同じ日にもう一度実行すれば続きから再開します)
+# ==========================================
+
+STAGES = ["fundamentals", "statements", "prices"]
+STAGE_NAMES = {"fundamentals": "指標", "statements": "決算", "prices": "株価"}
+CHECKPOINT_EVERY = 50  # 何銘柄ごとに進み具合を保存するか
+
+
+def run_settings(period: str, stages: list[str], codes: list[str], today: datetime.date = None) -> dict:
+    """チェックポイントを使い回してよい実行かどうかを決める設定(実行日と銘柄リストを含む)
+
+    別の日の実行や、銘柄リストが変わった実行は、前の実行の途中経過を引き継がない。
+    """
+    today = today or datetime.date.today()
+    digest = hashlib.sha1("\n".join(codes).encode("utf-8")).hexdigest()
+    return {"date": today.isoformat(), "period": period, "stages": stages, "codes": digest}
+
+
+class Checkpoint:
+    """段階ごとに完了した銘柄を記録するファイル(同じ実行のクラッシュ後の再開用)"""
+
+    def __init__(self, path: str, settings: dict):
+        self.path = path
+        self.settings = settings
+        self.done = {stage: set() for stage in STAGES}
+        self._pending = 0
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+            #設定(実行日・期間・銘柄リストなど)が違う実行の途中経過は使わない
+            if saved.get("settings") == settings:
+                self.done.update({stage: set(codes) for stage, codes in saved.get("done", {}).items()})
+
+    def mark(self, stage: str, codes) -> None:
+        self.done[stage].update(codes)
+        self._pending += len(codes)
+        if self._pending >= CHECKPOINT_EVERY:
+            self.save()
+
+    def save(self) -> None:
+        self._pending = 0
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"settings": self.settings, "done": {k: sorted(v) for k, v in self.done.items()}}, f)
+        #書き込み途中で落ちても壊れないよう、書き終えてから置き換える
+        os.replace(tmp_path, self.path)
+
+    def remove(self) -> None:
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def dir_size(path: str) -> int:
+    """フォルダ(またはファイル)の合計バイト数"""
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            total += os.path.getsize(os.path.join(root, name))
+    return total
+
+
+def print_progress(stage: str, done: int, total: int) -> None:
+    if done == total or done % 50 == 0:
+        print(f"  [{STAGE_NAMES[stage]}] {done}/{total}", flush=True)
+
+
+def refresh_fundamentals(codes, cache, scheduler, checkpoint, workers) -> dict:
+    infos, missing = cache.get_many(codes)
+    checkpoint.mark("fundamentals", infos)
+    failures = []
+
+    def on_progress(done, total, code):
+        print_progress("fundamentals", done, total)
+
+    def on_error(code, e):
+        failures.append(code)
+
+    #チェックポイントに書けるよう、一定件数ずつ取得して保存する
+    for i in range(0, len(missing), CHECKPOINT_EVERY):
+        chunk = missing[i:i + CHECKPOINT_EVERY]
+        fetched = fetcher.fetch_concurrently(
+            chunk, stock_core.fetch_ticker_info,
+            max_workers=workers, scheduler=scheduler, kind="info",
+            on_progress=lambda done, total, code, offset=i: on_progress(offset + done, len(missing), code),
+            on_error=on_error,
+        )
+        cache.put_many(fetched)
+        checkpoint.mark("fundamentals", fetched)
+    return {"fetched": len(missing) - len(failures), "cached": len(infos), "failures": failures}
+
+
+def refresh_statements(codes, warehouse, scheduler, checkpoint, workers) -> dict:
+    todo = warehouse.stale(codes)
+    fresh = sorted(set(codes) - set(todo))
+    checkpoint.mark("statements", fresh)
+    failures = []
+
+    for i in range(0, len(todo), CHECKPOINT_EVERY):
+        chunk = todo[i:i + CHECKPOINT_EVERY]
+        fetched = fetcher.fetch_concurrently(
+            chunk, fetch_statements,
+            max_workers=workers, scheduler=scheduler, kind="statements",
+            on_progress=lambda done, total, code, offset=i: print_progress("statements", offset + done, len(todo)),
+            on_error=lambda code, e: failures.append(code),
+        )
+        #取得した分をまとめて保存する(同じファイルに入る銘柄は1回の書き直しで済む)
+        warehouse.upsert(fetched)
+        checkpoint.mark("statements", fetched)
+    return {"fetched": len(todo) - len(failures), "cached": len(fresh), "failures": failures}
+
+
+def refresh_prices(codes, store, checkpoint, period) -> dict:
+    summary = {"fetched": 0, "cached": 0, "failures": []}
+    for i in range(0, len(codes), store.batch_size):
+        chunk = codes[i:i + store.batch_size]
+        result = store.update(chunk, period=period)
+        summary["fetched"] += result["downloaded"]
+        summary["cached"] += result["skipped"]
+        summary["failures"].extend(result["failed"])
+        failed = set(result["failed"])
+        checkpoint.mark("prices", [code for code in chunk if code not in failed])
+        print_progress("prices", min(i + store.batch_size, len(codes)), len(codes))
+    return summary
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="全銘柄の指標・決算・株価のキャッシュを更新する")
+    parser.add_argument("--jpx", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "data_j.xls"),
+                        help="JPXの銘柄マスター(data_j.xls)")
+    parser.add_argument("--only", default=",".join(STAGES), help=f"更新する対象(カンマ区切り: {','.join(STAGES)})")
+    parser.add_argument("--period", default="1y", help="株価の期間(1mo, 3mo, 6mo, 1y, 2y, 5y, 10y)")
+    parser.add_argument("--workers", type=int, default=16, help="同時取得数")
+    parser.add_argument("--rate", type=float, default=fetcher.DEFAULT_RATE_LIMIT, help="秒間リクエスト数の上限")
+    parser.add_argument("--limit", type=int, default=None, help="先頭から何銘柄だけ更新するか(動作確認用)")
+    parser.add_argument("--checkpoint", default=os.path.join(config.CACHE_DIR, "refresh_checkpoint.json"))
+    parser.add_argument("--restart", action="store_true", help="途中経過を捨てて最初からやり直す")
+    args = parser.parse_args(argv)
+
+    stages = [s.strip() for s in args.only.split(",") if s.strip()]
+    unknown = [s for s in stages if s not in STAGES]
+    if unknown:
+        parser.error(f"未対応の対象です: {unknown}")
+
+    master = jpx_master.load_master(args.jpx)
+    if master.empty:
+        print(f"'{args.jpx}' が見つかりません")
+        return 1
+    codes = master["コード"].tolist()[:args.limit]
+
+    checkpoint = Checkpoint(args.checkpoint, run_settings(args.period, stages, codes))
+    if args.restart:
+        checkpoint.done = {stage: set() for stage in STAGES}
+    scheduler = RequestScheduler(rate=args.rate)
+    fundamentals = FundamentalsCache()
+    warehouse = StatementWarehouse()
+    store = stock_core.make_price_store(scheduler)
+    storage = {"fundamentals": fundamentals.path, "statements": warehouse.root, "prices": store.root}
+
+    print(f"対象: {len(codes)}銘柄 / 更新: {', '.join(STAGE_NAMES[s] for s in stages)}")
+    report = []
+    for stage in stages:
+        todo = [code for code in codes if code not in checkpoint.done[stage]]
+        if len(todo) < len(codes):
+            print(f"[{STAGE_NAMES[stage]}] 前回の続きから再開します({len(codes) - len(todo)}銘柄は完了済み)")
+        size_before = dir_size(storage[stage])
+        start = time.perf_counter()
+        if stage == "fundamentals":
+            result = refresh_fundamentals(todo, fundamentals, scheduler, checkpoint, args.workers)
+        elif stage == "statements":
+            result = refresh_statements(todo, warehouse, scheduler, checkpoint, args.workers)
+        else:
+            result = refresh_prices(todo, store, checkpoint, args.period)
+        elapsed = time.perf_counter() - start
+        checkpoint.save()
+        report.append({
+            "stage": stage, "tickers": len(todo), "seconds": elapsed,
+            "bytes": dir_size(storage[stage]) - size_before, **result,
+        })
+        if stage == "fundamentals":
+            #指標が変わったので、業種・市場ごとの集計表も作り直す
+            start = time.perf_counter()
+            stats = SectorStatsStore()
+            stock_core.refresh_sector_stats(master, fundamentals, stats)
+            print(f"[業種集計] {stats.meta().get('tickers', 0)}銘柄から作成 ({time.perf_counter() - start:.1f}秒)")
+
+    #全部終わったら途中経過は不要
+    failed_any = any(r["failures"] for r in report)
+    if not failed_any:
+        checkpoint.remove()
+
+    print("\n=== 更新結果 ===")
+    print(f"{'対象':<6} {'銘柄':>6} {'取得':>6} {'キャッシュ':>8} {'失敗':>5} {'秒':>8} {'銘柄/秒':>8} {'保存量(KB)':>10}")
+    for r in report:
+        rate = r["tickers"] / r["seconds"] if r["seconds"] > 0 else 0.0
+        print(f"{STAGE_NAMES[r['stage']]:<6} {r['tickers']:>6} {r['fetched']:>6} {r['cached']:>8} "
+              f"{len(r['failures']):>5} {r['seconds']:>8.1f} {rate:>8.1f} {r['bytes'] / 1024:>10,.0f}")
+    total = scheduler.summary()
+    print(f"リクエスト: {total['requests']}回 (リトライ{total['retries']}回, 失敗{total['failures']}回)")
+    if failed_any:
+        print("失敗した銘柄があります。今日のうちにもう一度実行すると失敗分だけ取り直します。")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
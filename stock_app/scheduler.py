@@ -0,0 +1,176 @@
+import random
+import threading
+import time
+from concurrent.futures import Future
+
+import pandas as pd
+
+# ==========================================
+#  Yahoo Financeへのリクエストをまとめて管理するスケジューラ
+#  ・トークンバケットで秒間リクエスト数を制限
+#  ・429(アクセス過多)や通信エラーはゆらぎつきの指数バックオフでリトライ
+#  ・同じ銘柄への同時リクエストは1回にまとめる
+#  ・銘柄ごとの所要時間・失敗回数を記録
+# ==========================================
+
+DEFAULT_RATE = 5.0      # 秒間リクエスト数
+DEFAULT_BURST = 10      # まとめて出してよい最大数
+DEFAULT_MAX_RETRIES = 4
+DEFAULT_BACKOFF = 0.5   # 1回目のリトライまでの待ち時間(秒)
+MAX_BACKOFF = 30.0
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+def is_retryable(error: Exception) -> bool:
+    """リトライすれば成功しそうなエラーか(アクセス過多・一時的な通信エラー)"""
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    if status in RETRYABLE_STATUS:
+        return True
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    #yfinanceのYFRateLimitErrorなど
+    if "RateLimit" in type(error).__name__:
+        return True
+    message = str(error)
+    return "429" in message or "Too Many Requests" in message
+
+
+class TokenBucket:
+    """rate個/秒でトークンが貯まり、最大burst個まで貯められるバケツ"""
+
+    def __init__(self, rate: float = DEFAULT_RATE, burst: int = DEFAULT_BURST, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self._tokens = float(self.capacity)
+        self._clock = clock
+        self._sleep = sleep
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """トークンを1つ取る(無ければ貯まるまで待つ)。待った秒数を返す"""
+        if not self.rate:
+            return 0.0
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = (1 - self._tokens) / self.rate
+            self._sleep(delay)
+            waited += delay
+
+
+class RequestScheduler:
+    """リクエストの流量制限・リトライ・重複まとめ・計測をまとめて行う
+
+    使い方: scheduler.call(("info", "7203.T"), lambda: yf.Ticker("7203.T").info)
+    """
+
+    def __init__(self, rate: float = DEFAULT_RATE, burst: int = DEFAULT_BURST,
+                 max_retries: int = DEFAULT_MAX_RETRIES, backoff: float = DEFAULT_BACKOFF,
+                 sleep=time.sleep, seed: int = None):
+        self.bucket = TokenBucket(rate, burst, sleep=sleep)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._sleep = sleep
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._stats = {}
+
+    def call(self, key, fn):
+        """fn()を実行して結果を返す。同じkeyが実行中なら、その結果を待って共有する"""
+        with self._lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._inflight[key] = future
+            stats = self._stats_for(key)
+            stats["calls"] += 1
+            if not owner:
+                stats["collapsed"] += 1
+        if not owner:
+            return future.result()
+
+        try:
+            result = self._run_with_retry(key, fn)
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def _run_with_retry(self, key, fn):
+        attempt = 0
+        while True:
+            self.bucket.acquire()
+            start = time.perf_counter()
+            try:
+                result = fn()
+            except Exception as e:
+                self._record(key, time.perf_counter() - start, failed=True)
+                if attempt >= self.max_retries or not is_retryable(e):
+                    raise
+                #指数バックオフ + ゆらぎ(同時に失敗したリクエストが同じ時刻に再送しないように)
+                delay = min(MAX_BACKOFF, self.backoff * (2 ** attempt))
+                self._sleep(delay * self._random.uniform(0.5, 1.5))
+                attempt += 1
+                with self._lock:
+                    self._stats_for(key)["retries"] += 1
+                continue
+            self._record(key, time.perf_counter() - start, failed=False)
+            return result
+
+    def _stats_for(self, key) -> dict:
+        return self._stats.setdefault(key, {
+            "calls": 0, "requests": 0, "failures": 0, "retries": 0, "collapsed": 0,
+            "total_latency": 0.0, "max_latency": 0.0,
+        })
+
+    def _record(self, key, latency: float, failed: bool) -> None:
+        with self._lock:
+            stats = self._stats_for(key)
+            stats["requests"] += 1
+            stats["failures"] += int(failed)
+            stats["total_latency"] += latency
+            stats["max_latency"] = max(stats["max_latency"], latency)
+
+    def stats(self) -> pd.DataFrame:
+        """キーごとの呼び出し数・実リクエスト数・失敗・リトライ・まとめた数・遅延"""
+        with self._lock:
+            rows = []
+            for key, s in self._stats.items():
+                rows.append({
+                    "種類": key[0] if isinstance(key, tuple) else "",
+                    "対象": key[1] if isinstance(key, tuple) and len(key) > 1 else key,
+                    "呼び出し": s["calls"],
+                    "リクエスト": s["requests"],
+                    "失敗": s["failures"],
+                    "リトライ": s["retries"],
+                    "まとめた数": s["collapsed"],
+                    "平均遅延(ms)": 1000 * s["total_latency"] / s["requests"] if s["requests"] else 0.0,
+                    "最大遅延(ms)": 1000 * s["max_latency"],
+                })
+        return pd.DataFrame(rows)
+
+    def summary(self) -> dict:
+        """全体の合計"""
+        with self._lock:
+            totals = {"calls": 0, "requests": 0, "failures": 0, "retries": 0, "collapsed": 0}
+            for s in self._stats.values():
+                for name in totals:
+                    totals[name] += s[name]
+        return totals
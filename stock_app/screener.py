@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+
+import indicators
+
+# ==========================================
+#  全銘柄スクリーニング
+#  銘柄マスター + 指標キャッシュ + 株価保存庫から全銘柄の表を1回作っておき、
+#  条件での絞り込みと順位付けは列ごとの一括計算で行う
+# ==========================================
+
+MOMENTUM_DAYS = 63  # 約3ヶ月(営業日)
+MOMENTUM_COLUMN = "騰落率(3ヶ月)"
+RSI_COLUMN = "RSI"
+
+#条件に使える列(値はinfoの項目名。Noneは株価から計算する列)
+SCREEN_COLUMNS = {
+    "PER(予)": "forwardPE",
+    "PBR": "priceToBook",
+    "ROE": "returnOnEquity",
+    "配当利回り": "dividendYield",
+    "時価総額": "marketCap",
+    MOMENTUM_COLUMN: None,
+    RSI_COLUMN: None,
+}
+
+
+def build_universe(master: pd.DataFrame, infos: dict, closes: pd.DataFrame = None,
+                   momentum_days: int = MOMENTUM_DAYS, rsi_period: int = 14) -> pd.DataFrame:
+    """全銘柄の表を作る
+
+    master: 銘柄マスター(コード, 銘柄名, 33業種区分, 市場・商品区分)
+    infos: {コード: yfinanceのinfo} (指標キャッシュの中身)
+    closes: 終値の横持ち表(行が日付、列がコード)。Noneなら株価系の列はNaN
+    """
+    df = master.reset_index(drop=True).copy()
+    df = df.rename(columns={"銘柄名": "会社名"})
+    codes = df["コード"]
+
+    df["現在値"] = [infos.get(code, {}).get("currentPrice") for code in codes]
+    for col, key in SCREEN_COLUMNS.items():
+        if key is not None:
+            df[col] = pd.to_numeric(pd.Series([infos.get(code, {}).get(key) for code in codes]), errors="coerce")
+
+    df[MOMENTUM_COLUMN] = np.nan
+    df[RSI_COLUMN] = np.nan
+    if closes is not None and not closes.empty:
+        closes = closes.reindex(columns=codes.tolist())
+        values = closes.to_numpy(dtype=float)
+        #銘柄ごとに休場日などの欠損があっても、直近の有効な終値で比べる
+        filled = closes.ffill().to_numpy(dtype=float)
+        if len(filled) > momentum_days:
+            with np.errstate(divide="ignore", invalid="ignore"):
+                df[MOMENTUM_COLUMN] = (filled[-1] / filled[-momentum_days - 1] - 1) * 100
+        df[RSI_COLUMN] = indicators.rsi(values, rsi_period)[-1] if len(values) else np.nan
+    return df
+
+
+def screen(universe: pd.DataFrame, criteria: dict, rank_by: dict = None, top: int = None) -> pd.DataFrame:
+    """条件で絞り込んで順位をつける
+
+    criteria: {列名: (下限, 上限)} (Noneは制限なし)
+    rank_by: {列名: True(小さいほど良い) / False(大きいほど良い)}。複数あれば順位の平均で並べる
+    """
+    mask = np.ones(len(universe), dtype=bool)
+    for col, (low, high) in criteria.items():
+        values = universe[col].to_numpy(dtype=float)
+        #条件を指定した列が欠損の銘柄は除外する
+        with np.errstate(invalid="ignore"):
+            if low is not None:
+                mask &= values >= low
+            if high is not None:
+                mask &= values <= high
+    result = universe[mask]
+
+    if rank_by:
+        ranks = [result[col].rank(ascending=ascending, pct=True) for col, ascending in rank_by.items()]
+        result = result.assign(スコア=(1 - pd.concat(ranks, axis=1).mean(axis=1)) * 100)
+        result = result.sort_values("スコア", ascending=False)
+
+    if top is not None:
+        result = result.head(top)
+    return result.reset_index(drop=True)
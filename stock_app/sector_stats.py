@@ -0,0 +1,131 @@
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+import config
+
+# ==========================================
+#  業種・市場ごとの集計表 (Sector stats)
+#  指標の更新のたびに全銘柄の表から業種別・市場別の中央値・四分位・時価総額加重平均と、
+#  各銘柄の業種内の順位(パーセンタイル)を作って保存しておく
+#  (画面では保存済みの表を読むだけなので、その場で全銘柄を集計し直さない)
+#  ※Streamlitに依存しません
+# ==========================================
+
+METRICS = ["PER(予)", "PBR", "ROE", "配当利回り"]
+WEIGHT_COLUMN = "時価総額"
+#集計の単位: 表の名前 -> 銘柄マスターの列
+GROUPS = {"sector": "33業種区分", "market": "市場・商品区分"}
+QUANTILES = {"25%": 0.25, "中央値": 0.5, "75%": 0.75}
+#赤字(PERがマイナス)や債務超過(PBRがマイナス)の銘柄は比べても意味がないので集計から外す
+POSITIVE_ONLY = ["PER(予)", "PBR"]
+
+
+def clean_metrics(universe: pd.DataFrame) -> pd.DataFrame:
+    """集計に使う指標だけを数値にして取り出す(範囲外の値はNaN)"""
+    values = universe[METRICS].apply(pd.to_numeric, errors="coerce")
+    for col in POSITIVE_ONLY:
+        values[col] = values[col].where(values[col] > 0)
+    return values
+
+
+def aggregate(universe: pd.DataFrame, group_column: str) -> pd.DataFrame:
+    """グループ×指標ごとの銘柄数・四分位・時価総額加重平均(縦持ち: 行が(グループ, 指標))"""
+    values = clean_metrics(universe)
+    keys = universe[group_column].astype(str)
+    weights = pd.to_numeric(universe[WEIGHT_COLUMN], errors="coerce")
+    weights = weights.where(weights > 0)
+
+    grouped = values.groupby(keys)
+    quantiles = grouped.quantile(list(QUANTILES.values()))
+    quantiles.index = quantiles.index.set_names([group_column, "q"])
+    table = quantiles.stack().unstack("q")
+    table.columns = list(QUANTILES)
+    table.index = table.index.set_names([group_column, "指標"])
+
+    #加重平均は、指標と時価総額の両方がある銘柄だけで計算する
+    valid = values.notna() & weights.notna().to_numpy()[:, None]
+    weighted_sum = values.where(valid).mul(weights, axis=0).groupby(keys).sum()
+    weight_sum = valid.mul(weights.fillna(0), axis=0).groupby(keys).sum()
+    with np.errstate(invalid="ignore", divide="ignore"):
+        weighted = (weighted_sum / weight_sum.where(weight_sum > 0)).stack()
+    counts = grouped.count().stack()
+    counts.index = counts.index.set_names([group_column, "指標"])
+    weighted.index = weighted.index.set_names([group_column, "指標"])
+
+    table.insert(0, "銘柄数", counts.reindex(table.index).fillna(0).astype(int))
+    table["加重平均"] = weighted.reindex(table.index)
+    return table.reset_index()
+
+
+def percentiles(universe: pd.DataFrame, group_column: str = GROUPS["sector"]) -> pd.DataFrame:
+    """各銘柄の指標が、同じグループの中で下から何%の位置か(0〜100。指標が無い銘柄はNaN)"""
+    values = clean_metrics(universe)
+    ranks = values.groupby(universe[group_column].astype(str).to_numpy()).rank(pct=True) * 100
+    ranks.insert(0, group_column, universe[group_column].astype(str).to_numpy())
+    ranks.index = universe["コード"].to_numpy()
+    ranks.index.name = "コード"
+    return ranks
+
+
+def build(universe: pd.DataFrame) -> dict:
+    """保存する表一式を作る: {"sector": 業種別, "market": 市場別, "percentiles": 業種内の順位}"""
+    tables = {name: aggregate(universe, column) for name, column in GROUPS.items()}
+    tables["percentiles"] = percentiles(universe).reset_index()
+    return tables
+
+
+class SectorStatsStore:
+    """集計表の保存先(<root>/<表の名前>.parquet と、いつ作ったかを書いた meta.json)"""
+
+    def __init__(self, root: str = None):
+        self.root = root or os.path.join(config.CACHE_DIR, "sector_stats")
+        os.makedirs(self.root, exist_ok=True)
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.root, f"{name}.parquet")
+
+    def _meta_path(self) -> str:
+        return os.path.join(self.root, "meta.json")
+
+    def save(self, tables: dict, universe_size: int = None) -> None:
+        for name, df in tables.items():
+            tmp_path = self._path(name) + ".tmp"
+            df.to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, self._path(name))
+        tmp_path = self._meta_path() + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"built_at": time.time(), "tickers": universe_size}, f)
+        os.replace(tmp_path, self._meta_path())
+
+    def meta(self) -> dict:
+        """{"built_at": 作成時刻, "tickers": 銘柄数}(まだ作っていなければ空)"""
+        if not os.path.exists(self._meta_path()):
+            return {}
+        with open(self._meta_path(), "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def load(self, name: str, filters=None) -> pd.DataFrame:
+        """保存済みの表を読む(まだ無ければ空の表)。filtersはParquetの読み込み時の絞り込み"""
+        path = self._path(name)
+        if not os.path.exists(path):
+            return pd.DataFrame()
+        return pd.read_parquet(path, filters=filters)
+
+    def position(self, code: str) -> pd.DataFrame:
+        """1銘柄の指標と、業種内の順位・業種の中央値を並べた表(行が指標)"""
+        ranks = self.load("percentiles", filters=[("コード", "==", code)])
+        if ranks.empty:
+            return pd.DataFrame()
+        row = ranks.iloc[0]
+        sector_column = GROUPS["sector"]
+        sector = self.load("sector", filters=[(sector_column, "==", row[sector_column])]).set_index("指標")
+        return pd.DataFrame({
+            "業種内の位置(%)": row[METRICS].astype(float),
+            "業種の中央値": sector["中央値"].reindex(METRICS),
+            "業種の加重平均": sector["加重平均"].reindex(METRICS),
+            "業種の銘柄数": sector["銘柄数"].reindex(METRICS),
+        }).rename_axis(row[sector_column])
@@ -0,0 +1,242 @@
+import json
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+import config
+
+# ==========================================
+#  決算データ(損益計算書・貸借対照表・キャッシュフロー)の取得と保存
+#  全項目を縦持ち(コード, 項目, 決算期, 値)で、種類ごとのParquetにまとめて保存する
+#  ・ファイルはコードの先頭2文字ごとに分け、中は(コード, 項目, 決算期)順に並べる
+#    → 1銘柄の読み出しも、全銘柄の1項目だけの読み出しも、少ないファイル・行グループで済む
+#  ・新しい決算が出たら、その銘柄が入っているファイルだけを書き直す(同じ行は新しい値で上書き)
+# ==========================================
+
+#種類 -> yf.Tickerの属性名
+STATEMENT_KINDS = {
+    "income": "income_stmt",
+    "balance": "balance_sheet",
+    "cashflow": "cashflow",
+}
+DEFAULT_MAX_AGE_HOURS = 24 * 7  # 決算は頻繁に変わらないので1週間
+KEY_COLUMNS = ["code", "item", "period"]
+COMPRESSION = "zstd"
+
+
+def fetch_statements(code: str, kinds=tuple(STATEMENT_KINDS)) -> dict:
+    """1銘柄分の決算表を{種類: 表(行が項目、列が決算期)}で取得する"""
+    import yfinance as yf
+    ticker = yf.Ticker(code)
+    return {kind: getattr(ticker, STATEMENT_KINDS[kind]) for kind in kinds}
+
+
+def _numeric_values(df: pd.DataFrame) -> np.ndarray:
+    try:
+        return df.to_numpy(dtype=float, na_value=np.nan)
+    except (TypeError, ValueError):
+        #数値に直せない値が混じっている場合だけ1列ずつ変換する
+        return df.apply(pd.to_numeric, errors="coerce").to_numpy(dtype=float)
+
+
+def to_long(frames_by_code: dict) -> pd.DataFrame:
+    """{コード: yfinanceの決算表(行が項目、列が決算期)}を1つの縦持ちの表にする(値の無い行は落とす)"""
+    codes, items, periods, values = [], [], [], []
+    for code, df in frames_by_code.items():
+        if df is None or df.empty:
+            continue
+        n_items, n_periods = df.shape
+        codes.append(np.full(n_items * n_periods, code, dtype=object))
+        items.append(np.tile(df.index.astype(str).to_numpy(dtype=object), n_periods))
+        periods.append(pd.to_datetime(df.columns).to_numpy(dtype="datetime64[ns]").repeat(n_items))
+        values.append(_numeric_values(df).ravel(order="F"))
+    if not codes:
+        return pd.DataFrame({"code": pd.Series(dtype=str), "item": pd.Series(dtype=str),
+                             "period": pd.Series(dtype="datetime64[ns]"), "value": pd.Series(dtype=float)})
+    long = pd.DataFrame({
+        "code": np.concatenate(codes),
+        "item": np.concatenate(items),
+        "period": np.concatenate(periods),
+        "value": np.concatenate(values),
+    })
+    return long[long["value"].notna()].reset_index(drop=True)
+
+
+def to_wide(long: pd.DataFrame) -> pd.DataFrame:
+    """縦持ちの表をyfinanceと同じ形(行が項目、列が決算期で新しい順)に戻す"""
+    if long.empty:
+        return pd.DataFrame()
+    wide = long.pivot(index="item", columns="period", values="value")
+    wide = wide[sorted(wide.columns, reverse=True)]
+    wide.index.name = None
+    wide.columns.name = None
+    return wide
+
+
+class StatementWarehouse:
+    """全銘柄・全項目の決算データの保存庫
+
+    <root>/<種類>/<コード先頭2文字>.parquet に縦持ちで保存し、
+    いつ取得したかは同じ場所の .json に記録する(決算が無い銘柄も「確認済み」になる)。
+    """
+
+    def __init__(self, root: str = None, max_age_hours: float = DEFAULT_MAX_AGE_HOURS):
+        self.root = root or os.path.join(config.CACHE_DIR, "financials")
+        self.max_age_seconds = max_age_hours * 3600
+        self._lock = threading.Lock()
+        for kind in STATEMENT_KINDS:
+            os.makedirs(os.path.join(self.root, kind), exist_ok=True)
+
+    # --- ファイルの場所 ---
+    @staticmethod
+    def bucket_of(code: str) -> str:
+        return "".join(c for c in code[:2] if c.isalnum()) or "_"
+
+    def _data_path(self, kind: str, bucket: str) -> str:
+        return os.path.join(self.root, kind, f"{bucket}.parquet")
+
+    def _meta_path(self, kind: str, bucket: str) -> str:
+        return os.path.join(self.root, kind, f"{bucket}.json")
+
+    def _data_files(self, kind: str, codes=None) -> list[str]:
+        if codes is not None:
+            buckets = sorted({self.bucket_of(code) for code in codes})
+            paths = [self._data_path(kind, b) for b in buckets]
+            return [p for p in paths if os.path.exists(p)]
+        folder = os.path.join(self.root, kind)
+        return sorted(os.path.join(folder, name) for name in os.listdir(folder) if name.endswith(".parquet"))
+
+    def _load_meta(self, kind: str, bucket: str) -> dict:
+        path = self._meta_path(kind, bucket)
+        if not os.path.exists(path):
+            return {}
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    # --- 書き込み ---
+    def upsert(self, frames_by_code: dict, fetched_at: float = None) -> int:
+        """{コード: {種類: 決算表}}をまとめて保存する。書き直したファイル数を返す
+
+        同じ(コード, 項目, 決算期)は新しい値で上書きし、取得し直して無くなった決算期は残す。
+        """
+        fetched_at = time.time() if fetched_at is None else fetched_at
+        written = 0
+        for kind in STATEMENT_KINDS:
+            parts = {}
+            for code, frames in frames_by_code.items():
+                if kind in frames:
+                    parts.setdefault(self.bucket_of(code), {})[code] = frames[kind]
+            for bucket, by_code in parts.items():
+                new_rows = to_long(by_code)
+                with self._lock:
+                    self._merge(kind, bucket, new_rows)
+                    meta = self._load_meta(kind, bucket)
+                    meta.update({code: fetched_at for code in by_code})
+                    self._write_json(self._meta_path(kind, bucket), meta)
+                written += 1
+        return written
+
+    def put_many(self, code: str, frames: dict) -> None:
+        """1銘柄分の{種類: 決算表}を保存する"""
+        self.upsert({code: frames})
+
+    def _merge(self, kind: str, bucket: str, new_rows: pd.DataFrame) -> None:
+        if new_rows.empty:
+            #決算が無い銘柄は、取得時刻の記録だけでよい
+            return
+        path = self._data_path(kind, bucket)
+        if os.path.exists(path):
+            old = pd.read_parquet(path)
+            old[["code", "item"]] = old[["code", "item"]].astype(str)
+            merged = pd.concat([old, new_rows], ignore_index=True)
+            merged = merged.drop_duplicates(KEY_COLUMNS, keep="last")
+        else:
+            merged = new_rows
+        merged = merged.sort_values(KEY_COLUMNS, ignore_index=True)
+        #コードと項目は同じ文字列の繰り返しなので、カテゴリ型(Parquetでは辞書圧縮)にする
+        merged["code"] = merged["code"].astype("category")
+        merged["item"] = merged["item"].astype("category")
+        tmp_path = path + ".tmp"
+        merged.to_parquet(tmp_path, index=False, compression=COMPRESSION)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _write_json(path: str, data: dict) -> None:
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+    # --- 読み込み ---
+    def fetched_at(self, codes, kind: str) -> dict:
+        """{コード: 取得時刻}(未取得の銘柄は含まない)"""
+        result = {}
+        for bucket in {self.bucket_of(code) for code in codes}:
+            meta = self._load_meta(kind, bucket)
+            result.update({code: meta[code] for code in codes if code in meta})
+        return result
+
+    def stale(self, codes, kinds=tuple(STATEMENT_KINDS)) -> list[str]:
+        """未取得または古くなった銘柄のリスト(入力順)"""
+        codes = list(codes)
+        oldest = time.time() - self.max_age_seconds
+        fresh = set(codes)
+        for kind in kinds:
+            fetched = self.fetched_at(codes, kind)
+            fresh &= {code for code, at in fetched.items() if at >= oldest}
+        return [code for code in codes if code not in fresh]
+
+    def is_fresh(self, code: str, kinds=tuple(STATEMENT_KINDS)) -> bool:
+        return not self.stale([code], kinds)
+
+    def get(self, code: str, kind: str, max_age_seconds: float = None):
+        """1銘柄の決算表をyfinanceと同じ形で返す(無い・古い場合はNone)。決算が無い銘柄は空の表"""
+        at = self.fetched_at([code], kind).get(code)
+        max_age = self.max_age_seconds if max_age_seconds is None else max_age_seconds
+        if at is None or time.time() - at > max_age:
+            return None
+        return to_wide(self.scan(kind, codes=[code]))
+
+    def scan(self, kind: str, items=None, codes=None, start=None) -> pd.DataFrame:
+        """縦持ちのまま読み出す(項目・銘柄・決算期で絞り込み)。全銘柄の集計はここから
+
+        絞り込みはParquetの読み込み時に行うので、該当しない行グループは読まない。
+        """
+        files = self._data_files(kind, codes)
+        empty = to_long({})
+        if not files:
+            return empty
+        filters = []
+        if items is not None:
+            filters.append(("item", "in", list(items)))
+        if codes is not None:
+            filters.append(("code", "in", list(codes)))
+        if start is not None:
+            filters.append(("period", ">=", pd.Timestamp(start)))
+        df = pd.concat([pd.read_parquet(path, filters=filters or None) for path in files], ignore_index=True)
+        if df.empty:
+            return empty
+        df["code"] = df["code"].astype(str)
+        df["item"] = df["item"].astype(str)
+        return df
+
+    def growth(self, item: str, kind: str = "income", codes=None) -> pd.DataFrame:
+        """各銘柄の直近の決算期と、その1期前からの伸び率(%)
+
+        例: growth("Total Revenue", codes=プライム銘柄のリスト) で全銘柄の増収率
+        """
+        df = self.scan(kind, items=[item], codes=codes)
+        df = df.sort_values(["code", "period"])
+        #銘柄ごとに1期前の値を横に並べて、直近の行だけ残す
+        df["previous"] = df.groupby("code", sort=False)["value"].shift(1)
+        latest = df.groupby("code", sort=False).tail(1).set_index("code")
+        growth = (latest["value"] / latest["previous"].where(latest["previous"] > 0) - 1) * 100
+        return pd.DataFrame({
+            "決算期": latest["period"],
+            "直近": latest["value"],
+            "前期": latest["previous"],
+            "伸び率(%)": growth,
+        })
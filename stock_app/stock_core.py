@@ -0,0 +1,316 @@
+import sys
+
+import pandas as pd
+
+import backtest
+import comparison
+import fetcher
+import jpx_master
+import screener
+import sector_stats
+from fundamentals_cache import FundamentalsCache
+from memo import LRUMemo
+from price_store import PriceStore, join_histories, period_to_start, yf_history
+from scheduler import RequestScheduler
+from sector_stats import SectorStatsStore
+
+# ==========================================
+#  データ取得・計算の中心部分 (Core)
+#  ※Streamlitやグラフ用ライブラリを読み込まないので、バッチ処理や別プロセスからも使えます
+#    画面への表示は Reporter を通して呼び出し元に任せます
+# ==========================================
+
+#サイドバーの表示名 -> yfinanceの期間
+PERIOD_CHOICES = {'1年': '1y', '6ヶ月': '6mo', '3ヶ月': '3mo', '1ヶ月': '1mo', '2年': '2y', '5年': '5y', '10年': '10y'}
+
+
+class Reporter:
+    """進み具合・エラーの知らせ先(既定では何もしない)
+
+    画面やログに出したいときは、これを継承して必要なメソッドだけ上書きする。
+    """
+
+    def progress(self, done: int, total: int, label: str) -> None:
+        pass
+
+    def error(self, message: str) -> None:
+        pass
+
+    def warning(self, message: str) -> None:
+        pass
+
+    def finish(self) -> None:
+        """一連の処理が終わったとき(進捗表示の後片付け用)"""
+        pass
+
+
+class PrintReporter(Reporter):
+    """コマンドライン用: エラー・警告を標準エラー出力に書く"""
+
+    def __init__(self, every: int = 50, stream=None):
+        self.every = every
+        self.stream = stream or sys.stderr
+
+    def progress(self, done: int, total: int, label: str) -> None:
+        if done == total or done % self.every == 0:
+            print(f"  {done}/{total}", file=self.stream, flush=True)
+
+    def error(self, message: str) -> None:
+        print(f"エラー: {message}", file=self.stream)
+
+    def warning(self, message: str) -> None:
+        print(f"注意: {message}", file=self.stream)
+
+
+def normalize_tickers(text_input: str) -> list[str]:
+    """手入力されたテキストを整形して銘柄コードリストにする"""
+    tickers = []
+    lines = text_input.split('\n')
+    for line in lines:
+        # 全角数字→半角変換
+        code = line.strip().translate(str.maketrans({chr(0xFF10 + i): str(i) for i in range(10)}))
+        if not code:
+            continue
+        if code.isalnum() and len(code) == 4:
+            code = f"{code}.T"
+        tickers.append(code)
+    return list(set(tickers))
+
+
+def build_metrics_row(code: str, info: dict, name_map: dict = None) -> dict:
+    """yfinanceのinfoから一覧表示用の1行を作る"""
+    # 社名解決ロジック
+    company_name = None
+    if name_map and code in name_map:
+        company_name = name_map[code]
+    if company_name is None:
+        company_name = info.get("shortName")
+    if company_name is None:
+        company_name = info.get("longName")
+    if company_name is None:
+        company_name = "不明"
+
+    return {
+        "コード": code,
+        "会社名": company_name,
+        "現在値": info.get("currentPrice", 0),
+        "PER(予)": info.get("forwardPE", None),
+        "PBR": info.get("priceToBook", None),
+        "ROE": info.get("returnOnEquity", None),
+        "配当利回り": info.get("dividendYield", 0),
+        "時価総額": info.get("marketCap", 0)
+    }
+
+
+def fetch_ticker_info(code: str) -> dict:
+    """1銘柄分のinfoを取得する(並列エンジンから呼ばれる)"""
+    import yfinance as yf
+    return yf.Ticker(code).info
+
+
+def fetch_income_statement(code: str) -> pd.DataFrame:
+    """1銘柄分の損益計算書を取得する"""
+    import yfinance as yf
+    return yf.Ticker(code).income_stmt
+
+
+def make_scheduler() -> RequestScheduler:
+    """Yahoo Finance向けの設定でスケジューラを作る"""
+    return RequestScheduler(rate=fetcher.DEFAULT_RATE_LIMIT)
+
+
+def make_price_store(scheduler: RequestScheduler, root: str = None) -> PriceStore:
+    """ダウンロードを共通のスケジューラ経由で行う株価の保存庫を作る"""
+    def download(codes, start):
+        #1銘柄ごとに1リクエスト(トークン1つ)。アクセス過多・通信エラーはスケジューラがリトライし、
+        #それでも取れなかった銘柄は PartialDownloadError で知らせる(保存庫は確認済みにせず、次の更新で取り直す)
+        errors = {}
+        frames = fetcher.fetch_concurrently(
+            codes, lambda code: yf_history(code, start),
+            scheduler=scheduler, kind="history",
+            on_error=lambda code, e: errors.__setitem__(code, e),
+        )
+        return join_histories(frames, errors)
+    return PriceStore(root=root, downloader=download)
+
+
+def today() -> str:
+    return pd.Timestamp.today().strftime("%Y-%m-%d")
+
+
+def fetch_financial_metrics(tickers: list[str], cache: FundamentalsCache, scheduler: RequestScheduler,
+                            name_map: dict = None, max_workers: int = fetcher.DEFAULT_MAX_WORKERS,
+                            force_refresh: bool = False, reporter: Reporter = None) -> pd.DataFrame:
+    """Yahoo Financeからデータを取得する(max_workers本まで並列、流量制限とリトライは共通のスケジューラ)
+
+    取得済みで新しい銘柄はディスクのキャッシュから返し、古い・未取得の銘柄だけ取りに行く。
+    """
+    reporter = reporter or Reporter()
+    if force_refresh:
+        infos, missing = {}, list(tickers)
+    else:
+        infos, missing = cache.get_many(tickers)
+
+    if missing:
+        fetched = fetcher.fetch_concurrently(
+            missing, fetch_ticker_info,
+            max_workers=max_workers,
+            scheduler=scheduler,
+            on_progress=reporter.progress,
+            on_error=lambda code, e: reporter.error(f"{code} の取得に失敗: {e}"),
+        )
+        cache.put_many(fetched)
+        infos.update(fetched)
+        reporter.finish()
+
+    results = [build_metrics_row(code, infos[code], name_map) for code in tickers if code in infos]
+    return pd.DataFrame(results)
+
+
+def summarize_performance(df_income: pd.DataFrame) -> pd.DataFrame:
+    """損益計算書から売上高・純利益を取り出し、決算期(古い順)を行にした表にする"""
+    #データがない場合のガード
+    if df_income is None or df_income.empty:
+        return pd.DataFrame()
+
+    #必要項目(売上、純利益)を抽出
+    #※yfinanceのバージョンや銘柄によってキーが微妙に違う場合があるため、存在確認する
+    target_keys = ["Total Revenue", "Net Income"]
+    existing_keys = [k for k in target_keys if k in df_income.index]
+
+    if not existing_keys:
+        return pd.DataFrame()
+
+    #データを抽出して行列を入れ替える(年月を縦軸、項目を横軸)
+    df_result = df_income.loc[existing_keys].T
+
+    #列名を日本語にわかりやすく変更
+    rename_map = {
+        "Total Revenue": "売上高",
+        "Net Income": "純利益"
+    }
+    df_result = df_result.rename(columns=rename_map)
+
+    #日付順(古い順)に並べ替え
+    return df_result.sort_index()
+
+
+def fetch_company_performance(code: str, scheduler: RequestScheduler, reporter: Reporter = None,
+                              prefetcher=None) -> pd.DataFrame:
+    """指定された銘柄の過去業績(売上・純利益)を取得する
+
+    prefetcher(StatementPrefetcher)を渡すと、先読み済みの決算表があればそれを使う。
+    """
+    try:
+        if prefetcher is not None:
+            df_income = prefetcher.get(code)["income"]
+        else:
+            #損益計算書を取得(共通のスケジューラ経由で、429などはリトライされる)
+            df_income = scheduler.call(("income_stmt", code), lambda: fetch_income_statement(code))
+        return summarize_performance(df_income)
+    except Exception as e:
+        (reporter or Reporter()).error(f"業績データの取得に失敗: {e}")
+        return pd.DataFrame()
+
+
+def load_stock_history(ticker: str, period: str, store: PriceStore, memo: LRUMemo = None) -> pd.DataFrame:
+    """足りない日付だけダウンロードしてから、保存庫から指定期間の日足を読む
+
+    memoを渡すと、同じ日・同じ銘柄・同じ期間なら再実行してもメモから返す。
+    """
+    def load():
+        store.update([ticker], period=period)
+        return store.read_period(ticker, period)
+    if memo is None:
+        return load()
+    return memo.get_or_compute("株価", (ticker, period, today()), load)
+
+
+def load_comparison(codes: list[str], period: str, store: PriceStore, memo: LRUMemo = None,
+                    sectors: dict = None, benchmark: str = "^N225") -> dict:
+    """複数銘柄をベンチマーク(日経平均・TOPIX、sectorsを渡せば業種平均も)と比べる
+
+    ベンチマークの終値は保存庫とメモに残るので、銘柄リストが変わっても取り直さない。
+    戻り値は comparison.compare() の結果(ベンチマークの列は "benchmarks" に入れて返す)。
+    """
+    codes = list(dict.fromkeys(codes))
+    start = period_to_start(period)
+
+    def memo_or_call(namespace, key, compute):
+        return compute() if memo is None else memo.get_or_compute(namespace, key, compute)
+
+    def closes_of(group):
+        store.update(list(group), period=period)
+        return store.read_closes(list(group), start=start)
+
+    def load():
+        bench = memo_or_call("比較", (tuple(comparison.BENCHMARKS), period, today()),
+                             lambda: closes_of(comparison.BENCHMARKS))
+        stocks = closes_of(codes)
+        closes = comparison.align_closes(pd.concat([stocks, bench], axis=1))
+        columns = list(bench.columns)
+        if sectors:
+            sector_closes = comparison.sector_indices(closes[list(stocks.columns)], sectors)
+            closes = pd.concat([closes, sector_closes], axis=1)
+            columns += list(sector_closes.columns)
+        if benchmark not in closes.columns:
+            return {}
+        result = comparison.compare(closes, benchmark)
+        result["benchmarks"] = columns
+        return result
+
+    return memo_or_call("比較", (tuple(codes), period, benchmark, tuple(sorted((sectors or {}).items())), today()),
+                        load)
+
+
+def load_closes(codes: list[str], period: str, store: PriceStore) -> pd.DataFrame:
+    """足りない日付だけダウンロードしてから、共通の営業日に揃えた終値を読む(列がコード)"""
+    codes = list(dict.fromkeys(codes))
+    store.update(codes, period=period)
+    return comparison.align_closes(store.read_closes(codes, start=period_to_start(period)))
+
+
+def run_backtest(codes: list[str], period: str, store: PriceStore, signal: str, params: dict = None,
+                 rebalance="M", cost_bps: float = backtest.DEFAULT_COST_BPS, memo: LRUMemo = None) -> dict:
+    """銘柄リストにシグナルを当てはめたバックテストと、同じ銘柄を持ち続けた場合の比較
+
+    戻り値: {"strategy": backtest.run()の結果, "buy_and_hold": 同じ銘柄を等金額で持ち続けた場合}(株価が無ければ空)
+    """
+    def load():
+        return load_closes(codes, period, store)
+    closes = load() if memo is None else memo.get_or_compute("バックテスト", (tuple(codes), period, today()), load)
+    if closes.empty:
+        return {}
+    return {
+        "strategy": backtest.backtest(closes, signal, params, rebalance=rebalance, cost_bps=cost_bps),
+        "buy_and_hold": backtest.backtest(closes, "保有し続ける", rebalance=rebalance, cost_bps=cost_bps),
+    }
+
+
+def build_screening_universe(master: pd.DataFrame, cache: FundamentalsCache, store: PriceStore) -> pd.DataFrame:
+    """全銘柄スクリーニング用の表を作る(指標キャッシュと株価保存庫にある分だけを使う)"""
+    if master.empty:
+        return pd.DataFrame()
+    codes = master["コード"].tolist()
+    infos = cache.peek_many(codes)
+    closes = store.read_closes(codes, start=period_to_start("6mo"))
+    return screener.build_universe(master, infos, closes)
+
+
+def refresh_sector_stats(master: pd.DataFrame, cache: FundamentalsCache, stats: SectorStatsStore) -> dict:
+    """指標キャッシュの全銘柄から業種別・市場別の集計表と業種内の順位を作り直して保存する(指標の更新後に呼ぶ)"""
+    if master.empty:
+        return {}
+    universe = screener.build_universe(master, cache.peek_many(master["コード"].tolist()))
+    tables = sector_stats.build(universe)
+    stats.save(tables, universe_size=len(universe))
+    return tables
+
+
+def load_master(file_path: str, reporter: Reporter = None) -> pd.DataFrame:
+    """JPXのExcelファイルを読み込む(失敗したら空の表)"""
+    try:
+        return jpx_master.load_master(file_path)
+    except Exception as e:
+        (reporter or Reporter()).error(f"マスターファイルの読み込みに失敗: {e}")
+        return pd.DataFrame()
@@ -1,423 +1,272 @@
 import streamlit as st
 import pandas as pd
-import yfinance as yf
-import matplotlib.pyplot as plt
-import japanize_matplotlib
-import plotly.graph_objects as go
-import matplotlib.ticker as ticker
-import os
+import uuid
+import charts
+import comparison
+import export
+import fetcher
+import indicators
+import jpx_master
+import stock_core
+from fundamentals_cache import FundamentalsCache
+from memo import LRUMemo
+from prefetch import StatementPrefetcher
+from price_store import PriceStore
+from scheduler import RequestScheduler
+from sector_stats import SectorStatsStore
+from statements import StatementWarehouse
+from stock_core import normalize_tickers, build_metrics_row, fetch_ticker_info
 
 # ==========================================
-#  裏方の処理をまとめたファイル (Utils)
+#  画面(Streamlit)とデータ処理をつなぐファイル (Utils)
+#  ※取得・計算の本体は stock_core.py、グラフは charts.py にあります
+#    ここではキャッシュの使い回しと、進み具合・エラーの画面表示だけを行います
 # ==========================================
 
-def normalize_tickers(text_input: str) -> list[str]:
-    """手入力されたテキストを整形して銘柄コードリストにする"""
-    tickers = []
-    lines = text_input.split('\n')
-    for line in lines:
-        # 全角数字→半角変換
-        code = line.strip().translate(str.maketrans({chr(0xFF10 + i): str(i) for i in range(10)}))
-        if not code:
-            continue
-        if code.isalnum() and len(code) == 4:
-            code = f"{code}.T"
-        tickers.append(code)
-    return list(set(tickers))
+class StreamlitReporter(stock_core.Reporter):
+    """進み具合をプログレスバーに、エラー・警告を画面に出す"""
+
+    def __init__(self):
+        self._progress_bar = None
+        self._status_text = None
+
+    def progress(self, done, total, label):
+        if self._progress_bar is None:
+            self._progress_bar = st.progress(0)
+            self._status_text = st.empty()
+        self._status_text.text(f"取得中: {label} ... ({done}/{total})")
+        self._progress_bar.progress(done / total)
+
+    def error(self, message):
+        st.error(message)
+
+    def warning(self, message):
+        st.warning(message)
+
+    def finish(self):
+        if self._progress_bar is not None:
+            self._status_text.empty()
+            self._progress_bar.empty()
+            self._progress_bar = self._status_text = None
 
 @st.cache_data
 def load_jpx_data(file_path: str) -> pd.DataFrame:
-    """JPXのExcelファイルを読み込む"""
-    if not os.path.exists(file_path):
-        return pd.DataFrame()
-
-    try:
-        df = pd.read_excel(file_path)
-        target_columns = ["コード", "銘柄名", "33業種区分", "市場・商品区分"]
-        use_cols = [c for c in target_columns if c in df.columns]
-        df = df[use_cols]
-
-        def format_code(x):
-            s = str(x).strip()
-            if len(s) == 4:
-                return f"{s.upper()}.T"
-            return s
-        df["コード"] = df["コード"].apply(format_code)
-        
-        if "市場・商品区分" in df.columns:
-            target_markets = ["プライム（内国株式）", "スタンダード（内国株式）", "グロース（内国株式）"]
-            df = df[df["市場・商品区分"].isin(target_markets)]
-        return df
-    except Exception as e:
-        st.error(f"マスターファイルの読み込みに失敗: {e}")
-        return pd.DataFrame()
+    """JPXのExcelファイルを読み込む(2回目以降は変換済みのParquetから読む)"""
+    return stock_core.load_master(file_path, reporter=StreamlitReporter())
+
+@st.cache_resource
+def load_jpx_index(file_path: str) -> jpx_master.JPXIndex:
+    """業種・市場ごとの索引つきで銘柄マスターを読み込む(サーバー起動中は1つを使い回す)"""
+    return jpx_master.JPXIndex(load_jpx_data(file_path))
+
+@st.cache_resource
+def get_scheduler() -> RequestScheduler:
+    """Yahoo Financeへのリクエストの流量制限・リトライ(サーバー全体で1つを共有する)"""
+    return stock_core.make_scheduler()
+
+@st.cache_resource
+def get_fundamentals_cache() -> FundamentalsCache:
+    """指標データの永続キャッシュ(サーバー起動中は1つを使い回す)"""
+    return FundamentalsCache()
+
+@st.cache_resource
+def get_price_store() -> PriceStore:
+    """株価の保存庫(サーバー起動中は1つを使い回す)"""
+    return stock_core.make_price_store(get_scheduler())
+
+@st.cache_resource
+def get_memo() -> LRUMemo:
+    """株価・指標・グラフのメモ(サーバー起動中は1つを使い回す)"""
+    return LRUMemo()
+
+@st.cache_resource
+def get_statement_warehouse() -> StatementWarehouse:
+    """全銘柄の決算データの保存庫(サーバー起動中は1つを使い回す)"""
+    return StatementWarehouse()
+
+@st.cache_resource
+def get_prefetcher() -> StatementPrefetcher:
+    """決算表の先読み係(サーバー全体で1つを共有する)"""
+    return StatementPrefetcher(get_statement_warehouse(), get_scheduler())
+
+@st.cache_resource
+def get_sector_stats() -> SectorStatsStore:
+    """業種・市場ごとの集計表の保存先"""
+    return SectorStatsStore()
+
+def refresh_sector_stats(file_path: str) -> None:
+    """指標の更新後に、業種・市場ごとの集計表を作り直す"""
+    stock_core.refresh_sector_stats(load_jpx_data(file_path), get_fundamentals_cache(), get_sector_stats())
+    load_sector_table.clear()
 
 @st.cache_data
-def fetch_financial_metrics(tickers: list[str], name_map: dict = None) -> pd.DataFrame:
-    """Yahoo Financeからデータを取得する"""
-    results = []
-    progress_bar = st.progress(0)
-    status_text = st.empty()
-
-    for i, code in enumerate(tickers):
-        status_text.text(f"取得中: {code} ... ")
-        try:
-            ticker_info = yf.Ticker(code)
-            info = ticker_info.info
-
-            # 社名解決ロジック
-            company_name = None
-            if name_map and code in name_map:
-                company_name = name_map[code]
-            if company_name is None:
-                company_name = info.get("shortName")
-            if company_name is None:
-                company_name = info.get("longName")
-            if company_name is None:
-                company_name = "不明"
-
-            data = {
-                "コード": code,
-                "会社名": company_name,
-                "現在値": info.get("currentPrice", 0),
-                "PER(予)": info.get("forwardPE", None),
-                "PBR": info.get("priceToBook", None),
-                "ROE": info.get("returnOnEquity", None),
-                "配当利回り": info.get("dividendYield", 0),
-                "時価総額": info.get("marketCap", 0)
-            }
-            results.append(data)
-        except Exception as e:
-            st.error(f"{code} の取得に失敗: {e}")
-        
-        progress_bar.progress((i + 1) / len(tickers))
-    
-    status_text.empty()
-    progress_bar.empty()
-    return pd.DataFrame(results)
+def load_sector_table(name: str) -> pd.DataFrame:
+    """保存済みの集計表("sector": 業種別, "market": 市場別)"""
+    return get_sector_stats().load(name)
+
+def show_sector_position(code: str):
+    """選んだ銘柄が業種の中でどのあたりか(保存済みの集計表から表示するだけ)"""
+    position = get_sector_stats().position(code)
+    if position.empty:
+        st.caption("業種内の位置: 集計表がまだありません(全銘柄の指標を更新すると作られます)")
+        return
+    st.write(f"業種内の位置({position.index.name})")
+    st.dataframe(position.style.format(precision=2))
+    st.caption("業種内の位置: 業種の中で下から何%か(PER・PBRは低いほど割安、ROE・配当利回りは高いほど良い)")
+
+def visualize_sector_table(name: str = "sector"):
+    """業種別(または市場別)の中央値の一覧(行がグループ、列が指標)"""
+    table = load_sector_table(name)
+    if table.empty:
+        st.info("集計表がまだありません。全銘柄スクリーニングの「データ更新」で指標を更新すると作られます。")
+        return
+    group_column = table.columns[0]
+    medians = table.pivot(index=group_column, columns="指標", values="中央値")
+    medians["銘柄数"] = table.groupby(group_column)["銘柄数"].max()
+    st.dataframe(medians.style.format(precision=2))
+    st.caption("各指標の中央値(PER・PBRは赤字・債務超過の銘柄を除く)")
+
+def prefetch_statements(codes: list[str]) -> dict:
+    """絞り込み結果の決算表を裏で先読みする(絞り込みが変わったら、このセッションの前回分の残りだけ取り消す)"""
+    #先読み係はサーバー全体で共有なので、ほかのセッションの先読みを取り消さないようにセッションごとに区別する
+    owner = st.session_state.setdefault("prefetch_owner", uuid.uuid4().hex)
+    prefetcher = get_prefetcher()
+    prefetcher.start(codes, owner=owner)
+    return prefetcher.status(owner=owner)
+
+def fetch_financial_metrics(tickers: list[str], name_map: dict = None,
+                            max_workers: int = fetcher.DEFAULT_MAX_WORKERS,
+                            force_refresh: bool = False) -> pd.DataFrame:
+    """Yahoo Financeからデータを取得する(進み具合はプログレスバーに表示)"""
+    return stock_core.fetch_financial_metrics(
+        tickers, get_fundamentals_cache(), get_scheduler(), name_map=name_map,
+        max_workers=max_workers, force_refresh=force_refresh, reporter=StreamlitReporter())
+
+@st.cache_data(ttl=3600)
+def load_screening_universe(file_path: str) -> pd.DataFrame:
+    """全銘柄スクリーニング用の表を作る(指標キャッシュと株価保存庫にある分だけを使う)"""
+    return stock_core.build_screening_universe(load_jpx_data(file_path), get_fundamentals_cache(), get_price_store())
 
-def visualize_scatter(df):
-    """PER/PBR散布図を描画する"""
-    df_plot = df[
-        (df["PER(予)"] < 50) & (df["PER(予)"] > 0) &
-        (df["PBR"] < 5) & (df["PBR"] > 0)
-    ].copy()
+def fetch_company_performance(code: str) -> pd.DataFrame:
+    #指定された銘柄の過去業績(売上・純利益)を取得する関数
+    return stock_core.fetch_company_performance(code, get_scheduler(), reporter=StreamlitReporter(),
+                                                prefetcher=get_prefetcher())
 
-    if df_plot.empty:
+def visualize_scatter(df):
+    """PER/PBR散布図を描画する(銘柄が多いときはWebGLで描き、時価総額の大きい銘柄だけ名前を付ける)"""
+    if len(charts.scatter_points(df)) > charts.LARGE_SCATTER_POINTS:
+        fig = charts.per_pbr_scatter_gl(df)
+        st.plotly_chart(fig, use_container_width=True)
+        st.info(f"ヒント: グラフの「左下」にある銘柄ほど、割安と判断されます"
+                f"(名前は時価総額の上位{charts.SCATTER_LABELS}銘柄のみ。点にマウスを乗せると表示されます)")
+        return
+    fig = charts.per_pbr_scatter(df)
+    if fig is None:
         st.warning("グラフ表示に適した範囲(PER<50, PBR<5)のデータがありませんでした。")
         return
-    
-    fig, ax = plt.subplots(figsize=(10, 6))
-    ax.scatter(df_plot["PER(予)"], df_plot["PBR"], color="royalblue", alpha=0.6)
-
-    per_mean = df_plot["PER(予)"].mean()
-    pbr_mean = df_plot["PBR"].mean()
-    if pd.notna(per_mean):
-        ax.axvline(per_mean, color="red", linestyle="--", alpha=0.5, label=f"平均PER: {per_mean:.1f}倍")
-    if pd.notna(pbr_mean):
-        ax.axhline(pbr_mean, color="red", linestyle="--", alpha=0.5, label=f"平均PBR: {pbr_mean:.1f}倍")
-
-    for idx, row in df_plot.iterrows():
-        ax.text(row["PER(予)"], row["PBR"], row["会社名"][:6], fontsize=8, alpha=0.7)
-    
-    ax.set_title("割安性分析(PER vs PBR)", fontsize=16)
-    ax.set_xlabel("PER(倍) - 収益性", fontsize=12)
-    ax.set_ylabel("PBR(倍) - 資産性", fontsize=12)
-    ax.legend()
-    ax.grid(True, linestyle=":", alpha=0.6)
-
     st.pyplot(fig)
     st.info("ヒント: グラフの「左下」にある銘柄ほど、割安と判断されます")
 
 def visualize_bar_chart(df):
-    """時価総額の棒グラフを描画する（新しく切り出しました）"""
-    fig, ax = plt.subplots(figsize=(10, 5))
-    ax.bar(df["会社名"], df["時価総額"], color="skyblue")
-    ax.set_ylabel("時価総額")
-    def trillion_formatter(x, pos):
-        return f'{x / 1_000_000_000_000:.1f}兆円'
-    ax.yaxis.set_major_formatter(ticker.FuncFormatter(trillion_formatter))
-    ax.grid(axis='y', linestyle='--', alpha=0.7)
-    st.pyplot(fig)
-
-def fetch_company_performance(code: str) -> pd.DataFrame:
-    #指定された銘柄の過去業績(売上・純利益)を取得する関数
-    try:
-        ticker = yf.Ticker(code)
-        #損益計算書を取得
-        df_income = ticker.income_stmt
-
-        #データがない場合のガード
-        if df_income.empty:
-            return pd.DataFrame()
-        
-        #必要項目(売上、純利益)を抽出
-        #※yfinanceのバージョンや銘柄によってキーが微妙に違う場合があるため、存在確認する
-        target_keys = ["Total Revenue", "Net Income"]
-        existing_keys = [k for k in target_keys if k in df_income.index]
-
-        if not existing_keys:
-            return pd.DataFrame()
-        
-        #データを抽出して行列を入れ替える(年月を縦軸、項目を横軸)
-        df_result = df_income.loc[existing_keys].T
-
-        #列名を日本語にわかりやすく変更
-        rename_map = {
-            "Total Revenue": "売上高",
-            "Net Income": "純利益"
-        }
-        df_result = df_result.rename(columns=rename_map)
-
-        #日付順(古い順)に並べ替え
-        df_result = df_result.sort_index()
-
-        return df_result
-    except Exception as e:
-        st.error(f"業績データの取得に失敗: {e}")
-        return pd.DataFrame
+    """時価総額の棒グラフを描画する"""
+    st.pyplot(charts.market_cap_bar(df))
 
 def visualize_performance(df_performance, company_name):
     #売上高(棒グラフ)と純利益(折れ線グラフ)の複合グラフを描く
-    if df_performance.empty:
+    fig = charts.performance_chart(df_performance, company_name)
+    if fig is None:
         st.warning("表示できる業績データがありませんでした")
         return
-    
-    #グラフの準備
-    fig, ax1 = plt.subplots(figsize=(10, 5))
-
-    #x軸(年度)のラベル作成(日付型から年だけ取り出す)
-    years = [d.strftime('%Y年') for d in df_performance.index]
-
-    #1.売上高の棒グラフ(左軸ax1)
-    ax1.bar(years, df_performance["売上高"], color="skyblue", alpha=0.6, label="売上高")
-    ax1.set_ylabel("売上高(円)")
-
-    #2.純利益の折れ線グラフ(右軸ax2)
-    #ax1と同じx軸を共有する「双子」の軸を作る
-    ax2 = ax1.twinx()
-    ax2.plot(years, df_performance["純利益"], color="orange", marker="o", linewidth=2, label="純利益")
-    ax2.set_ylabel("純利益(円)")
-
-    #3.数値のフォーマット(兆円単位で見やすく)
-    def trillion_formatter(x, pos):
-        if abs(x) >= 1_000_000_000_000:
-            return f'{x / 1_000_000_000_000:.1f}兆'
-        else:
-            return f'{x / 1_000_000_000:.0f}億'
-    
-    ax1.yaxis.set_major_formatter(ticker.FuncFormatter(trillion_formatter))
-    ax2.yaxis.set_major_formatter(ticker.FuncFormatter(trillion_formatter))
-
-    #タイトルと凡例
-    ax1.set_title(f"{company_name}の業績推移(直近4年)", fontsize=16)
-
-    #凡例をまとめて表示するテクニック
-    lines1, labels1 = ax1.get_legend_handles_labels()
-    lines2, labels2 = ax2.get_legend_handles_labels()
-    ax1.legend(lines1 + lines2, labels1 + labels2, loc="upper left")
-
-    ax1.grid(axis='y', linestyle='--', alpha=0.5)
-
     st.pyplot(fig)
 
-# 1. 過去の株価データを取得する関数
+def visualize_comparison(df, period='1y'):
+    """絞り込んだ銘柄をまとめて日経平均・TOPIX(と業種平均)と比べる(銘柄数が多くても線は1本にまとめる)"""
+    codes = df["コード"].tolist()
+    names = dict(zip(df["コード"], df["会社名"]))
+    names.update(comparison.BENCHMARKS)
+    #全銘柄スクリーニングの表には業種があるので、業種平均も並べる
+    sectors = dict(zip(df["コード"], df["33業種区分"].astype(str))) if "33業種区分" in df.columns else None
+    result = stock_core.load_comparison(codes, period, get_price_store(), memo=get_memo(), sectors=sectors)
+    if not result:
+        st.warning("日経平均の株価データが取得できませんでした")
+        return
+    st.plotly_chart(charts.plot_relative_performance(result["normalized"], names, result["benchmarks"]),
+                    use_container_width=True)
+    summary = result["summary"].drop(index=result["benchmarks"], errors="ignore")
+    summary.insert(0, "会社名", summary.index.map(names))
+    st.dataframe(summary.sort_values("騰落率(%)", ascending=False).style.format(precision=2))
+    st.info("ベータ: 日経平均が1%動いたときに何%動くか / 相関: 日経平均と同じ向きに動く度合い(1に近いほど連動)")
+
+def visualize_backtest(codes, period, signal, params, rebalance, cost_bps):
+    """絞り込んだ銘柄でシグナルのバックテストをして、資産の推移と成績を表示する"""
+    result = stock_core.run_backtest(codes, period, get_price_store(), signal, params,
+                                     rebalance=rebalance, cost_bps=cost_bps, memo=get_memo())
+    if not result:
+        st.warning("株価データが取得できませんでした")
+        return
+    curves = {signal: result["strategy"]["equity"], "保有し続ける(等金額)": result["buy_and_hold"]["equity"]}
+    st.plotly_chart(charts.plot_equity_curves(curves, title=f"{signal}の資産推移({len(codes)}銘柄)"),
+                    use_container_width=True)
+    stats = pd.DataFrame({name: result[key]["stats"] for name, key in
+                          zip(curves, ["strategy", "buy_and_hold"])}).T
+    st.dataframe(stats.style.format(precision=2))
+    st.caption("指標(PER・配当利回りなど)は今の値で銘柄を選んでいるので、過去の時点で選べたとは限りません")
+
+EXPORT_MIME = {
+    "csv": "text/csv",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "parquet": "application/octet-stream",
+}
+
+def export_bytes(df, fmt):
+    """ダウンロード用のファイルの中身を作る関数を返す(ボタンが押されたときにだけ書き出す)"""
+    return lambda: export.to_bytes(df, fmt)
+
+# 過去の株価データを取得する関数
 def fetch_stock_history(ticker, period=None):
 
     #もし期間が指定されていなければ(=1回目の呼び出し)、サイドバーを表示してユーザーに選ばせる
     if period is None:
-        select_period = st.sidebar.selectbox('期間を選択してください', ['1年', '6ヶ月', '3ヶ月', '1ヶ月'])
-        #期間のデフォルト設定
-        period = '1y'
-
-        if select_period == '1年':
-            period = '1y'
-        elif select_period == '6ヶ月':
-            period = '6mo'
-        elif select_period == '3ヶ月':
-            period = '3mo'
-        elif select_period == '1ヶ月':
-            period = '1mo'
+        select_period = st.sidebar.selectbox('期間を選択してください', list(stock_core.PERIOD_CHOICES))
+        period = stock_core.PERIOD_CHOICES.get(select_period, '1y')
         #選ばれた期間を「記憶」しておく
         st.session_state['selected_period_code'] = period
-    else:
-        #期間指定されていれば、その期間を使う
-        pass
-
-    # 期間を1年分、日足データを取得
-    df_history = yf.download(ticker, period=period, interval="1d", progress=False)
-    # 列名の整理（MultiIndex対策）
-    if isinstance(df_history.columns, pd.MultiIndex):
-        df_history.columns = df_history.columns.droplevel(1)
-    return df_history
-
-# 2. Plotlyでグラフを描く関数
-def plot_stock_plotly(df_history, company_name, short_span, long_span, show_bollinger):
-    #日線を算定
-    df_history['SMAshort'] = df_history['Close'].rolling(window=short_span).mean()
-    df_history['SMAlong'] = df_history['Close'].rolling(window=long_span).mean()
-    
-    #標準偏差を計算
-    df_history['std'] = df_history['Close'].rolling(window=short_span).std()
-
-    #バンドの計算
-    df_history['upper'] = df_history['SMAshort'] + (2 * df_history['std'])
-    df_history['lower'] = df_history['SMAshort'] - (2 * df_history['std'])
-
-    fig = go.Figure()
-
-    # 終値のローソク足を追加
-    fig.add_trace(go.Candlestick(
-        x=df_history.index,
-        open=df_history['Open'],
-        high=df_history['High'],
-        low=df_history['Low'],
-        close=df_history['Close'],
-    ))
-
-    #短日線(オレンジ色)
-    fig.add_trace(go.Scatter(
-        x=df_history.index,
-        y=df_history['SMAshort'],
-        mode='lines',
-        name=f'{short_span}日移動平均',
-        line=dict(color='orange', width=1)
-    ))
-
-    #長日線(青色)
-    fig.add_trace(go.Scatter(
-        x=df_history.index,
-        y=df_history['SMAlong'],
-        mode='lines',
-        name=f'{long_span}日移動平均',
-        line=dict(color='royalblue', width=1)
-    ))
-
-    if show_bollinger:
-        #ボリンジャーバンド(upper)
-        fig.add_trace(go.Scatter(
-            x=df_history.index,
-            y=df_history['upper'],
-            mode='lines',
-            name='ボリンジャーバンド(upper+2σ)',
-            line=dict(color='gray', width=1, dash='dash')
-        ))
-
-        #ボリンジャーバンド(lower)
-        fig.add_trace(go.Scatter(
-            x=df_history.index,
-            y=df_history['lower'],
-            mode='lines',
-            name='ボリンジャーバンド(lower-2σ)',
-            line=dict(color='gray', width=1, dash='dash')
-        ))
-
-    # レイアウト設定
-    fig.update_layout(
-        title=f"{company_name} の株価推移",
-        xaxis_title="日付",
-        yaxis_title="株価 (円)",
-        height=500, # グラフの高さ
-        template="plotly_white",
-        xaxis_rangeslider_visible=False #スライダー非表示
-    )
-    return fig
-
-# 3. Plotlyでグラフを描く関数_出来高の棒グラフ
-def plot_volume_plotly(df_history, company_name):  
-    fig = go.Figure()
-
-    # 出来高の棒グラフを追加
-    fig.add_trace(go.Bar(
-        x=df_history.index,
-        y=df_history['Volume'],
-        marker_color="royalblue",
-        opacity=0.6,
-        name="出来高"
-        ))
-
-    # レイアウト設定
-    fig.update_layout(
-        title=f"{company_name} の出来高",
-        xaxis_title="日付",
-        yaxis_title="出来高 (円)",
-        height=300, # グラフの高さ
-        template="plotly_white"
-    )
-    return fig
-
-# 4. Plotlyでグラフを描く関数_RSIの折れ線グラフ
-def plot_RSI_plotly(df_history, company_name):  
-    #業界スタンダードの14日平均を設定
-    rsi_period = 14
-
-    #RSI計算
-    delta = df_history['Close'].diff()
-    gain = delta.where(delta > 0, 0)
-    loss = -delta.where(delta < 0, 0)
-    #単純平均(SMA)を使ったRSI計算
-    avg_gain = gain.rolling(window=rsi_period).mean()
-    avg_loss = loss.rolling(window=rsi_period).mean()
-    rs = avg_gain / avg_loss
-    df_history['RSI'] = 100 - (100 / (1 + rs))
-
-    fig = go.Figure()
-
-    # RSIの棒グラフを追加
-    fig.add_trace(go.Scatter(
-        x=df_history.index,
-        y=df_history['RSI'],
-        mode='lines',
-        name="RSI(14日)",
-        line=dict(color='purple', width=1.5)
-        ))
-    #基準線
-    fig.add_hline(y=30, line_dash="dash", line_color="gray", annotation_text="売られすぎ(30)")
-    fig.add_hline(y=70, line_dash="dash", line_color="gray", annotation_text="買われすぎ(70)")
-
-    # レイアウト設定
-    fig.update_layout(
-        title=f"{company_name} のRSI",
-        xaxis_title="日付",
-        yaxis_title="RSI(%)",
-        height=300, 
-        yaxis=dict(range=[0, 100]),
-        template="plotly_white"
-    )
-    return fig
-
-#5.日経平均との比較
-def plot_comparison_plotly(df_stock, df_benchmark, company_name):
-    # 例: 最初の日の終値(iloc[0])で、列全体を割る、100倍して％表示に対応
-    df_stock['Normalized'] = (df_stock['Close'] / df_stock['Close'].iloc[0] - 1) * 100
-    df_benchmark['Normalized'] = (df_benchmark['Close'] / df_benchmark['Close'].iloc[0] - 1) * 100
-
-    fig = go.Figure()
-
-    #銘柄の株価変化率
-    fig.add_trace(go.Scatter(
-        x=df_stock.index,
-        y=df_stock['Normalized'],
-        mode='lines',
-        name=f'{company_name}の株価変化率',
-        line=dict(color='red', width=1)
-    ))
-
-    #日経平均の変化率
-    fig.add_trace(go.Scatter(
-        x=df_benchmark.index,
-        y=df_benchmark['Normalized'],
-        mode='lines',
-        name='日経平均の株価変化率',
-        line=dict(color='gray', width=1)
-    ))
-
-    # レイアウト設定
-    fig.update_layout(
-        title=f"{company_name} と日経平均の変化率比較",
-        xaxis_title="日付",
-        yaxis_title="変化率(%)",
-        height=300, 
-        template="plotly_white"
-    )
-    return fig
\ No newline at end of file
+
+    return stock_core.load_stock_history(ticker, period, get_price_store(), memo=get_memo())
+
+#株価チャート一式をまとめて作る(変わった部分だけ作り直す)
+def build_price_charts(code, company_name, period, short_span, long_span, show_bollinger) -> dict:
+    """株価・出来高・RSI・日経平均比較の図を返す
+
+    株価・指標・図はそれぞれ入力(銘柄, 期間, 周期, 表示設定)をキーにメモしておくので、
+    例えばボリンジャーバンドの表示だけを切り替えたときは株価の図だけを組み立て直す。
+    """
+    memo = get_memo()
+    base = (code, period, stock_core.today())
+    df_history = fetch_stock_history(code, period)
+    close = df_history['Close'].to_numpy(dtype=float)
+
+    def price_lines():
+        sma_short, upper, lower = memo.get_or_compute(
+            "指標", base + ("bollinger", short_span), lambda: indicators.bollinger(close, short_span, 2))
+        sma_long = memo.get_or_compute("指標", base + ("sma", long_span), lambda: indicators.sma(close, long_span))
+        return sma_short, sma_long, upper, lower
+
+    figures = {
+        "price": memo.get_or_compute(
+            "グラフ", base + ("price", company_name, short_span, long_span, show_bollinger),
+            lambda: charts.plot_stock_plotly(df_history, company_name, short_span, long_span, show_bollinger,
+                                             lines=price_lines())),
+        "volume": memo.get_or_compute(
+            "グラフ", base + ("volume", company_name), lambda: charts.plot_volume_plotly(df_history, company_name)),
+        "rsi": memo.get_or_compute(
+            "グラフ", base + ("rsi", company_name), lambda: charts.plot_RSI_plotly(df_history, company_name)),
+        "comparison": None,
+    }
+
+    df_benchmark = fetch_stock_history('^N225', period=period)
+    if not df_benchmark.empty:
+        figures["comparison"] = memo.get_or_compute(
+            "グラフ", base + ("comparison", company_name),
+            lambda: charts.plot_comparison_plotly(df_history, df_benchmark, company_name))
+    return figures
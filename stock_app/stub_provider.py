@@ -0,0 +1,65 @@
+import random
+import threading
+import time
+
+# ==========================================
+#  ベンチマーク・動作確認用のダミー取得先
+#  (Yahoo Financeにアクセスせずに、遅延つきの偽データを返す)
+# ==========================================
+
+
+class RateLimitError(Exception):
+    """HTTP 429(アクセス過多)を真似た例外"""
+    status_code = 429
+
+
+class StubProvider:
+    """yf.Ticker(code).info の代わりに使う、ネットワーク遅延を再現したスタブ
+
+    rate_limit_ratio: その割合のリクエストで RateLimitError(429) を投げる
+    """
+
+    def __init__(self, latency: float = 0.05, jitter: float = 0.0, fail_codes=(), seed: int = 0,
+                 rate_limit_ratio: float = 0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.fail_codes = set(fail_codes)
+        self.rate_limit_ratio = rate_limit_ratio
+        self.calls = 0
+        self.rate_limited = 0
+        self.calls_by_code = {}
+        self._lock = threading.Lock()
+        self._random = random.Random(seed)
+
+    def _sleep(self, code: str):
+        with self._lock:
+            self.calls += 1
+            self.calls_by_code[code] = self.calls_by_code.get(code, 0) + 1
+            extra = self._random.uniform(0, self.jitter) if self.jitter else 0.0
+            throttled = self._random.random() < self.rate_limit_ratio
+            if throttled:
+                self.rate_limited += 1
+        time.sleep(self.latency + extra)
+        if throttled:
+            raise RateLimitError(f"stub: 429 Too Many Requests ({code})")
+
+    def info(self, code: str) -> dict:
+        self._sleep(code)
+        if code in self.fail_codes:
+            raise RuntimeError(f"stub: {code} not found")
+        #コードから決まる値を返す(何度呼んでも同じ結果)
+        seed = sum(ord(c) for c in code)
+        return {
+            "shortName": f"STUB {code}",
+            "currentPrice": 1000 + seed % 500,
+            "forwardPE": 5 + seed % 30,
+            "priceToBook": 0.5 + (seed % 40) / 10,
+            "returnOnEquity": (seed % 20) / 100,
+            "dividendYield": (seed % 50) / 10,
+            "marketCap": (seed % 100) * 10_000_000_000,
+        }
+
+
+def make_codes(n: int) -> list[str]:
+    """ダミーの銘柄コードをn個作る"""
+    return [f"{1000 + i}.T" for i in range(n)]
@@ -0,0 +1,166 @@
+import argparse
+import itertools
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context, shared_memory
+
+import numpy as np
+import pandas as pd
+
+import backtest
+
+# ==========================================
+#  パラメータの総当たり (Sweep)
+#  移動平均の周期・ボリンジャーバンドの幅・RSIの期間としきい値などの組み合わせを、
+#  全銘柄のバックテストで一通り試して成績順に並べる
+#  ・終値の配列は共有メモリに1つだけ置き、各プロセスはそれを参照する(プロセスごとにコピーしない)
+#  ・1つの組み合わせ = 1つの仕事として、空いたプロセスから順に取っていく
+#  ※Streamlitに依存しません
+#
+#  使い方: python sweep.py --period 5y --workers 4
+#          python sweep.py --synthetic 4000 --years 10   # ネット接続不要の乱数データで試す
+# ==========================================
+
+#売買ルール -> {パラメータ名: 試す値}
+DEFAULT_GRID = {
+    "移動平均クロス": {"short_span": [5, 10, 20], "long_span": [25, 50, 75, 100, 200]},
+    "ボリンジャーバンド逆張り": {"window": [10, 20, 30], "k": [1.5, 2.0, 2.5, 3.0]},
+    "RSI逆張り": {"period": [9, 14, 21], "lower": [20, 25, 30, 35], "upper": [65, 70, 75, 80]},
+}
+RANK_BY = "シャープレシオ"
+
+
+def expand_grid(grid: dict) -> list[tuple[str, dict]]:
+    """{売買ルール: {パラメータ: 値のリスト}}を(売買ルール, パラメータ)の組み合わせの一覧にする"""
+    combos = []
+    for signal, space in grid.items():
+        names = list(space)
+        for values in itertools.product(*(space[name] for name in names)):
+            params = dict(zip(names, values))
+            #短期線が長期線以上、買いのしきい値が売り以上の組み合わせは意味がないので除く
+            if params.get("short_span", 0) >= params.get("long_span", np.inf):
+                continue
+            if params.get("lower", 0) >= params.get("upper", np.inf):
+                continue
+            combos.append((signal, params))
+    return combos
+
+
+# --- 各プロセス側 ---
+_shared = {}
+
+
+def _attach(name: str, shape: tuple, index: pd.DatetimeIndex, columns: list, rebalance, cost_bps: float) -> None:
+    """プロセスの起動時に1回だけ、共有メモリの終値を(コピーせずに)表として参照できるようにする"""
+    memory = shared_memory.SharedMemory(name=name)
+    values = np.ndarray(shape, dtype=np.float64, buffer=memory.buf)
+    values.flags.writeable = False
+    _shared.update({
+        "memory": memory,
+        "closes": pd.DataFrame(values, index=index, columns=columns, copy=False),
+        "rebalance": rebalance,
+        "cost_bps": cost_bps,
+    })
+
+
+def _evaluate(signal: str, params: dict) -> dict:
+    start = time.perf_counter()
+    result = backtest.backtest(_shared["closes"], signal, params,
+                               rebalance=_shared["rebalance"], cost_bps=_shared["cost_bps"])
+    return {
+        "売買ルール": signal,
+        "パラメータ": ", ".join(f"{k}={v}" for k, v in params.items()),
+        **result["stats"],
+        "pid": os.getpid(),
+        "seconds": time.perf_counter() - start,
+    }
+
+
+# --- 呼び出し側 ---
+def run_sweep(closes: pd.DataFrame, grid: dict = None, workers: int = None, rebalance="M",
+              cost_bps: float = backtest.DEFAULT_COST_BPS) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """全組み合わせを並列に試して(成績順の表, プロセスごとの処理量)を返す"""
+    combos = expand_grid(grid or DEFAULT_GRID)
+    workers = workers or os.cpu_count() or 1
+    values = np.ascontiguousarray(closes.to_numpy(dtype=np.float64))
+
+    memory = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+    try:
+        np.ndarray(values.shape, dtype=np.float64, buffer=memory.buf)[:] = values
+        del values
+        #Windowsと同じ動きになるよう spawn で起動する(親プロセスのメモリを引き継がない)
+        with ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn"), initializer=_attach,
+                                 initargs=(memory.name, closes.shape, closes.index, list(closes.columns),
+                                           rebalance, cost_bps)) as pool:
+            rows = list(pool.map(_evaluate, *zip(*combos))) if combos else []
+    finally:
+        memory.close()
+        memory.unlink()
+
+    results = pd.DataFrame(rows)
+    if results.empty:
+        return results, pd.DataFrame()
+    throughput = results.groupby("pid").agg(組み合わせ数=("seconds", "size"), 計算秒=("seconds", "sum"))
+    throughput["組み合わせ/秒"] = throughput["組み合わせ数"] / throughput["計算秒"]
+    ranked = results.drop(columns=["pid", "seconds"]).sort_values(RANK_BY, ascending=False, ignore_index=True)
+    ranked.index += 1
+    return ranked, throughput.reset_index(drop=True)
+
+
+def synthetic_closes(n_tickers: int, years: int, seed: int = 0) -> pd.DataFrame:
+    """動作確認・計測用の乱数の終値"""
+    rng = np.random.default_rng(seed)
+    days = backtest.TRADING_DAYS * years
+    index = pd.bdate_range(end="2025-12-31", periods=days)
+    values = 100 * np.exp(np.cumsum(rng.normal(0.0002, 0.02, (days, n_tickers)), axis=0))
+    return pd.DataFrame(values, index=index, columns=[f"{1000 + i}.T" for i in range(n_tickers)])
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="売買ルールのパラメータを総当たりで試して成績順に並べる")
+    parser.add_argument("--jpx", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "data_j.xls"),
+                        help="JPXの銘柄マスター(data_j.xls)")
+    parser.add_argument("--period", default="5y", help="検証期間(1y, 2y, 5y, 10y)")
+    parser.add_argument("--limit", type=int, default=None, help="先頭から何銘柄だけ使うか")
+    parser.add_argument("--synthetic", type=int, default=None, help="株価の代わりに乱数データを何銘柄分使うか")
+    parser.add_argument("--years", type=int, default=10, help="乱数データの年数")
+    parser.add_argument("--workers", type=int, default=None, help="プロセス数(省略時はCPUの数)")
+    parser.add_argument("--rebalance", default="M", help="リバランス周期(D, W, M, Q)")
+    parser.add_argument("--cost", type=float, default=backtest.DEFAULT_COST_BPS, help="片道の売買コスト(bp)")
+    parser.add_argument("--top", type=int, default=20, help="表示する上位の件数")
+    args = parser.parse_args(argv)
+
+    if args.synthetic:
+        closes = synthetic_closes(args.synthetic, args.years)
+    else:
+        import jpx_master
+        import stock_core
+        master = jpx_master.load_master(args.jpx)
+        if master.empty:
+            print(f"'{args.jpx}' が見つかりません")
+            return 1
+        codes = master["コード"].tolist()[:args.limit]
+        #保存庫にある株価だけを使う(更新は refresh.py で行う)
+        store = stock_core.make_price_store(stock_core.make_scheduler())
+        closes = stock_core.comparison.align_closes(
+            store.read_closes(codes, start=stock_core.period_to_start(args.period)))
+    if closes.empty:
+        print("株価データがありません。先に refresh.py --only prices で株価を保存してください")
+        return 1
+
+    start = time.perf_counter()
+    ranked, throughput = run_sweep(closes, workers=args.workers, rebalance=args.rebalance, cost_bps=args.cost)
+    elapsed = time.perf_counter() - start
+
+    print(f"{len(closes)}日 × {closes.shape[1]}銘柄 / {len(ranked)}通り / {elapsed:.1f}秒")
+    with pd.option_context("display.width", 200, "display.max_columns", None):
+        print(ranked.head(args.top).round(2))
+        print("\n=== プロセスごとの処理量 ===")
+        print(throughput.round(2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())